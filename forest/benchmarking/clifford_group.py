@@ -0,0 +1,305 @@
+"""
+Local enumeration and sampling of the one and two qubit Clifford groups.
+
+Randomized benchmarking sequences are usually generated by the compiler service through a
+BenchmarkConnection, which costs a round trip (and a re-compilation of the gateset) for every
+sequence. This module instead enumerates the Clifford group once, in process, as tableaux of
+the images of the Pauli generators, together with a cheapest decomposition of each element
+into the gates of a supplied gateset: the one with the fewest multi-qubit gates and, among
+those, the fewest gates. Random sequences, their inverses and interleaved sequences are then
+produced by table look-ups.
+
+Pauli operators on a single qubit are encoded by the integers I=0, X=1, Z=2, Y=3 (the X
+component in the low bit and the Z component in the high bit). A tableau on n qubits is a pair
+of arrays (letters, signs) of shapes (2n, n) and (2n,) whose rows are the images of the
+generators X_0, ..., X_{n-1}, Z_0, ..., Z_{n-1} under conjugation, i.e. row j is
+(-1)^signs[j] times the Pauli string letters[j].
+
+For more on the tableau representation see
+[CHP] Improved Simulation of Stabilizer Circuits
+      Aaronson and Gottesman,
+      Phys. Rev. A 70, 052328 (2004)
+      https://doi.org/10.1103/PhysRevA.70.052328
+      https://arxiv.org/abs/quant-ph/0406196
+"""
+from itertools import product
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+from pyquil import Program
+from pyquil.quilatom import QubitPlaceholder, unpack_qubit
+from pyquil.quilbase import Gate
+from pyquil.unitary_tools import program_unitary
+
+_PAULI_MATRICES = [np.eye(2, dtype=complex),
+                   np.array([[0, 1], [1, 0]], dtype=complex),
+                   np.array([[1, 0], [0, -1]], dtype=complex),
+                   np.array([[0, -1j], [1j, 0]], dtype=complex)]
+
+
+def _pauli_matrix(letters: Sequence[int]) -> np.ndarray:
+    """
+    The matrix of the Pauli string with letters[j] acting on qubit j, in the pyQuil convention
+    where qubit 0 is the least significant tensor factor.
+    """
+    matrix = np.eye(1, dtype=complex)
+    for letter in letters:
+        matrix = np.kron(_PAULI_MATRICES[letter], matrix)
+    return matrix
+
+
+def _letters_to_index(letters: np.ndarray) -> np.ndarray:
+    """
+    Index of each Pauli string (along the last axis of letters) in the order of
+    ``product(range(4), repeat=k)`` with position 0 varying fastest.
+    """
+    weights = 4 ** np.arange(letters.shape[-1])
+    return letters @ weights
+
+
+def conjugation_table(unitary: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Tabulate the action of a Clifford unitary on every Pauli string by conjugation.
+
+    :param unitary: a 2^k by 2^k Clifford unitary, with qubit 0 as the least significant factor.
+    :return: arrays (images, signs) of shapes (4^k, k) and (4^k,). For the Pauli string P with
+        index i (see _letters_to_index) we have U P U^dag = (-1)^signs[i] images[i].
+    """
+    dim = unitary.shape[0]
+    num_qubits = int(np.log2(dim))
+    all_letters = [tuple(reversed(p)) for p in product(range(4), repeat=num_qubits)]
+    paulis = {letters: _pauli_matrix(letters) for letters in all_letters}
+
+    images = np.zeros((4 ** num_qubits, num_qubits), dtype=np.int8)
+    signs = np.zeros(4 ** num_qubits, dtype=bool)
+    for letters in all_letters:
+        index = _letters_to_index(np.array(letters))
+        conjugated = unitary @ paulis[letters] @ unitary.conj().T
+        for candidate, pauli in paulis.items():
+            overlap = np.trace(pauli @ conjugated).real / dim
+            if np.isclose(abs(overlap), 1):
+                images[index] = candidate
+                signs[index] = overlap < 0
+                break
+        else:
+            raise ValueError("The unitary is not a Clifford.")
+    return images, signs
+
+
+def _invert_table(images: np.ndarray, signs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    The conjugation table of the inverse of the unitary described by (images, signs).
+    """
+    inv_images = np.zeros_like(images)
+    inv_signs = np.zeros_like(signs)
+    num_qubits = images.shape[1]
+    for index, letters in enumerate(product(range(4), repeat=num_qubits)):
+        letters = np.array(letters[::-1])
+        image_index = _letters_to_index(images[index])
+        inv_images[image_index] = letters
+        inv_signs[image_index] = signs[index]
+    return inv_images, inv_signs
+
+
+def _identity_tableau(num_qubits: int) -> Tuple[np.ndarray, np.ndarray]:
+    letters = np.zeros((2 * num_qubits, num_qubits), dtype=np.int8)
+    for q in range(num_qubits):
+        letters[q, q] = 1
+        letters[num_qubits + q, q] = 2
+    return letters, np.zeros(2 * num_qubits, dtype=bool)
+
+
+def _apply_table(letters: np.ndarray, signs: np.ndarray, table: Tuple[np.ndarray, np.ndarray],
+                 positions: Sequence[int]):
+    """
+    Conjugate, in place, every row of the tableau (letters, signs) by a gate acting on the given
+    positions. Leading axes of letters and signs are treated as a batch of tableaux.
+    """
+    images, flips = table
+    index = _letters_to_index(letters[..., positions])
+    letters[..., positions] = images[index]
+    signs ^= flips[index]
+
+
+def _tableau_key(letters: np.ndarray, signs: np.ndarray) -> bytes:
+    return letters.tobytes() + signs.tobytes()
+
+
+class CliffordGroup:
+    """
+    The Clifford group on the qubits of a gateset, enumerated as tableaux together with the
+    decomposition of each element into the fewest multi-qubit gates of the gateset and, among
+    those, the fewest gates. For ``twoq_rb_gateset`` every element uses at most three CZs, 1.5
+    on average, as for an optimal compiler.
+
+    Elements are enumerated by a uniform cost search from the identity, so the gateset must
+    generate the full Clifford group on its qubits; e.g. ``oneq_rb_gateset`` gives the 24
+    single qubit Cliffords and ``twoq_rb_gateset`` the 11520 two qubit Cliffords (up to phase).
+    The group is built once on construction and all subsequent operations are look-ups.
+
+    :param gateset: the Clifford gates to decompose elements into, acting on ``qubits``.
+    :param qubits: the (typically placeholder) qubits of the gateset. The position of a qubit in
+        this sequence is the index used for it in tableaux and by ``qubits`` arguments of methods.
+    """
+
+    def __init__(self, gateset: Sequence[Gate], qubits: Sequence[QubitPlaceholder]):
+        self.gateset = list(gateset)
+        self.num_qubits = len(qubits)
+
+        self._gate_positions = []
+        self._gate_tables = []
+        self._inverse_gate_tables = []
+        for gate in self.gateset:
+            positions = [list(qubits).index(q) for q in gate.qubits]
+            local_gate = Gate(gate.name, gate.params, [unpack_qubit(j) for j in range(len(positions))])
+            table = conjugation_table(program_unitary(Program(local_gate), len(positions)))
+            self._gate_positions.append(positions)
+            self._gate_tables.append(table)
+            self._inverse_gate_tables.append(_invert_table(*table))
+
+        self._enumerate()
+
+    def _enumerate(self):
+        letters, signs = _identity_tableau(self.num_qubits)
+        self._index: Dict[bytes, int] = {_tableau_key(letters, signs): 0}
+        self._decompositions: List[Tuple[int, ...]] = [()]
+        tableaux_letters = [letters]
+        tableaux_signs = [signs]
+
+        # the cost of a gate: multi-qubit gates are minimized first, then the total gate count
+        gate_costs = [(int(len(positions) > 1), 1) for positions in self._gate_positions]
+
+        # uniform cost search in order of increasing cost, extending all the elements of the
+        # cheapest cost at once by each gate. Costs are small integer pairs and every gate adds
+        # at least one, so candidates are kept in buckets by cost rather than in a heap.
+        candidates: Dict[Tuple[int, int], Dict[bytes, tuple]] = {}
+        cost, frontier = (0, 0), [0]
+        while True:
+            frontier_letters = np.array([tableaux_letters[idx] for idx in frontier])
+            frontier_signs = np.array([tableaux_signs[idx] for idx in frontier])
+            for gate_idx, (table, positions) in enumerate(zip(self._gate_tables,
+                                                               self._gate_positions)):
+                letters = frontier_letters.copy()
+                signs = frontier_signs.copy()
+                _apply_table(letters, signs, table, positions)
+                child_cost = (cost[0] + gate_costs[gate_idx][0], cost[1] + gate_costs[gate_idx][1])
+                bucket = candidates.setdefault(child_cost, {})
+                for parent, child_letters, child_signs in zip(frontier, letters, signs):
+                    key = _tableau_key(child_letters, child_signs)
+                    if key not in self._index and key not in bucket:
+                        bucket[key] = (parent, gate_idx, child_letters, child_signs)
+
+            frontier = []
+            while not frontier and candidates:
+                cost = min(candidates)
+                for key, (parent, gate_idx, child_letters, child_signs) in \
+                        candidates.pop(cost).items():
+                    if key not in self._index:
+                        self._index[key] = len(self._decompositions)
+                        frontier.append(self._index[key])
+                        self._decompositions.append(self._decompositions[parent] + (gate_idx,))
+                        tableaux_letters.append(child_letters)
+                        tableaux_signs.append(child_signs)
+            if not frontier:
+                break
+
+        self._letters = np.array(tableaux_letters)
+        self._signs = np.array(tableaux_signs)
+
+    def __len__(self):
+        return len(self._decompositions)
+
+    def tableau(self, element: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The tableau (letters, signs) of a group element; see the module docstring.
+        """
+        return self._letters[element].copy(), self._signs[element].copy()
+
+    def decomposition(self, element: int) -> List[Gate]:
+        """
+        The cheapest decomposition of a group element into gateset gates, in circuit order.
+        """
+        return [self.gateset[idx] for idx in self._decompositions[element]]
+
+    def element_to_program(self, element: int, qubits: Sequence[int]) -> Program:
+        """
+        The decomposition of a group element as a Program acting on the given qubits.
+
+        :param element: index of the group element.
+        :param qubits: the qubits to act on; qubits[j] replaces the gateset qubit in position j.
+        :return: a Program of gateset gates implementing the element.
+        """
+        qubits = [unpack_qubit(q) for q in qubits]
+        gates = []
+        for idx in self._decompositions[element]:
+            gate = self.gateset[idx]
+            gates.append(Gate(gate.name, gate.params, [qubits[p] for p in self._gate_positions[idx]]))
+        return Program(gates)
+
+    def element_of_program(self, program: Program) -> int:
+        """
+        Find the group element implemented by a Clifford program.
+
+        :param program: a Program on qubits 0, ..., num_qubits - 1, where qubit j corresponds
+            to the gateset qubit in position j. As for the compiler's interleaver, the qubit
+            indices are positions, not physical qubit labels.
+        :return: the index of the element implemented by the program.
+        """
+        unitary = program_unitary(program, self.num_qubits)
+        letters, signs = _identity_tableau(self.num_qubits)
+        table = conjugation_table(unitary)
+        _apply_table(letters, signs, table, list(range(self.num_qubits)))
+        return self._index[_tableau_key(letters, signs)]
+
+    def inverse_of_sequence(self, elements: Sequence[int]) -> int:
+        """
+        Find the element which, applied after the given elements, composes to the identity.
+
+        :param elements: group elements in the order they are applied.
+        :return: index of the inverting element.
+        """
+        letters, signs = _identity_tableau(self.num_qubits)
+        for element in reversed(elements):
+            for idx in reversed(self._decompositions[element]):
+                _apply_table(letters, signs, self._inverse_gate_tables[idx],
+                             self._gate_positions[idx])
+        return self._index[_tableau_key(letters, signs)]
+
+    def sample(self, size: int, random_state: np.random.RandomState = None) -> np.ndarray:
+        """
+        Draw group elements uniformly at random.
+
+        :param size: the number of elements to draw.
+        :param random_state: source of randomness; defaults to the global numpy state.
+        :return: array of element indices.
+        """
+        if random_state is None:
+            random_state = np.random
+        return random_state.randint(len(self), size=size)
+
+    def generate_rb_sequence(self, depth: int, qubits: Sequence[int], random_seed: int = None,
+                             interleaver: Program = None) -> List[Program]:
+        """
+        Generate a randomized benchmarking sequence acting on the given qubits.
+
+        Mirrors :py:meth:`BenchmarkConnection.generate_rb_sequence`: without an interleaver the
+        sequence has the form C_1 C_2 ... C_(depth-1) C_inv and with an interleaver G it has the
+        form C_1 G C_2 G ... C_(depth-1) G C_inv, where C_inv makes the whole sequence compose to
+        the identity. Each Clifford, including G, is decomposed into the gateset.
+
+        :param depth: the number of Cliffords in the sequence, including the inverse.
+        :param qubits: the qubits to act on; qubits[j] replaces the gateset qubit in position j.
+        :param random_seed: seed for sampling the random Cliffords.
+        :param interleaver: a Clifford Program on qubits 0, ..., num_qubits - 1 (positions, see
+            element_of_program) to interleave between the random Cliffords.
+        :return: list of Programs, one per Clifford, which compose to the identity.
+        """
+        if depth < 1:
+            raise ValueError("Sequence depth must be at least 1.")
+        random_state = np.random.RandomState(random_seed)
+        elements = list(self.sample(depth - 1, random_state))
+        if interleaver is not None:
+            interleaved_element = self.element_of_program(interleaver)
+            elements = [e for element in elements for e in (element, interleaved_element)]
+        elements.append(self.inverse_of_sequence(elements))
+        return [self.element_to_program(element, qubits) for element in elements]
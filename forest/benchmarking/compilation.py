@@ -154,6 +154,29 @@ def _CCNOT(q1, q2, q3):
     return p
 
 
+def zxzxz_angles(unitary: np.ndarray) -> Tuple[float, float, float]:
+    """
+    Decompose a single qubit unitary into RZ rotations about two fixed RX(pi/2) pulses.
+
+    The unitary is implemented, up to global phase, by the program
+    RZ(alpha) RX(pi/2) RZ(beta) RX(pi/2) RZ(gamma), so any single qubit gate can be written with
+    the same native gate structure and only the RZ angles varying. This follows from the
+    ZYZ Euler decomposition RZ(phi) RY(theta) RZ(lambda) and the identity
+    RY(theta) = RZ(-pi/2) RX(pi/2) RZ(theta + pi) RX(pi/2) RZ(-pi/2), up to global phase.
+
+    :param unitary: a 2x2 unitary matrix
+    :return: the angles (alpha, beta, gamma) in program order.
+    """
+    # remove the global phase so that the matrix is in SU(2)
+    v = unitary / np.sqrt(np.linalg.det(unitary))
+    theta = 2 * np.arctan2(np.abs(v[1, 0]), np.abs(v[0, 0]))
+    phi_plus_lambda = 2 * np.angle(v[1, 1]) if not np.isclose(np.abs(v[1, 1]), 0) else 0.
+    phi_minus_lambda = 2 * np.angle(v[1, 0]) if not np.isclose(np.abs(v[1, 0]), 0) else 0.
+    phi = (phi_plus_lambda + phi_minus_lambda) / 2
+    lam = (phi_plus_lambda - phi_minus_lambda) / 2
+    return lam, theta + pi, phi + pi
+
+
 def is_magic_angle(angle):
     return (np.isclose(np.abs(angle), pi / 2)
             or np.isclose(np.abs(angle), pi)
@@ -1,5 +1,8 @@
 """A module for computing distances (and other properites) between quantum states or
 processes"""
+from functools import lru_cache
+from typing import Sequence, Tuple
+
 import numpy as np
 from scipy.linalg import sqrtm
 from scipy.linalg import fractional_matrix_power
@@ -259,7 +262,8 @@ def process_fidelity(pauli_lio0: np.ndarray, pauli_lio1: np.ndarray) -> float:
     return (dim * Fe + 1) / (dim + 1)
 
 
-def diamond_norm_distance(choi0: np.ndarray, choi1: np.ndarray) -> float:
+def diamond_norm_distance(choi0: np.ndarray, choi1: np.ndarray, solver: str = None,
+                          warm_start: bool = True, **solver_kwargs) -> float:
     """
     Return the diamond norm distance between two completely positive
     trace-preserving (CPTP) superoperators, represented as Choi matrices.
@@ -272,15 +276,22 @@ def diamond_norm_distance(choi0: np.ndarray, choi1: np.ndarray) -> float:
           http://theoryofcomputing.org/articles/v005a011
           http://arxiv.org/abs/0901.4709
 
+    The program is built and canonicalised once per dimension and cached, so that subsequent
+    calls only update the difference of the Choi matrices and re-solve. With warm_start the
+    solver starts from the previous solution, which pays off when consecutive calls compare
+    similar channels, e.g. the gates of a tomography run against their ideals.
+
     This calculation becomes very slow for 4 or more qubits.
 
     :param choi0: A 4**N by 4**N matrix (where N is the number of qubits)
     :param choi1: A 4**N by 4**N matrix (where N is the number of qubits)
-
+    :param solver: the name of the cvxpy solver to use; by default cvxpy chooses.
+    :param warm_start: whether to start the solver from the solution of the previous call.
+    :param solver_kwargs: further keyword arguments passed to the solver.
+    :return: the diamond norm distance, which is a scalar.
     """
     # Kudos: Based on MatLab code written by Marcus P. da Silva
     # (https://github.com/BBN-Q/matlab-diamond-norm/)
-    import cvxpy as cvx
     assert choi0.shape == choi1.shape
     assert choi0.shape[0] == choi1.shape[1]
     dim_squared = choi0.shape[0]
@@ -289,30 +300,80 @@ def diamond_norm_distance(choi0: np.ndarray, choi1: np.ndarray) -> float:
     delta_choi = choi0 - choi1
     delta_choi = (delta_choi.conj().T + delta_choi) / 2  # Enforce Hermiticity
 
-    # Density matrix must be Hermitian, positive semidefinite, trace 1
-    rho = cvx.Variable([dim, dim], complex=True)
-    constraints = [rho == rho.H]
-    constraints += [rho >> 0]
-    constraints += [cvx.trace(rho) == 1]
+    prob, j_re, j_im = _diamond_norm_sdp(dim)
+    j_re.value = delta_choi.real
+    j_im.value = delta_choi.imag
+    prob.solve(solver=solver, warm_start=warm_start, **solver_kwargs)
 
-    # W must be Hermitian, positive semidefinite
-    W = cvx.Variable([dim_squared, dim_squared], complex=True)
-    constraints += [W == W.H]
-    constraints += [W >> 0]
+    dnorm = prob.value * 2
 
-    constraints += [(W - cvx.kron(np.eye(dim), rho)) << 0]
+    return dnorm
 
-    J = cvx.Parameter([dim_squared, dim_squared], complex=True)
-    objective = cvx.Maximize(cvx.real(cvx.trace(J.H * W)))
 
-    prob = cvx.Problem(objective, constraints)
+def diamond_norm_distances(choi_pairs: Sequence[Tuple[np.ndarray, np.ndarray]],
+                           solver: str = None, warm_start: bool = True,
+                           **solver_kwargs) -> np.ndarray:
+    """
+    Return the diamond norm distance, see diamond_norm_distance, between each of a sequence of
+    pairs of Choi matrices.
 
-    J.value = delta_choi
-    prob.solve()
+    Pairs of the same dimension share one compiled program and, with warm_start, each solve
+    starts from the solution of the previous pair, so similar pairs should be adjacent.
 
-    dnorm = prob.value * 2
+    :param choi_pairs: a sequence of pairs (choi0, choi1) of Choi matrices of equal dimension.
+    :param solver: the name of the cvxpy solver to use; by default cvxpy chooses.
+    :param warm_start: whether to start each solve from the solution of the previous one.
+    :param solver_kwargs: further keyword arguments passed to the solver.
+    :return: an array of the diamond norm distances between the pairs.
+    """
+    return np.array([diamond_norm_distance(choi0, choi1, solver, warm_start, **solver_kwargs)
+                     for choi0, choi1 in choi_pairs])
 
-    return dnorm
+
+@lru_cache()
+def _diamond_norm_sdp(dim: int):
+    """
+    The semidefinite program of diamond_norm_distance for channels on a dim dimensional space.
+
+    cvxpy only caches the canonicalisation of a problem whose parameters are real, so each
+    Hermitian matrix X is represented by real matrices re, im with X = re + i im, using that X is
+    positive semidefinite iff [[re, -im], [im, re]] is.
+
+    :return: the cvxpy Problem and the Parameters holding the real and imaginary parts of the
+        (Hermitian) difference J of the Choi matrices.
+    """
+    import cvxpy as cvx
+    dim_squared = dim ** 2
+
+    def hermitian_variable(size):
+        re = cvx.Variable([size, size], symmetric=True)
+        im = cvx.Variable([size, size])
+        return re, im, [im == -im.T]
+
+    def embedding(re, im):
+        return cvx.bmat([[re, -im], [im, re]])
+
+    # Density matrix must be Hermitian, positive semidefinite, trace 1
+    rho_re, rho_im, constraints = hermitian_variable(dim)
+    constraints += [embedding(rho_re, rho_im) >> 0]
+    constraints += [cvx.trace(rho_re) == 1]
+
+    # W must be Hermitian, positive semidefinite
+    w_re, w_im, w_constraints = hermitian_variable(dim_squared)
+    constraints += w_constraints
+    constraints += [embedding(w_re, w_im) >> 0]
+
+    # W <= Id \otimes rho
+    identity = np.eye(dim)
+    constraints += [embedding(cvx.kron(identity, rho_re) - w_re,
+                              cvx.kron(identity, rho_im) - w_im) >> 0]
+
+    # Re Tr[J^\dagger W]
+    j_re = cvx.Parameter([dim_squared, dim_squared])
+    j_im = cvx.Parameter([dim_squared, dim_squared])
+    objective = cvx.Maximize(cvx.sum(cvx.multiply(j_re, w_re)) + cvx.sum(cvx.multiply(j_im, w_im)))
+
+    return cvx.Problem(objective, constraints), j_re, j_im
 
 
 def _is_square(n):
@@ -9,7 +9,7 @@ from pyquil.paulis import (PauliSum, PauliTerm, commuting_sets, sI,
                            term_with_coeff, is_identity)
 from pyquil.quil import Program
 from pyquil.gates import RX, RY, RZ, MEASURE
-from forest.benchmarking.readout import estimate_confusion_matrix
+from forest.benchmarking.readout import estimate_confusion_matrices
 from forest.benchmarking.compilation import basic_compile
 
 STANDARD_NUMSHOTS = 10000
@@ -60,15 +60,15 @@ def get_confusion_matrices(quantum_resource, qubits, num_sample_ubound):
     Get the confusion matrices from the quantum resource given number of samples
 
     This allows the user to change the accuracy at which they estimate the
-    confusion matrix
+    confusion matrix. All qubits are estimated simultaneously, see estimate_confusion_matrices.
 
     :param quantum_resource: Quantum Abstract Machine connection object
     :param qubits: qubits to measure 1-qubit readout confusion matrices
+    :param num_sample_ubound: number of shots of each preparation (0 and 1) on each qubit
     :return: dictionary of confusion matrices indexed by the qubit label
     :rtype: dict
     """
-    confusion_mat_dict = {q: estimate_confusion_matrix(quantum_resource, q, num_sample_ubound) for q in qubits}
-    return confusion_mat_dict
+    return estimate_confusion_matrices(quantum_resource, list(qubits), num_sample_ubound)
 
 
 def get_rotation_program(pauli_term):
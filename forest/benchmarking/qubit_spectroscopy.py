@@ -1,14 +1,19 @@
-from typing import Union, List, Tuple
+from numbers import Number
+from typing import Callable, Union, List, Tuple, Sequence
 
+import networkx as nx
 import numpy as np
 import pandas as pd
 from scipy import optimize
+from scipy.stats import binom
 from matplotlib import pyplot as plt
 
 from pyquil.api import QuantumComputer
 from pyquil.gates import RX, RZ, CZ, MEASURE
 from pyquil.quil import Program
-from pyquil.quilbase import Pragma
+from pyquil.quilbase import Pragma, Gate
+
+from forest.benchmarking.utils import parallel_map, simultaneous_batches
 
 MILLISECOND = 1e-6  # A millisecond (ms) is an SI unit of time
 MICROSECOND = 1e-6  # A microsecond (us) is an SI unit of time
@@ -20,6 +25,138 @@ MHZ = 1e6  # MHz
 GHZ = 1e9  # GHz
 
 
+# ==================================================================================================
+#   Parametric sweeps
+# ==================================================================================================
+
+SWEEP_REGION = 'sweep_values'  # the memory region holding the swept gate parameters
+
+
+def _sweep_signature(program: Program) -> Tuple:
+    """
+    The structure of a program with the numeric parameters of its gates left out; programs with
+    equal signatures differ at most in those parameters.
+    """
+    signature = [program.num_shots]
+    for inst in program.instructions:
+        if isinstance(inst, Gate) and all(isinstance(p, Number) for p in inst.params):
+            signature.append((inst.name, tuple(inst.qubits), len(inst.params),
+                              tuple(inst.modifiers)))
+        else:
+            signature.append(inst.out())
+    return tuple(signature)
+
+
+def _sweep_values(program: Program) -> List[float]:
+    """
+    The numeric gate parameters of a program, in the order they appear.
+    """
+    return [p for inst in program.instructions
+            if isinstance(inst, Gate) and all(isinstance(p, Number) for p in inst.params)
+            for p in inst.params]
+
+
+def parametrize_sweep(programs: Sequence[Program]) -> List[Tuple[Program, List[int], np.ndarray]]:
+    """
+    Group a sweep of programs into as few parametric programs as possible.
+
+    Programs which differ only in the numeric parameters of their gates are grouped together. In
+    each group, every gate parameter which varies across the group is replaced by a reference
+    into the REAL memory region SWEEP_REGION, so that the group can be compiled once and each
+    program recovered at run time from a memory map. A varying RX angle theta is not native, so
+    the RX is replaced by the equivalent RZ(pi/2) RX(pi/2) RZ(theta) RX(-pi/2) RZ(-pi/2).
+
+    Anything which is not a gate parameter, e.g. the duration in a DELAY pragma, cannot be
+    swept this way, and programs differing there end up in separate groups.
+
+    :param programs: the programs of a sweep, e.g. the Program column of a spectroscopy
+        experiment.
+    :return: a list of triples (template, indices, values), one per group, where template is the
+        parametric program, indices are the positions in programs of the members of the group,
+        and values[j] is the memory map contents of SWEEP_REGION for the program indices[j].
+    """
+    groups = {}
+    for idx, program in enumerate(programs):
+        groups.setdefault(_sweep_signature(program), []).append(idx)
+
+    sweeps = []
+    for indices in groups.values():
+        first = programs[indices[0]]
+        values = np.array([_sweep_values(programs[idx]) for idx in indices], dtype=float)
+        values = values.reshape(len(indices), -1)
+        varying = np.any(values != values[0], axis=0)
+
+        template = first.copy_everything_except_instructions()
+        if np.any(varying):
+            sweep = template.declare(SWEEP_REGION, 'REAL', int(np.sum(varying)))
+        column = 0
+        offset = 0
+        for inst in first.instructions:
+            if not isinstance(inst, Gate) or not all(isinstance(p, Number) for p in inst.params):
+                template += inst
+                continue
+            params = list(inst.params)
+            swept = False
+            for j in range(len(params)):
+                if varying[column]:
+                    params[j] = sweep[offset]
+                    offset += 1
+                    swept = True
+                column += 1
+            if swept and inst.name == 'RX' and not inst.modifiers:
+                qubit = inst.qubits[0]
+                template += [RZ(np.pi / 2, qubit), RX(np.pi / 2, qubit), RZ(params[0], qubit),
+                             RX(-np.pi / 2, qubit), RZ(-np.pi / 2, qubit)]
+            else:
+                gate = Gate(inst.name, params, inst.qubits)
+                gate.modifiers = list(inst.modifiers)
+                template += gate
+        sweeps.append((template, indices, values[:, varying]))
+    return sweeps
+
+
+def acquire_sweep_data(qc: QuantumComputer,
+                       experiment: pd.DataFrame,
+                       columns: Sequence[str],
+                       extra_columns: Sequence[str] = ()) -> pd.DataFrame:
+    """
+    Run the Program column of a spectroscopy experiment, compiling only one executable for each
+    group of programs found by parametrize_sweep and streaming the swept parameters through
+    memory maps.
+
+    :param qc: The QuantumComputer to run the experiment on
+    :param experiment: A pandas DataFrame with a Program column, e.g. from
+        generate_rabi_experiments
+    :param columns: the columns of the experiment to record for each row and qubit, before the
+        Num_bitstrings and Average of the results
+    :param extra_columns: columns of the experiment to record after the results
+    :return: pandas DataFrame with one row for each row of the experiment and measured qubit
+    """
+    programs = list(experiment['Program'].values)
+    qubits = [list(program.get_qubits()) for program in programs]
+
+    averages = np.zeros((len(programs), max(len(qs) for qs in qubits)))
+    num_bitstrings = np.zeros(len(programs), dtype=int)
+    for template, indices, values in parametrize_sweep(programs):
+        executable = qc.compiler.native_quil_to_executable(template)
+        for idx, row_values in zip(indices, values):
+            memory_map = {SWEEP_REGION: list(row_values)} if len(row_values) else None
+            bitstrings = qc.run(executable, memory_map)
+            averages[idx, :bitstrings.shape[1]] = np.mean(bitstrings, axis=0)
+            num_bitstrings[idx] = len(bitstrings)
+
+    results = []
+    for idx, row in enumerate(experiment.to_dict('records')):
+        for i, qubit in enumerate(qubits[idx]):
+            result = {'Qubit': qubit}
+            result.update({column: row[column] for column in columns})
+            result['Num_bitstrings'] = int(num_bitstrings[idx])
+            result['Average'] = float(averages[idx, i])
+            result.update({column: row[column] for column in extra_columns})
+            results.append(result)
+    return pd.DataFrame(results)
+
+
 # ==================================================================================================
 #   T1
 # ==================================================================================================
@@ -88,62 +225,32 @@ def acquire_t1_data(qc: QuantumComputer,
     :param t1_experiment: A pandas DataFrame with columns: time, t1 program
     :return: pandas DataFrame
     """
-    results = []
-
-    for index, row in t1_experiment.iterrows():
-        t = row['Time']
-        program = row['Program']
-
-        executable = qc.compiler.native_quil_to_executable(program)
-        bitstrings = qc.run(executable)
-
-        qubits = list(program.get_qubits())
-        for i in range(len(qubits)):
-            avg = np.mean(bitstrings[:, i])
-            results.append({
-                'Qubit': qubits[i],
-                'Time': t,
-                'Num_bitstrings': len(bitstrings),
-                'Average': float(avg),
-                'Program': program,
-            })
-
-    df = pd.DataFrame(results)
-    return df
+    return acquire_sweep_data(qc, t1_experiment, ['Time'], ['Program'])
 
 
-def estimate_t1(df: pd.DataFrame):
+def estimate_t1(df: pd.DataFrame, max_workers: int = None):
     """
     Estimate T1 from experimental data.
 
     :param df: A pandas DataFrame of experimental T1 results to plot
+    :param max_workers: The number of worker processes used to fit the qubits, see
+        fit_spectroscopy_curves; by default the fits run in this process.
     :return: pandas DataFrame
     """
-    results = []
-
-    for q in df['Qubit'].unique():
+    qubits = df['Qubit'].unique()
+    curves = []
+    for q in qubits:
         df2 = df[df['Qubit'] == q].sort_values('Time')
-        x_data = df2['Time']
-        y_data = df2['Average']
+        curves.append((df2['Time'].values, df2['Average'].values))
+    fits = fit_spectroscopy_curves(curves, 'exponential_decay', max_workers=max_workers)
 
-        try:
-            fit_params, fit_params_errs = fit_to_exponential_decay_curve(x_data, y_data)
-            results.append({
-                'Qubit': q,
-                'T1': fit_params[1] / MICROSECOND,
-                'Fit_params': fit_params,
-                'Fit_params_errs': fit_params_errs,
-                'Message': None,
-            })
-        except RuntimeError:
-            print(f"Could not fit to experimental data for qubit {q}")
-            results.append({
-                'Qubit': q,
-                'T1': None,
-                'Fit_params': None,
-                'Fit_params_errs': None,
-                'Message': 'Could not fit to experimental data for qubit' + str(q),
-            })
+    results = []
+    for q, fit in zip(qubits, fits.to_dict('records')):
+        results.append({
+            'Qubit': q,
+            'T1': fit['Fit_params'][1] / MICROSECOND if fit['Success'] else None,
+            **fit,
+        })
     return pd.DataFrame(results)
 
 
@@ -335,67 +442,38 @@ def acquire_t2_data(qc: QuantumComputer,
     :return: pandas DataFrame containing T2 results, and detuning used in creating experiments for
     those results.
     """
-    results = []
-
-    for index, row in t2_experiment.iterrows():
-        t = row['Time']
-        program = row['Program']
-        detuning = row['Detuning']
-        executable = qc.compiler.native_quil_to_executable(program)
-        bitstrings = qc.run(executable)
-
-        qubits = list(program.get_qubits())
-        for i in range(len(qubits)):
-            avg = np.mean(bitstrings[:, i])
-            results.append({
-                'Qubit': qubits[i],
-                'Time': t,
-                'Num_bitstrings': len(bitstrings),
-                'Average': float(avg),
-                'Detuning': float(detuning),
-            })
-
-    return pd.DataFrame(results)
+    df = acquire_sweep_data(qc, t2_experiment, ['Time'], ['Detuning'])
+    df['Detuning'] = df['Detuning'].astype(float)
+    return df
 
 
-def estimate_t2(df: pd.DataFrame) -> pd.DataFrame:
+def estimate_t2(df: pd.DataFrame, max_workers: int = None) -> pd.DataFrame:
     """
     Estimate T2 star or T2 echo from experimental data.
 
     :param df: A pandas DataFrame with experimental T2 results
-    :param detuning: Detuning frequency used in experiment creation
+    :param max_workers: The number of worker processes used to fit the qubits, see
+        fit_spectroscopy_curves; by default the fits run in this process.
     :return: pandas DataFrame
     """
-    results = []
-    for q in df['Qubit'].unique():
+    qubits = df['Qubit'].unique()
+    curves = []
+    kwargs = []
+    for q in qubits:
         df2 = df[df['Qubit'] == q].sort_values('Time')
-        x_data = df2['Time']
-        y_data = df2['Average']
-        detuning = df2['Detuning'].values[0]
-
-        try:
-            fit_params, fit_params_errs = fit_to_exponentially_decaying_sinusoidal_curve(x_data,
-                                                                                         y_data,
-                                                                                         detuning)
-            results.append({
-                'Qubit': q,
-                'T2': fit_params[1] / MICROSECOND,
-                'Freq': fit_params[2] / MHZ,
-                'Fit_params': fit_params,
-                'Fit_params_errs': fit_params_errs,
-                'Message': None,
-            })
-        except RuntimeError:
-            print(f"Could not fit to experimental data for qubit {q}")
-            results.append({
-                'Qubit': q,
-                'T2': None,
-                'Freq': None,
-                'Fit_params': None,
-                'Fit_params_errs': None,
-                'Message': 'Could not fit to experimental data for qubit' + str(q),
-            })
+        curves.append((df2['Time'].values, df2['Average'].values))
+        kwargs.append({'detuning': df2['Detuning'].values[0]})
+    fits = fit_spectroscopy_curves(curves, 'exponentially_decaying_sinusoid', kwargs,
+                                   max_workers=max_workers)
 
+    results = []
+    for q, fit in zip(qubits, fits.to_dict('records')):
+        results.append({
+            'Qubit': q,
+            'T2': fit['Fit_params'][1] / MICROSECOND if fit['Success'] else None,
+            'Freq': fit['Fit_params'][2] / MHZ if fit['Success'] else None,
+            **fit,
+        })
     return pd.DataFrame(results)
 
 
@@ -458,6 +536,209 @@ def plot_t2_estimate_over_data(df: pd.DataFrame,
     plt.show()
 
 
+# ==================================================================================================
+#   Adaptive T1 and T2
+# ==================================================================================================
+
+# The probability of measuring 1 after a delay t is baseline + amplitude * exp(-t / T) for
+# the programs of each kind of experiment, run with zero detuning. There is deliberately no
+# model for Ramsey (T2*) experiments: a real qubit always has some residual detuning, whose
+# cos(2 pi detuning t) fringe would be absorbed into, and bias, a purely exponential T2*
+# posterior. The echo of a T2 echo experiment refocuses such static detuning, so its decay is
+# exponential. Use acquire_t2_data and estimate_t2, which fit the fringe, to measure T2*.
+DECAY_MODELS = {
+    't1': (0.0, 1.0),
+    't2_echo': (0.5, -0.5),
+}
+
+
+def _decay_program(kind: str, qubits: List[int], time: float, n_shots: int) -> Program:
+    if kind == 't1':
+        return generate_single_t1_experiment(qubits, time, n_shots)
+    elif kind == 't2_echo':
+        return generate_single_t2_echo_experiment(qubits, time, 0.0, n_shots)
+    raise ValueError("kind must be one of " + ", ".join(DECAY_MODELS))
+
+
+def _decay_probabilities(kind: str, times: np.ndarray, decay_constants: np.ndarray) -> np.ndarray:
+    """
+    The probability of measuring 1 at each time (rows) for each decay constant (columns).
+    """
+    baseline, amplitude = DECAY_MODELS[kind]
+    probs = baseline + amplitude * np.exp(-np.outer(times, 1 / decay_constants))
+    return np.clip(probs, 1e-9, 1 - 1e-9)
+
+
+def _decay_log_posterior(kind: str, times: np.ndarray, ones: np.ndarray, shots: np.ndarray,
+                         decay_constants: np.ndarray) -> np.ndarray:
+    """
+    The unnormalized log posterior over the grid of decay constants, which is log-uniformly
+    spaced so that a uniform weight on the grid is a log-uniform prior.
+    """
+    probs = _decay_probabilities(kind, np.asarray(times, dtype=float), decay_constants)
+    return np.asarray(ones) @ np.log(probs) + (np.asarray(shots) - ones) @ np.log(1 - probs)
+
+
+def _normalize_log_posterior(log_posterior: np.ndarray) -> np.ndarray:
+    weights = np.exp(log_posterior - np.max(log_posterior, axis=-1, keepdims=True))
+    return weights / np.sum(weights, axis=-1, keepdims=True)
+
+
+def _count_likelihoods(probs: np.ndarray, n_shots: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    The distribution of the number of 1s in n_shots shots for each candidate time and decay
+    constant, and its entropy.
+
+    :param probs: the probability of measuring 1 for each candidate time and decay constant,
+        shape (C, G)
+    :param n_shots: the number of shots at the candidate time
+    :return: the likelihoods, shape (C, G, n_shots + 1), and their entropies, shape (C, G)
+    """
+    likelihoods = binom.pmf(np.arange(n_shots + 1), n_shots, probs[:, :, None])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        entropies = -np.sum(np.where(likelihoods > 0, likelihoods * np.log(likelihoods), 0),
+                            axis=-1)
+    return likelihoods, entropies
+
+
+def _expected_information_gain(posteriors: np.ndarray, likelihoods: np.ndarray,
+                               entropies: np.ndarray) -> np.ndarray:
+    """
+    The mutual information between the decay constant and the number of 1s observed, summed
+    over qubits, for each candidate time.
+
+    :param posteriors: normalized posteriors over the grid of decay constants, shape (Q, G)
+    :param likelihoods: the likelihoods of the counts, see _count_likelihoods, shape (C, G, K)
+    :param entropies: their entropies, shape (C, G)
+    :return: the expected information gain in nats for each candidate time, shape (C,)
+    """
+    # the marginal probability of each count under each qubit's posterior, shape (Q, C, K)
+    marginals = np.einsum('qg,cgk->qck', posteriors, likelihoods, optimize=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        marginal_entropies = -np.sum(np.where(marginals > 0, marginals * np.log(marginals), 0),
+                                     axis=-1)
+    return np.sum(marginal_entropies - posteriors @ entropies.T, axis=0)
+
+
+def estimate_decay_posterior(df: pd.DataFrame,
+                             kind: str = 't1',
+                             decay_constant_bounds: Tuple[float, float] = (1e-6, 1e-3),
+                             num_grid_points: int = 400) -> pd.DataFrame:
+    """
+    Estimate T1 or T2 from experimental data by a grid approximation of the posterior over the
+    decay constant, with a log-uniform prior between the given bounds.
+
+    The data are modeled by DECAY_MODELS[kind]; for T2 echo this assumes the experiments were
+    run with zero programmed detuning, as they are by acquire_adaptive_decay_data. Ramsey (T2*)
+    data are not supported, see DECAY_MODELS.
+
+    :param df: A pandas DataFrame of experimental results with columns Qubit, Time,
+        Num_bitstrings and Average, e.g. from acquire_adaptive_decay_data
+    :param kind: one of 't1' or 't2_echo'
+    :param decay_constant_bounds: the range of decay constants, in seconds, of the prior
+    :param num_grid_points: the number of points of the grid approximation
+    :return: pandas DataFrame with columns Qubit, the posterior mean and standard deviation of
+        T1 (or T2) in microseconds, the relative standard deviation and the number of shots
+    """
+    if kind not in DECAY_MODELS:
+        raise ValueError("kind must be one of " + ", ".join(DECAY_MODELS))
+    name = 'T1' if kind == 't1' else 'T2'
+    decay_constants = np.geomspace(*decay_constant_bounds, num_grid_points)
+
+    results = []
+    for q in df['Qubit'].unique():
+        df2 = df[df['Qubit'] == q]
+        shots = df2['Num_bitstrings'].values
+        ones = np.round(df2['Average'].values * shots)
+        posterior = _normalize_log_posterior(
+            _decay_log_posterior(kind, df2['Time'].values, ones, shots, decay_constants))
+        mean = posterior @ decay_constants
+        std = np.sqrt(posterior @ (decay_constants - mean) ** 2)
+        results.append({
+            'Qubit': q,
+            name: mean / MICROSECOND,
+            name + '_std': std / MICROSECOND,
+            'Relative_std': std / mean,
+            'Num_shots': int(np.sum(shots)),
+        })
+    return pd.DataFrame(results)
+
+
+def acquire_adaptive_decay_data(qc: QuantumComputer,
+                                qubits: Union[int, List[int]],
+                                kind: str = 't1',
+                                n_shots: int = 100,
+                                target_relative_std: float = 0.05,
+                                max_steps: int = 50,
+                                decay_constant_bounds: Tuple[float, float] = (1e-6, 1e-3),
+                                num_grid_points: int = 400,
+                                candidate_times: Sequence[float] = None) -> pd.DataFrame:
+    """
+    Measure T1 or T2 of one or more qubits with delay times chosen adaptively.
+
+    A grid approximation of the posterior over the decay constant of each qubit is kept, see
+    estimate_decay_posterior. At each step the delay time which maximizes the expected
+    information gain about the decay constants of the qubits which have not yet converged is
+    chosen from candidate_times, and the program generated for it by
+    generate_single_t1_experiment or generate_single_t2_echo_experiment (with zero detuning) is
+    run simultaneously on all the qubits. T2* is not supported, as residual detuning makes the
+    Ramsey signal oscillate; see DECAY_MODELS. Acquisition stops once the posterior standard
+    deviation of every decay constant is at most target_relative_std times its mean, or after
+    max_steps steps.
+
+    :param qc: The QuantumComputer to run the experiment on
+    :param qubits: Which qubits to measure.
+    :param kind: one of 't1' or 't2_echo'
+    :param n_shots: The number of shots at each chosen delay.
+    :param target_relative_std: the relative posterior standard deviation at which to stop
+    :param max_steps: the maximum number of delays to run
+    :param decay_constant_bounds: the range of decay constants, in seconds, of the log-uniform
+        prior
+    :param num_grid_points: the number of points of the grid approximation of the posterior
+    :param candidate_times: the delay times to choose from; by default 60 log-spaced times from
+        a twentieth of the smallest to three times the largest decay constant, on 10ns boundaries
+    :return: pandas DataFrame with the columns of acquire_t1_data, one row per step and qubit in
+        the order the delays were run
+    """
+    if kind not in DECAY_MODELS:
+        raise ValueError("kind must be one of " + ", ".join(DECAY_MODELS))
+    try:
+        len(qubits)
+    except TypeError:
+        qubits = [qubits]
+
+    decay_constants = np.geomspace(*decay_constant_bounds, num_grid_points)
+    if candidate_times is None:
+        candidate_times = np.unique(np.round(np.geomspace(decay_constant_bounds[0] / 20,
+                                                          3 * decay_constant_bounds[1], 60), 8))
+    candidate_times = np.asarray(candidate_times, dtype=float)
+    likelihoods, entropies = _count_likelihoods(
+        _decay_probabilities(kind, candidate_times, decay_constants), n_shots)
+
+    log_posteriors = {q: np.zeros(num_grid_points) for q in qubits}
+    data = []
+    for _ in range(max_steps):
+        posteriors = _normalize_log_posterior(np.array([log_posteriors[q] for q in qubits]))
+        means = posteriors @ decay_constants
+        stds = np.sqrt(np.sum(posteriors * (decay_constants - means[:, None]) ** 2, axis=1))
+        unconverged = stds > target_relative_std * means
+        if not np.any(unconverged):
+            break
+
+        gains = _expected_information_gain(posteriors[unconverged], likelihoods, entropies)
+        time = candidate_times[np.argmax(gains)]
+        experiment = pd.DataFrame([{'Time': time,
+                                    'Program': _decay_program(kind, qubits, time, n_shots)}])
+        step = acquire_sweep_data(qc, experiment, ['Time'], ['Program'])
+        for row in step.to_dict('records'):
+            ones = round(row['Average'] * row['Num_bitstrings'])
+            log_posteriors[row['Qubit']] += _decay_log_posterior(
+                kind, [time], [ones], [row['Num_bitstrings']], decay_constants)
+        data.append(step)
+
+    return pd.concat(data, ignore_index=True)
+
+
 # ==================================================================================================
 #   TODO CPMG
 # ==================================================================================================
@@ -532,64 +813,37 @@ def acquire_rabi_data(qc: QuantumComputer,
     :param filename: The name of the file to write JSON-serialized results to
     :return: DataFrame with Rabi results
     """
-    results = []
-    for index, row in rabi_experiment.iterrows():
-        theta = row['Angle']
-        program = row['Program']
-        executable = qc.compiler.native_quil_to_executable(program)
-        bitstrings = qc.run(executable)
-
-        qubits = list(program.get_qubits())
-        for i in range(len(qubits)):
-            avg = np.mean(bitstrings[:, i])
-            results.append({
-                'Qubit': qubits[i],
-                'Angle': theta,
-                'Num_bitstrings': len(bitstrings),
-                'Average': float(avg),
-            })
-
+    df = acquire_sweep_data(qc, rabi_experiment, ['Angle'])
     if filename:
-        pd.DataFrame(results).to_json(filename)
-    return pd.DataFrame(results)
+        df.to_json(filename)
+    return df
 
 
-def estimate_rabi(df: pd.DataFrame):
+def estimate_rabi(df: pd.DataFrame, max_workers: int = None):
     """
     Estimate Rabi oscillation from experimental data.
 
     :param df: Experimental Rabi results to estimate
+    :param max_workers: The number of worker processes used to fit the qubits, see
+        fit_spectroscopy_curves; by default the fits run in this process.
     :return: pandas DataFrame
     """
-    results = []
-
-    for q in df['Qubit'].unique():
+    qubits = df['Qubit'].unique()
+    curves = []
+    for q in qubits:
         df2 = df[df['Qubit'] == q].sort_values('Angle')
-        angles = df2['Angle']
-        prob_of_one = df2['Average']
+        curves.append((df2['Angle'].values, df2['Average'].values))
+    # fit to sinusoid
+    fits = fit_spectroscopy_curves(curves, 'sinusoid', max_workers=max_workers)
 
-        try:
-            # fit to sinusoid
-            fit_params, fit_params_errs = fit_to_sinusoidal_waveform(angles, prob_of_one)
-
-            results.append({
-                'Qubit': q,
-                'Angle': fit_params[1],
-                'Prob_of_one': fit_params[2],
-                'Fit_params': fit_params,
-                'Fit_params_errs': fit_params_errs,
-                'Message': None,
-            })
-        except RuntimeError:
-            print(f"Could not fit to experimental data for qubit {q}")
-            results.append({
-                'Qubit': q,
-                'Angle': None,
-                'Prob_of_one': None,
-                'Fit_params': None,
-                'Fit_params_errs': None,
-                'Message': 'Could not fit to experimental data for qubit' + str(q),
-            })
+    results = []
+    for q, fit in zip(qubits, fits.to_dict('records')):
+        results.append({
+            'Qubit': q,
+            'Angle': fit['Fit_params'][1] if fit['Success'] else None,
+            'Prob_of_one': fit['Fit_params'][2] if fit['Success'] else None,
+            **fit,
+        })
     return pd.DataFrame(results)
 
 
@@ -657,20 +911,37 @@ def generate_cz_phase_ramsey_program(qb: int, other_qb: int, n_shots: int = 1000
     :param n_shots: The number of shots to average over for the data point.
     :return: A parametric Program for performing a CZ Ramsey experiment.
     """
+    return generate_simultaneous_cz_phase_ramsey_program([(qb, other_qb)], n_shots)
+
+
+def generate_simultaneous_cz_phase_ramsey_program(pairs: Sequence[Tuple[int, int]],
+                                                  n_shots: int = 1000) -> Program:
+    """
+    Generate CZ phase Ramsey experiments on several disjoint edges in a single program.
+
+    All the phase kicks are given by the same parameter theta, and the qubit ``pairs[i][0]`` is
+    measured into ``ro[i]``.
+
+    :param pairs: pairs (qb, other_qb) as for generate_cz_phase_ramsey_program, on disjoint edges
+    :param n_shots: The number of shots to average over for the data point.
+    :return: A parametric Program for performing the CZ Ramsey experiments.
+    """
     program = Program()
     # NOTE: only need readout register for `qb` not `other_qb` since `other_qb` is only
     #       needed to identify which CZ gate we're using
-    ro = program.declare('ro', 'BIT', 1)
+    ro = program.declare('ro', 'BIT', len(pairs))
     theta = program.declare('theta', 'REAL')
 
-    # go to the equator
-    program += Program(RX(np.pi / 2, qb))
-    # apply the CZ gate - note that CZ is symmetric, so the order of qubits doesn't matter
-    program += Program(CZ(qb, other_qb))
-    # go to |1> after a phase kick
-    program += Program(RZ(theta, qb), RX(np.pi / 2, qb))
+    for qb, other_qb in pairs:
+        # go to the equator
+        program += Program(RX(np.pi / 2, qb))
+        # apply the CZ gate - note that CZ is symmetric, so the order of qubits doesn't matter
+        program += Program(CZ(qb, other_qb))
+        # go to |1> after a phase kick
+        program += Program(RZ(theta, qb), RX(np.pi / 2, qb))
 
-    program += MEASURE(qb, ro[0])
+    for i, (qb, _) in enumerate(pairs):
+        program += MEASURE(qb, ro[i])
 
     program.wrap_in_numshots_loop(n_shots)
     return program
@@ -747,74 +1018,71 @@ def acquire_cz_phase_ramsey_data(qc: QuantumComputer,
 
         qc.qam.load(binary)
 
+        # rows of a simultaneous experiment hold lists of edges and qubits, measured in order
+        if isinstance(rz_qb, (list, tuple)):
+            edges, rz_qbs = list(edge), list(rz_qb)
+        else:
+            edges, rz_qbs = [edge], [rz_qb]
+
         for theta in np.linspace(start_phase, stop_phase, num_points):
             qc.qam.write_memory(region_name='theta', value=theta)
             qc.qam.run()
             qc.qam.wait()
             bitstrings = qc.qam.read_from_memory_region(region_name="ro")
 
-            avg = np.mean(bitstrings[:, 0])
-            results.append({
-                'Edge': edge,
-                'Rz_qubit': rz_qb,
-                'Phase': theta,
-                'Num_bitstrings': len(bitstrings),
-                'Average': float(avg),
-            })
+            for i, (edge_i, rz_qb_i) in enumerate(zip(edges, rz_qbs)):
+                avg = np.mean(bitstrings[:, i])
+                results.append({
+                    'Edge': edge_i,
+                    'Rz_qubit': rz_qb_i,
+                    'Phase': theta,
+                    'Num_bitstrings': len(bitstrings),
+                    'Average': float(avg),
+                })
 
     if filename:
         pd.DataFrame(results).to_json(filename)
     return pd.DataFrame(results)
 
 
-def estimate_cz_phase_ramsey(df: pd.DataFrame) -> pd.DataFrame:
+def estimate_cz_phase_ramsey(df: pd.DataFrame, max_workers: int = None) -> pd.DataFrame:
     """
     Estimate CZ phase ramsey experimental data.
 
     :param df: Experimental results to plot and fit exponential decay curve to.
-    :return: List of dicts.
+    :param max_workers: The number of worker processes used to fit the curves, see
+        fit_spectroscopy_curves; by default the fits run in this process.
+    :return: pandas DataFrame
     """
-    results = []
-    edges = df['Edge'].unique()
-
-    for id_row, edge in enumerate(edges):
-
-        for id_col, qubit in enumerate(edge):
+    keys = []
+    curves = []
+    for edge in df['Edge'].unique():
+        for qubit in edge:
             qubit_df = df[(df['Rz_qubit'] == qubit) & (df['Edge'] == edge)].sort_values('Phase')
-            phases = qubit_df['Phase']
-            prob_of_one = qubit_df['Average']
-            rz_qb = qubit_df['Rz_qubit'].values[0]
-
-            try:
-                # fit to sinusoid
-                fit_params, fit_params_errs = fit_to_sinusoidal_waveform(phases, prob_of_one)
-                # find max excited state visibility (ESV) and propagate error from fit params
-                max_ESV, max_ESV_err = get_peak_from_fit_params(fit_params, fit_params_errs)
+            keys.append((edge, qubit_df['Rz_qubit'].values[0]))
+            curves.append((qubit_df['Phase'].values, qubit_df['Average'].values))
+    # fit to sinusoid
+    fits = fit_spectroscopy_curves(curves, 'sinusoid', max_workers=max_workers)
 
-                results.append({
-                    'Edge': edge,
-                    'Rz_qubit': rz_qb,
-                    'Angle': fit_params[1],
-                    'Prob_of_one': fit_params[2],
-                    'Fit_params': fit_params,
-                    'Fit_params_errs': fit_params_errs,
-                    'max_ESV': max_ESV,
-                    'max_ESV_err': max_ESV_err,
-                    'Message': None,
-                })
-            except RuntimeError:
-                print(f"Could not fit to experimental data for edge {edge}")
-                results.append({
-                    'Edge': edge,
-                    'Rz_qubit': rz_qb,
-                    'Angle': None,
-                    'Prob_of_one': None,
-                    'Fit_params': None,
-                    'Fit_params_errs': None,
-                    'max_ESV': None,
-                    'max_ESV_err': None,
-                    'Message': 'Could not fit to experimental data for edge' + str(edge),
-                })
+    results = []
+    for (edge, rz_qb), fit in zip(keys, fits.to_dict('records')):
+        max_ESV, max_ESV_err = None, None
+        if fit['Success']:
+            # find max excited state visibility (ESV) and propagate error from fit params
+            max_ESV, max_ESV_err = get_peak_from_fit_params(fit['Fit_params'],
+                                                            fit['Fit_params_errs'])
+        results.append({
+            'Edge': edge,
+            'Rz_qubit': rz_qb,
+            'Angle': fit['Fit_params'][1] if fit['Success'] else None,
+            'Prob_of_one': fit['Fit_params'][2] if fit['Success'] else None,
+            'Fit_params': fit['Fit_params'],
+            'Fit_params_errs': fit['Fit_params_errs'],
+            'max_ESV': max_ESV,
+            'max_ESV_err': max_ESV_err,
+            'Success': fit['Success'],
+            'Message': fit['Message'],
+        })
     return pd.DataFrame(results)
 
 
@@ -873,6 +1141,113 @@ def plot_cz_phase_estimate_over_data(df: pd.DataFrame,
     plt.show()
 
 
+# ==================================================================================================
+#   Simultaneous experiments across the lattice
+# ==================================================================================================
+
+def schedule_simultaneous_groups(graph: nx.Graph,
+                                 groups: Sequence[Tuple[int, ...]] = None,
+                                 exclusion_distance: int = 1) -> List[List[Tuple[int, ...]]]:
+    """
+    Partition groups of qubits, e.g. single qubits or edges, into batches which can be
+    characterized simultaneously without crosstalk.
+
+    Two groups conflict if they share a qubit or if some qubit of one is within
+    exclusion_distance of some qubit of the other in the graph; see
+    :py:func:`forest.benchmarking.utils.simultaneous_batches`.
+
+    :param graph: the qubit connectivity, e.g. ``qc.qubit_topology()``
+    :param groups: the groups of qubits to schedule; by default every qubit of the graph
+    :param exclusion_distance: the graph distance up to which qubits of different groups are not
+        run simultaneously; with 0 only groups sharing a qubit are separated.
+    :return: a list of batches, each a list of groups. Every group is in one batch.
+    """
+    if groups is None:
+        groups = [(q,) for q in sorted(graph.nodes)]
+    groups = [tuple(group) for group in groups]
+    return [[groups[idx] for idx in batch]
+            for batch in simultaneous_batches(groups, graph, exclusion_distance)]
+
+
+def generate_simultaneous_experiments(graph: nx.Graph,
+                                      generator: Callable[..., pd.DataFrame],
+                                      exclusion_distance: int = 1,
+                                      qubits: Sequence[int] = None,
+                                      **kwargs) -> pd.DataFrame:
+    """
+    Generate a single qubit spectroscopy experiment, e.g. T1, T2 or Rabi, for every qubit of a
+    lattice in as few simultaneous batches as crosstalk allows.
+
+    The qubits are scheduled by schedule_simultaneous_groups and each batch is passed as the
+    qubits of one call to the generator. The returned experiment can be run with the acquire
+    function matching the generator, e.g. acquire_t1_data, which reports results per qubit.
+
+    :param graph: the qubit connectivity, e.g. ``qc.qubit_topology()``
+    :param generator: e.g. generate_t1_experiments, generate_t2_echo_experiments or
+        generate_rabi_experiments
+    :param exclusion_distance: see schedule_simultaneous_groups
+    :param qubits: the qubits to characterize; by default every qubit of the graph
+    :param kwargs: further arguments of the generator, e.g. stop_time
+    :return: the concatenated experiments of the batches, with the batch index in a Batch column
+    """
+    groups = None if qubits is None else [(q,) for q in qubits]
+    batches = schedule_simultaneous_groups(graph, groups, exclusion_distance)
+    experiments = []
+    for idx, batch in enumerate(batches):
+        experiment = generator([q for (q,) in batch], **kwargs)
+        experiment['Batch'] = idx
+        experiments.append(experiment)
+    return pd.concat(experiments, ignore_index=True)
+
+
+def generate_simultaneous_cz_phase_ramsey_experiment(graph: nx.Graph,
+                                                     edges: List[Tuple[int, int]] = None,
+                                                     exclusion_distance: int = 1,
+                                                     start_phase: float = 0.0,
+                                                     stop_phase: float = 2 * np.pi,
+                                                     num_points: int = 15,
+                                                     num_shots: int = 1000) -> pd.DataFrame:
+    """
+    Returns a DataFrame of CZ phase ramsey experiments on every edge, in both directions, merged
+    into as few simultaneous batches as crosstalk allows.
+
+    Each row runs the experiments of one batch in a single parametric program; its Edge and
+    Rz_qubit hold lists of the edges and measured qubits in readout order, which
+    acquire_cz_phase_ramsey_data splits back into one result per edge and qubit.
+
+    :param graph: the qubit connectivity, e.g. ``qc.qubit_topology()``
+    :param edges: List of Tuples containing edges that one can perform a CZ on; by default every
+        edge of the graph.
+    :param exclusion_distance: see schedule_simultaneous_groups
+    :param start_phase: The starting phase for the CZ phase Ramsey experiment.
+    :param stop_phase: The stopping phase for the CZ phase Ramsey experiment.
+    :param num_points: The number of points to sample at between the starting and stopping phase.
+    :param num_shots: The number of shots to average over for each data point.
+    :return: pandas DataFrame
+    """
+    if edges is None:
+        edges = list(graph.edges)
+    # the two directions of an edge share its CZ and so always land in different batches
+    edge_of = {}
+    for edge in edges:
+        edge_of[tuple(edge)] = edge_of[tuple(edge)[::-1]] = tuple(edge)
+    directed = list(edge_of.keys())
+    batches = schedule_simultaneous_groups(graph, directed, exclusion_distance)
+
+    cz_experiment = []
+    for batch in batches:
+        cz_experiment.append({
+            'Edge': [edge_of[pair] for pair in batch],
+            'Rz_qubit': [pair[0] for pair in batch],
+            'Program': generate_simultaneous_cz_phase_ramsey_program(batch, num_shots),
+            'Start_phase': start_phase,
+            'Stop_phase': stop_phase,
+            'Num_points': num_points,
+            'Num_shots': num_shots,
+        })
+    return pd.DataFrame(cz_experiment)
+
+
 # ==================================================================================================
 #   Fits and so forth
 # ==================================================================================================
@@ -894,17 +1269,21 @@ def exponential_decay_curve(t: Union[float, np.ndarray],
 
 
 def fit_to_exponential_decay_curve(x_data: np.ndarray,
-                                   y_data: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+                                   y_data: np.ndarray,
+                                   p0: Sequence[float] = None) -> Tuple[np.ndarray, np.ndarray]:
     """
     Fit experimental data to exponential decay curve.
 
     :param x_data: Independent data to fit to.
     :param y_data: Experimental, dependent data to fit to.
+    :param p0: Initial guess of the parameters; by default guess_exponential_decay(x_data, y_data)
     :return: Arrays of fitted decay curve parameters and their errors
     """
+    if p0 is None:
+        p0 = guess_exponential_decay(x_data, y_data)
     params, params_covariance = optimize.curve_fit(exponential_decay_curve,
                                                    x_data, y_data,
-                                                   p0=[1.0, 15e-6, 0.0])
+                                                   p0=p0)
 
     # parameter error extraction from
     # https://docs.scipy.org/doc/scipy/reference/generated/scipy.optimize.curve_fit.html
@@ -934,6 +1313,7 @@ def sinusoidal_waveform(x: float,
 def fit_to_sinusoidal_waveform(x_data: np.ndarray,
                                y_data: List[float],
                                displayflag: bool = False,
+                               p0: Sequence[float] = None,
                                ) -> Tuple[np.ndarray, np.ndarray]:
     """
     Fit experimental data to sinusoid.
@@ -941,10 +1321,12 @@ def fit_to_sinusoidal_waveform(x_data: np.ndarray,
     :param x_data: Independent data to fit to.
     :param y_data: Experimental, dependent data to fit to.
     :param displayflag: If True displays results from scipy curve fit analysis.
+    :param p0: Initial guess of the parameters; by default guess_sinusoid(x_data, y_data)
     :return: Arrays of fitted decay curve parameters and their standard deviations
     """
-    params, params_covariance = optimize.curve_fit(sinusoidal_waveform, x_data, y_data,
-                                                   p0=[0.5, 0.5, 1.0, np.pi / 2])
+    if p0 is None:
+        p0 = guess_sinusoid(x_data, y_data)
+    params, params_covariance = optimize.curve_fit(sinusoidal_waveform, x_data, y_data, p0=p0)
     # parameter error extraction from
     # https://docs.scipy.org/doc/scipy/reference/generated/scipy.optimize.curve_fit.html
     params_errs = np.sqrt(np.diag(params_covariance))
@@ -980,17 +1362,11 @@ def get_peak_from_fit_params(fit_params: np.ndarray,
     freq = fit_params[-2]
     freq_err = fit_params_errs[-2]
 
-    print("propagating error using x_0 = {} +/- {} and freq = {} +/- {}".format(x0, x0_err,
-                                                                                freq, freq_err))
-
     # find the phase corresponding to maximum excited state visibility (ESV) using the fit params
     max_ESV = (np.pi / 2 - x0) / freq
     # max_ESV_err obtained by applying error propagation formula to max_ESV
     max_ESV_err = np.sqrt((x0_err / freq) ** 2 + ((np.pi / 2 - x0) * (freq_err / freq ** 2)) ** 2)
 
-    print("\nmaximum excited state visibility observed at x = {} +/- {}".format(max_ESV,
-                                                                                max_ESV_err))
-
     return max_ESV, max_ESV_err
 
 
@@ -1017,19 +1393,25 @@ def exponentially_decaying_sinusoidal_curve(t: Union[float, np.ndarray],
 
 def fit_to_exponentially_decaying_sinusoidal_curve(x_data: np.ndarray,
                                                    y_data: np.ndarray,
-                                                   detuning: float = 5e6) -> Tuple[np.ndarray,
-                                                                                   np.ndarray]:
+                                                   detuning: float = 5e6,
+                                                   p0: Sequence[float] = None) -> Tuple[np.ndarray,
+                                                                                        np.ndarray]:
     """
     Fit experimental data to exponential decay curve.
 
     :param x_data: Independent data to fit to.
     :param y_data: Experimental, dependent data to fit to.
-    :param detuning: Detuning frequency used in experiment creation.
+    :param detuning: Detuning frequency used in experiment creation, see
+        guess_exponentially_decaying_sinusoid.
+    :param p0: Initial guess of the parameters; by default
+        guess_exponentially_decaying_sinusoid(x_data, y_data, detuning)
     :return: Arrays of fitted decay curve parameters and their errors
     """
+    if p0 is None:
+        p0 = guess_exponentially_decaying_sinusoid(x_data, y_data, detuning)
     params, params_covariance = optimize.curve_fit(exponentially_decaying_sinusoidal_curve,
                                                    x_data, y_data,
-                                                   p0=[0.5, 15e-6, detuning, 0.5, 0.0])
+                                                   p0=p0)
 
     # parameter error extraction from
     # https://docs.scipy.org/doc/scipy/reference/generated/scipy.optimize.curve_fit.html
@@ -1038,6 +1420,188 @@ def fit_to_exponentially_decaying_sinusoidal_curve(x_data: np.ndarray,
     return params, params_errs
 
 
+# ==================================================================================================
+#   Initial guesses and batch fitting
+# ==================================================================================================
+
+def guess_exponential_decay(x_data: np.ndarray, y_data: np.ndarray) -> np.ndarray:
+    """
+    Estimate the parameters of exponential_decay_curve by a log-linear regression.
+
+    The logarithm of the positive data points is fit to a line, weighting each point by its
+    value to account for the larger relative noise of small values. If the data do not decay
+    the time constant is guessed to be the span of x_data.
+
+    :param x_data: Independent data.
+    :param y_data: Experimental, dependent data.
+    :return: guesses of the amplitude, time decay constant and time offset (zero)
+    """
+    x_data = np.asarray(x_data, dtype=float)
+    y_data = np.asarray(y_data, dtype=float)
+    span = np.ptp(x_data) if len(x_data) > 1 and np.ptp(x_data) > 0 else 1.0
+
+    positive = y_data > 0
+    if np.count_nonzero(positive) >= 2 and np.ptp(x_data[positive]) > 0:
+        slope, intercept = np.polyfit(x_data[positive], np.log(y_data[positive]), 1,
+                                      w=y_data[positive])
+        if slope < 0:
+            return np.array([np.exp(intercept), -1 / slope, 0.0])
+    return np.array([max(np.max(y_data), np.finfo(float).eps), span, 0.0])
+
+
+def _frequency_grid(x_data: np.ndarray, extra: Sequence[float] = ()) -> np.ndarray:
+    """
+    Angular frequencies from a quarter of a period over the span of x_data up to the Nyquist
+    frequency of its typical spacing, together with any extra frequencies below the latter.
+    """
+    xs = np.unique(x_data)
+    span = xs[-1] - xs[0]
+    nyquist = np.pi / np.median(np.diff(xs))
+    grid = np.linspace(np.pi / (2 * span), nyquist, 10 * len(xs))
+    extra = [f for f in extra if 0 < f <= nyquist]
+    return np.concatenate([grid, extra])
+
+
+def _least_squares_periodogram(x_data: np.ndarray, y_data: np.ndarray, frequencies: np.ndarray,
+                               envelopes: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fit y = envelope(x) (a sin(f x) + b cos(f x)) + c by linear least squares for every angular
+    frequency f and envelope at once, i.e. a generalized Lomb-Scargle periodogram.
+
+    :param x_data: Independent data, shape (N,).
+    :param y_data: Dependent data, shape (N,).
+    :param frequencies: angular frequencies, shape (F,).
+    :param envelopes: envelopes evaluated at x_data, shape (E, N); by default a constant.
+    :return: the residual sums of squares, shape (E, F), and the coefficients (a, b, c), shape
+        (E, F, 3).
+    """
+    if envelopes is None:
+        envelopes = np.ones((1, len(x_data)))
+    sines = np.sin(np.outer(frequencies, x_data))
+    cosines = np.cos(np.outer(frequencies, x_data))
+    squared = envelopes ** 2
+
+    # the normal equations, with each entry a sum over x_data computed as an (E, F) matmul
+    gram = np.empty((len(envelopes), len(frequencies), 3, 3))
+    gram[..., 0, 0] = squared @ (sines ** 2).T
+    gram[..., 1, 1] = squared @ (cosines ** 2).T
+    gram[..., 0, 1] = gram[..., 1, 0] = squared @ (sines * cosines).T
+    gram[..., 0, 2] = gram[..., 2, 0] = envelopes @ sines.T
+    gram[..., 1, 2] = gram[..., 2, 1] = envelopes @ cosines.T
+    gram[..., 2, 2] = len(x_data)
+    projections = np.stack([(envelopes * y_data) @ sines.T, (envelopes * y_data) @ cosines.T,
+                            np.full(gram.shape[:2], np.sum(y_data))], axis=-1)
+
+    # regularize frequencies for which sin(f x) is nearly constant over x_data
+    gram += 1e-12 * np.trace(gram, axis1=-2, axis2=-1)[..., None, None] * np.eye(3)
+    coefficients = np.linalg.solve(gram, projections[..., None])[..., 0]
+    residuals = y_data @ y_data - np.sum(coefficients * projections, axis=-1)
+    return residuals, coefficients
+
+
+def guess_sinusoid(x_data: np.ndarray, y_data: np.ndarray) -> np.ndarray:
+    """
+    Estimate the parameters of sinusoidal_waveform from the least squares periodogram of the data.
+
+    :param x_data: Independent data.
+    :param y_data: Experimental, dependent data.
+    :return: guesses of the amplitude (positive), baseline, angular frequency and x offset
+    """
+    x_data = np.asarray(x_data, dtype=float)
+    y_data = np.asarray(y_data, dtype=float)
+    frequencies = _frequency_grid(x_data)
+    residuals, coefficients = _least_squares_periodogram(x_data, y_data, frequencies)
+    best = np.argmin(residuals[0])
+    a, b, c = coefficients[0, best]
+    return np.array([np.hypot(a, b), c, frequencies[best], np.arctan2(b, a)])
+
+
+def guess_exponentially_decaying_sinusoid(x_data: np.ndarray, y_data: np.ndarray,
+                                          detuning: float = None) -> np.ndarray:
+    """
+    Estimate the parameters of exponentially_decaying_sinusoidal_curve from least squares
+    periodograms of the data with a range of exponential envelopes.
+
+    :param x_data: Independent data.
+    :param y_data: Experimental, dependent data.
+    :param detuning: an optional expected frequency of the oscillation, e.g. the detuning used in
+        experiment creation, which is added to the frequencies searched as is and as an angular
+        frequency.
+    :return: guesses of the amplitude (positive), time decay constant, angular frequency,
+        baseline and time offset
+    """
+    x_data = np.asarray(x_data, dtype=float)
+    y_data = np.asarray(y_data, dtype=float)
+    extra = [] if detuning is None else [detuning, 2 * np.pi * detuning]
+    frequencies = _frequency_grid(x_data, extra)
+    span = np.ptp(x_data)
+    decay_constants = span * np.geomspace(.05, 20, 25)
+    envelopes = np.exp(-np.outer(1 / decay_constants, x_data))
+    residuals, coefficients = _least_squares_periodogram(x_data, y_data, frequencies, envelopes)
+    e, f = np.unravel_index(np.argmin(residuals), residuals.shape)
+    a, b, c = coefficients[e, f]
+    # a sin(f t) + b cos(f t) = A sin(f (t - t0)) with A = |(a, b)| and f t0 = -atan2(b, a)
+    return np.array([np.hypot(a, b), decay_constants[e], frequencies[f], c,
+                     -np.arctan2(b, a) / frequencies[f]])
+
+
+_CURVE_FITTERS = {
+    'exponential_decay': fit_to_exponential_decay_curve,
+    'sinusoid': fit_to_sinusoidal_waveform,
+    'exponentially_decaying_sinusoid': fit_to_exponentially_decaying_sinusoidal_curve,
+}
+
+
+def _fit_spectroscopy_curve(args: Tuple[str, np.ndarray, np.ndarray, dict]) -> dict:
+    """
+    Fit a single curve and record whether the fit succeeded; a module level function so that it
+    can be run in a worker process.
+    """
+    kind, x_data, y_data, kwargs = args
+    try:
+        fit_params, fit_params_errs = _CURVE_FITTERS[kind](x_data, y_data, **kwargs)
+    except (RuntimeError, ValueError, np.linalg.LinAlgError) as error:
+        return {'Fit_params': None, 'Fit_params_errs': None, 'Success': False,
+                'Message': str(error)}
+    if not np.all(np.isfinite(fit_params)):
+        return {'Fit_params': None, 'Fit_params_errs': None, 'Success': False,
+                'Message': 'Fit diverged'}
+    return {'Fit_params': fit_params, 'Fit_params_errs': fit_params_errs, 'Success': True,
+            'Message': None}
+
+
+def fit_spectroscopy_curves(curves: Sequence[Tuple[np.ndarray, np.ndarray]],
+                            kind: str,
+                            kwargs: Sequence[dict] = None,
+                            max_workers: int = None) -> pd.DataFrame:
+    """
+    Fit many spectroscopy curves, e.g. one per qubit of a lattice, at once.
+
+    Each fit starts from the data driven guess of guess_exponential_decay, guess_sinusoid or
+    guess_exponentially_decaying_sinusoid, and the fits are distributed over a pool of worker
+    processes. Failed fits are reported in the returned table rather than raised or printed.
+
+    :param curves: a sequence of (x_data, y_data) pairs.
+    :param kind: one of 'exponential_decay', 'sinusoid' or 'exponentially_decaying_sinusoid'.
+    :param kwargs: optional extra keyword arguments of the fit function for each curve, e.g. the
+        detuning for 'exponentially_decaying_sinusoid'.
+    :param max_workers: The number of worker processes, see
+        :py:func:`forest.benchmarking.utils.parallel_map`; by default the fits run in this
+        process.
+    :return: pandas DataFrame with one row per curve and columns Fit_params, Fit_params_errs,
+        Success and Message, which describes why a fit failed.
+    """
+    if kind not in _CURVE_FITTERS:
+        raise ValueError("kind must be one of " + ", ".join(_CURVE_FITTERS))
+    if kwargs is None:
+        kwargs = [{} for _ in curves]
+    fits = parallel_map(_fit_spectroscopy_curve,
+                        [(kind, np.asarray(x_data, dtype=float), np.asarray(y_data, dtype=float),
+                          kws) for (x_data, y_data), kws in zip(curves, kwargs)],
+                        max_workers=max_workers)
+    return pd.DataFrame(fits, columns=['Fit_params', 'Fit_params_errs', 'Success', 'Message'])
+
+
 def compile_parametric_program(qc: QuantumComputer,
                                parametric_prog: Program,
                                num_shots: int = 1000) -> None:
@@ -1,23 +1,30 @@
 from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import lru_cache
 from math import pi
-from typing import Iterable, List, Tuple
+from typing import Dict, Iterable, List, Sequence, Tuple
 from itertools import chain
 
 import numpy as np
 from lmfit import Model
-from numpy import bincount
 from numpy import pi
 from pandas import DataFrame, Series
 from pyquil.operator_estimation import measure_observables
-from scipy.stats import beta
 
 from pyquil.api import BenchmarkConnection, QuantumComputer
 from pyquil.gates import CZ, RX, RZ
 from pyquil.quilbase import Gate
 from pyquil.quil import address_qubits, merge_programs
 from pyquil import Program
-from pyquil.quilatom import QubitPlaceholder
-from forest.benchmarking.tomography import generate_state_tomography_experiment, acquire_tomography_data
+from pyquil.quilatom import Qubit, QubitPlaceholder
+from pyquil.unitary_tools import program_unitary
+from forest.benchmarking.compilation import zxzxz_angles
+from forest.benchmarking.utils import parallel_map
+from forest.benchmarking.superoperator_tools import kraus2pauli_liouville, vec, \
+    computational2pauli_basis_matrix, pauli2computational_basis_matrix
+from forest.benchmarking.tomography import generate_state_tomography_experiment, acquire_tomography_data, \
+    generate_simultaneous_state_tomography_experiment, simultaneous_state_tomography_results
+from forest.benchmarking.clifford_group import CliffordGroup
 
 RB_TYPES = ["std-1q", "std-2q", "sim-1q", "sim-2q"]
 
@@ -65,13 +72,14 @@ def rb_dataframe(rb_type: str, subgraph: List[Tuple], depths: List[int],
     return DataFrame(df_dict())
 
 
-def add_sequences_to_dataframe(df: DataFrame, bm: BenchmarkConnection, random_seed: int = None, interleaved_gate: Program = None):
+def add_sequences_to_dataframe(df: DataFrame, bm: BenchmarkConnection = None, random_seed: int = None, interleaved_gate: Program = None):
     """
     Generates a new random sequence for each row in the measurement DataFrame and adds these to a
     copy of the DataFrame. Returns the new DataFrame.
 
     :param df: An rb dataframe populated with subgraph and depth columns whose copy will be populated with sequences.
-    :param bm: A benchmark connection that will do the grunt work of generating the sequences
+    :param bm: A benchmark connection that will do the grunt work of generating the sequences. If
+        None, the sequences are generated locally by a precomputed :py:class:`CliffordGroup`.
     :param random_seed: Base random seed used to seed compiler for sequence generation for each subgraph element
     :param interleaved_gate: Gate to interleave in between Cliffords; used for interleaved RB experiment
     :return: New DataFrame with the desired rb sequences stored in "Sequence" column
@@ -101,10 +109,21 @@ def rb_seq_to_program(rb_seq: List[Program], subgraph: List[Tuple]) -> Program:
     return program.measure_all(*zip(qubits,ro))
 
 
-def run_rb_measurement(df: DataFrame, qc: QuantumComputer, num_trials: int):
+def run_rb_measurement(df: DataFrame, qc: QuantumComputer, num_trials: int,
+                       use_param_program: bool = False):
     """
     Executes trials on all sequences and adds the results to a copy of the DataFrame. Returns
     the new DataFrame.
+
+    :param df: An rb dataframe populated with "Sequence" and "Subgraph" columns.
+    :param qc: The quantum computer on which to run the sequences.
+    :param num_trials: The number of shots to take for each sequence.
+    :param use_param_program: If True, each sequence is rewritten in the fixed native form of
+        parameterize_rb_sequence and one parametric executable is compiled per distinct
+        multi-qubit gate structure: per (depth, subgraph) for 1q RB, and per pattern of CZ
+        counts of the Cliffords for 2q RB. Each sequence is then run by writing its RZ angles to
+        memory rather than being compiled separately.
+    :return: New DataFrame with the shot data for each sequence stored in a "Results" column.
     """
     new_df = df.copy()
 
@@ -112,12 +131,106 @@ def run_rb_measurement(df: DataFrame, qc: QuantumComputer, num_trials: int):
         prog = rb_seq_to_program(seq, sg).wrap_in_numshots_loop(num_trials)
         executable = qc.compiler.native_quil_to_executable(prog)
         return qc.run(executable)
+
+    executables = {}
+
+    def run_parametric(qc: QuantumComputer, seq: List[Program], sg: List[Tuple],
+                       num_trials: int) -> np.ndarray:
+        structure, angles = parameterize_rb_sequence(seq, sg)
+        key = (tuple(map(tuple, sg)), structure)
+        if key not in executables:
+            prog = rb_template_program(structure, sg).wrap_in_numshots_loop(num_trials)
+            executables[key] = qc.compiler.native_quil_to_executable(prog)
+        return qc.run(executables[key], memory_map={'theta': list(angles)})
+
     seqs = new_df["Sequence"].values
     sgs = new_df["Subgraph"].values
-    new_df["Results"] = Series([run(qc, seq, sg, num_trials) for seq, sg in zip(seqs, sgs)])
+    runner = run_parametric if use_param_program else run
+    new_df["Results"] = Series([runner(qc, seq, sg, num_trials) for seq, sg in zip(seqs, sgs)])
     return new_df
 
 
+@lru_cache(maxsize=None)
+def _single_qubit_gate_matrix(name: str, params: Tuple[float]) -> np.ndarray:
+    return program_unitary(Program(Gate(name, params, [Qubit(0)])), 1)
+
+
+def parameterize_rb_sequence(rb_seq: List[Program], subgraph: List[Tuple]) -> Tuple[Tuple, np.ndarray]:
+    """
+    Rewrite an RB sequence in a fixed native form in which only RZ angles vary.
+
+    Within each Clifford, the single qubit gates acting on a qubit before, between and after its
+    multi-qubit gates are merged and re-expressed as RZ RX(pi/2) RZ RX(pi/2) RZ (see
+    :py:func:`zxzxz_angles`). What remains is the structure of the sequence: the multi-qubit
+    gates of each Clifford, in order. For 1q RB the structure depends only on the depth, so all
+    sequences at a given depth share one template program; for 2q RB it also records the number
+    of CZs in each Clifford. CZs are never padded, since each physical CZ adds error, so the
+    template runs the same multi-qubit gates as the sequence itself.
+
+    :param rb_seq: List of Programs, one per Clifford, e.g. as stored in the "Sequence" column.
+    :param subgraph: The qubit singletons or pairs on which the sequence acts.
+    :return: The structure of the sequence and the flat array of RZ angles that, written to the
+        "theta" region of rb_template_program(structure, subgraph), reproduce the sequence.
+    """
+    qubits = list(chain.from_iterable(subgraph))
+    structure = []
+    angles = []
+    for clifford in rb_seq:
+        merged = {q: np.eye(2) for q in qubits}
+        multi_qubit_gates = []
+        for inst in clifford.instructions:
+            if not isinstance(inst, Gate):
+                raise ValueError(f"RB sequences should only contain gates, found {inst}")
+            gate_qubits = tuple(q.index for q in inst.qubits)
+            if len(gate_qubits) == 1:
+                gate_matrix = _single_qubit_gate_matrix(inst.name, tuple(inst.params))
+                merged[gate_qubits[0]] = gate_matrix @ merged[gate_qubits[0]]
+            else:
+                for q in gate_qubits:
+                    angles.extend(zxzxz_angles(merged[q]))
+                    merged[q] = np.eye(2)
+                multi_qubit_gates.append((inst.name, tuple(inst.params), gate_qubits))
+        for q in qubits:
+            angles.extend(zxzxz_angles(merged[q]))
+        structure.append(tuple(multi_qubit_gates))
+    return tuple(structure), np.array(angles)
+
+
+def rb_template_program(structure: Tuple, subgraph: List[Tuple]) -> Program:
+    """
+    Build the parametric program, with measurements, for RB sequences of the given structure.
+
+    Every merged single qubit segment is RZ(theta[k]) RX(pi/2) RZ(theta[k+1]) RX(pi/2)
+    RZ(theta[k+2]), in the order in which parameterize_rb_sequence produces the angles.
+
+    :param structure: The structure returned by parameterize_rb_sequence.
+    :param subgraph: The qubit singletons or pairs on which the sequence acts.
+    :return: A Program declaring a "theta" REAL region and measuring the subgraph qubits into "ro".
+    """
+    qubits = list(chain.from_iterable(subgraph))
+    num_segments = sum(len(qubits) + sum(len(gate[2]) for gate in clifford)
+                       for clifford in structure)
+    program = Program()
+    theta = program.declare('theta', 'REAL', 3 * num_segments)
+    offset = 0
+
+    def segment(q: int):
+        nonlocal offset
+        program.inst(RZ(theta[offset], q), RX(pi / 2, q), RZ(theta[offset + 1], q),
+                     RX(pi / 2, q), RZ(theta[offset + 2], q))
+        offset += 3
+
+    for clifford in structure:
+        for name, params, gate_qubits in clifford:
+            for q in gate_qubits:
+                segment(q)
+            program.inst(Gate(name, params, [Qubit(q) for q in gate_qubits]))
+        for q in qubits:
+            segment(q)
+    ro = program.declare('ro', 'BIT', len(qubits))
+    return program.measure_all(*zip(qubits, ro))
+
+
 def oneq_rb_gateset(qubit: QubitPlaceholder) -> Gate:
     """
     Yield the gateset for 1-qubit randomized benchmarking.
@@ -180,6 +293,20 @@ def generate_rb_sequence(compiler: BenchmarkConnection, rb_type: str,
     return programs, q_placeholders
 
 
+@lru_cache(maxsize=None)
+def get_local_clifford_group(rb_type: str) -> CliffordGroup:
+    """
+    The Clifford group over the RB gateset of the given type, enumerated once and cached.
+
+    Generating sequences from the returned group needs no BenchmarkConnection; the 1q group has
+    24 elements and the 2q group 11520.
+
+    :param rb_type: "1q" or "2q".
+    :return: the Clifford group decomposed into the gates of ``get_rb_gateset(rb_type)``.
+    """
+    return CliffordGroup(*get_rb_gateset(rb_type))
+
+
 def generate_simultaneous_rb_sequence(bm: BenchmarkConnection, subgraph: list,
                                       depth: int,  random_seed: int = None, interleaved_gate: Program = None) -> list:
     """
@@ -187,7 +314,9 @@ def generate_simultaneous_rb_sequence(bm: BenchmarkConnection, subgraph: list,
     simultaneous Clifford on the given subgraph (single qubit or pair of qubits), and where the
     execution of all the Programs composes to the Identity on all edges.
 
-    :param bm: A benchmark connection that will do the grunt work of generating the sequences
+    :param bm: A benchmark connection that will do the grunt work of generating the sequences. If
+        None, the sequences are sampled locally from the cached group ``get_local_clifford_group``,
+        without any calls to the compiler service.
     :param subgraph: Iterable of tuples of integers specifying qubit singletons or pairs
     :param depth: The total number of Cliffords to perform on all edges (including inverse)
     :param random_seed: Base random seed used to seed compiler for sequence generation for each subgraph element
@@ -206,6 +335,11 @@ def generate_simultaneous_rb_sequence(bm: BenchmarkConnection, subgraph: list,
         gateset = list(twoq_rb_gateset(*q_placeholders))
     else:
         raise ValueError("Subgraph elements must have length 1 or 2.")
+    if bm is None:
+        group = get_local_clifford_group(f"{size}q")
+        seeds = [None if random_seed is None else random_seed + j for j in range(len(subgraph))]
+        return merge_sequences([group.generate_rb_sequence(depth, qubits, seed, interleaved_gate)
+                                for qubits, seed in zip(subgraph, seeds)])
     sequences = []
     for j, qubits in enumerate(subgraph):
         if random_seed is not None:
@@ -250,13 +384,14 @@ def strip_inverse_from_sequences(df: DataFrame):
     return new_df
 
 
-def add_unitarity_sequences_to_dataframe(df: DataFrame, bm: BenchmarkConnection, random_seed: int = None):
+def add_unitarity_sequences_to_dataframe(df: DataFrame, bm: BenchmarkConnection = None, random_seed: int = None):
     """
     Generates a new random unitarity sequence for each row in the measurement DataFrame and adds
     these to a copy of the DataFrame.
 
     A unitarity sequence of depth D is a standard RB sequence
-    of depth D+1 with the last (inversion) gate stripped. Returns the new DataFrame.
+    of depth D+1 with the last (inversion) gate stripped. Returns the new DataFrame. If no
+    benchmark connection bm is given the sequences are generated locally.
     """
     new_df = df.copy()
     if random_seed is not None:
@@ -271,15 +406,31 @@ def add_unitarity_sequences_to_dataframe(df: DataFrame, bm: BenchmarkConnection,
     return stripped_seq_df
 
 
-def run_unitarity_measurement(df: DataFrame, qc: QuantumComputer, num_trials: int):
+def run_unitarity_measurement(df: DataFrame, qc: QuantumComputer, num_trials: int,
+                              simultaneous_tomography: bool = False):
     """
     Execute trials on all sequences and add the results to a copy of the DataFrame. Returns the
     new DataFrame.
+
+    :param df: A unitarity dataframe populated with "Sequence" and "Subgraph" columns.
+    :param qc: The quantum computer on which to run the sequences.
+    :param num_trials: The number of shots per measured observable.
+    :param simultaneous_tomography: If True, the states of all subgraph elements are
+        tomographized by one experiment which measures a product of local Pauli bases on every
+        element in each execution (see generate_simultaneous_state_tomography_experiment), so
+        there are 3^k executions for elements of k qubits, however many elements there are.
+        This mode neither symmetrizes nor calibrates readout. Otherwise each element is
+        tomographized by a separate experiment.
+    :return: New DataFrame with a "Results" column holding, per subgraph element, the
+        (expectations, variances) of its non-identity Pauli operators.
     """
     new_df = df.copy()
     def run(qc: QuantumComputer, seq: List[Program], subgraph: List[List[int]], num_trials: int) -> np.ndarray:
         prog = merge_programs(seq)
-        # TODO: parallelize
+        if simultaneous_tomography:
+            tomo_exp = generate_simultaneous_state_tomography_experiment(prog, subgraph)
+            _rs = list(measure_observables(qc, tomo_exp, num_trials, calibrate_readout=None))
+            return simultaneous_state_tomography_results(_rs, subgraph)
         results = []
         for qubits in subgraph:
             state_prep = prog
@@ -314,6 +465,194 @@ def unitarity_to_RB_decay(unitarity, dimension):
     return average_gate_infidelity_to_RB_decay(r, dimension)
 
 
+########
+# Simulation
+########
+
+
+def _restrict_to_element(program: Program, element: Tuple) -> Tuple:
+    """
+    The gates of a program which act on the qubits of a subgraph element, as a hashable tuple of
+    (name, params, positions) where the first qubit of the element has the highest position.
+    """
+    positions = {q: len(element) - 1 - j for j, q in enumerate(element)}
+    gates = []
+    for inst in program.instructions:
+        if not isinstance(inst, Gate):
+            continue
+        qubits = [q.index for q in inst.qubits]
+        if not any(q in positions for q in qubits):
+            continue
+        if not all(q in positions for q in qubits):
+            raise ValueError("Gate {} acts across subgraph elements.".format(inst))
+        gates.append((inst.name, tuple(inst.params), tuple(positions[q] for q in qubits)))
+    return tuple(gates)
+
+
+def _gates_ptm(gates: Tuple, num_qubits: int) -> np.ndarray:
+    program = Program([Gate(name, params, [Qubit(p) for p in positions])
+                       for name, params, positions in gates])
+    return kraus2pauli_liouville([program_unitary(program, num_qubits)]).real
+
+
+def _noise_ptm(noise, element: Tuple) -> np.ndarray:
+    if isinstance(noise, dict):
+        noise = noise.get(tuple(element))
+    if noise is None:
+        return np.eye(4 ** len(element))
+    kraus_ops = list(noise)
+    if kraus_ops[0].shape != (2 ** len(element),) * 2:
+        raise ValueError("The noise on {} must act on {} qubits.".format(element, len(element)))
+    return kraus2pauli_liouville(kraus_ops).real
+
+
+def simulate_pauli_vectors(df: DataFrame, noise=None) -> List[List[np.ndarray]]:
+    """
+    Exactly simulate the final state of every subgraph element for every sequence, using
+    Pauli-transfer matrices.
+
+    Each Clifford of a sequence is restricted to the qubits of each subgraph element and turned
+    into a 4x4 (1q) or 16x16 (2q) Pauli-transfer matrix (PTM), followed by the PTM of the noise
+    channel on that element; these are cached so each distinct Clifford is converted once. The
+    state |0...0> of every (sequence, element) pair with the same number of Cliffords is then
+    propagated through its noisy Cliffords in a single batched product, at a cost of O(depth d^4)
+    per pair for Hilbert space dimension d.
+
+    Noise is local to the elements, so elements are simulated independently of one another.
+
+    :param df: A DataFrame with "Sequence" and "Subgraph" columns, e.g. of an RB or unitarity
+        measurement.
+    :param noise: The Kraus operators of a channel applied after every Clifford. Either a list of
+        Kraus operators applied to every subgraph element, or a dictionary mapping subgraph
+        elements to lists of Kraus operators (elements which are absent are noiseless). As for
+        ``define_noisy_gate``, the first qubit of an element is the most significant tensor
+        factor of the Kraus operators. None gives noiseless sequences.
+    :return: Per row, a list with the Pauli vector of the final state of each subgraph element,
+        i.e. the coefficients c_k of rho = sum_k c_k sigma_k in the order of n_qubit_pauli_basis.
+    """
+    vectors = [[None] * len(sg) for sg in df["Subgraph"].values]
+    ptm_index = {}
+    noisy_ptms = {}
+    buckets = OrderedDict()
+    for row, (seq, sg) in enumerate(zip(df["Sequence"].values, df["Subgraph"].values)):
+        for idx, element in enumerate(sg):
+            element = tuple(element)
+            noise_ptm = _noise_ptm(noise, element)
+            indices = []
+            for clifford in seq:
+                key = (element, _restrict_to_element(clifford, element))
+                if key not in ptm_index:
+                    cache = noisy_ptms.setdefault(len(element), [])
+                    ptm_index[key] = len(cache)
+                    cache.append(noise_ptm @ _gates_ptm(key[1], len(element)))
+                indices.append(ptm_index[key])
+            buckets.setdefault((len(element), len(seq)), []).append((row, idx, indices))
+
+    noisy_ptms = {num_qubits: np.array(ptms) for num_qubits, ptms in noisy_ptms.items()}
+    for (num_qubits, _), entries in buckets.items():
+        dim = 2 ** num_qubits
+        ground = np.zeros((dim, dim))
+        ground[0, 0] = 1
+        initial = (computational2pauli_basis_matrix(dim) @ vec(ground)).real[:, 0]
+
+        indices = np.array([e[2] for e in entries], dtype=int).reshape(len(entries), -1)
+        ptms = noisy_ptms[num_qubits]
+        state = np.tile(initial, (len(entries), 1))
+        for step in indices.T:
+            state = np.einsum('sij,sj->si', ptms[step], state)
+        for (row, idx, _), pauli_vector in zip(entries, state):
+            vectors[row][idx] = pauli_vector
+    return vectors
+
+
+def _outcome_probabilities(pauli_vector: np.ndarray) -> np.ndarray:
+    """
+    The probabilities of the computational basis outcomes of a state given by its Pauli vector,
+    with the first qubit as the most significant bit of the outcome.
+    """
+    dim = int(np.sqrt(pauli_vector.shape[-1]))
+    vec_rho = pauli_vector @ pauli2computational_basis_matrix(dim).T
+    probs = vec_rho[..., ::dim + 1].real
+    return np.clip(probs, 0, 1)
+
+
+def simulate_rb_measurement(df: DataFrame, noise=None, num_trials: int = None,
+                            random_seed: int = None) -> DataFrame:
+    """
+    Simulate an RB measurement in process, without a QVM, and add the results to a copy of the
+    DataFrame. Returns the new DataFrame.
+
+    See :py:func:`simulate_pauli_vectors` for the simulation and the specification of noise.
+
+    :param df: An RB DataFrame populated with "Sequence" and "Subgraph" columns.
+    :param noise: The noise channel applied after every Clifford, see simulate_pauli_vectors.
+    :param num_trials: If None the exact survival probabilities are added as "Survival Means",
+        with zero "Survival Errors". Otherwise num_trials shots are sampled for every sequence and
+        added to the "Results" column in the format of :py:func:`run_rb_measurement`.
+    :param random_seed: Seed for sampling shots.
+    :return: New DataFrame with survival or "Results" columns.
+    """
+    new_df = df.copy()
+    vectors = simulate_pauli_vectors(new_df, noise)
+    if num_trials is None:
+        survivals = [[_outcome_probabilities(v)[0] for v in row] for row in vectors]
+        new_df["Survival Means"] = Series(survivals, index=new_df.index)
+        new_df["Survival Errors"] = Series([[0.] * len(s) for s in survivals], index=new_df.index)
+        return new_df
+
+    random_state = np.random.RandomState(random_seed)
+    results = []
+    for sg, row in zip(new_df["Subgraph"].values, vectors):
+        num_qubits = len(sg[0])
+        # sample outcomes of every element at once by inverting the cumulative distributions
+        cdfs = np.cumsum(_outcome_probabilities(np.array(row)), axis=-1)
+        uniform = random_state.rand(num_trials, len(sg), 1) * cdfs[:, -1:]
+        outcomes = np.count_nonzero(uniform >= cdfs, axis=-1)
+        shifts = np.arange(num_qubits - 1, -1, -1)
+        bits = (outcomes[..., np.newaxis] >> shifts) & 1
+        results.append(bits.reshape(num_trials, -1))
+    new_df["Results"] = Series(results, index=new_df.index)
+    return new_df
+
+
+def simulate_unitarity_measurement(df: DataFrame, noise=None, num_trials: int = None,
+                                   random_seed: int = None) -> DataFrame:
+    """
+    Simulate a unitarity measurement in process, without a QVM, and add the results to a copy of
+    the DataFrame. Returns the new DataFrame.
+
+    See :py:func:`simulate_pauli_vectors` for the simulation and the specification of noise.
+
+    :param df: A unitarity DataFrame populated with "Sequence" and "Subgraph" columns.
+    :param noise: The noise channel applied after every Clifford, see simulate_pauli_vectors.
+    :param num_trials: If None the exact expectations of the non-identity Pauli operators are
+        recorded with zero variances. Otherwise each expectation is estimated from num_trials
+        sampled shots.
+    :param random_seed: Seed for sampling shots.
+    :return: New DataFrame with a "Results" column in the format of run_unitarity_measurement,
+        with operators in the order of n_qubit_pauli_basis.
+    """
+    new_df = df.copy()
+    vectors = simulate_pauli_vectors(new_df, noise)
+    random_state = np.random.RandomState(random_seed)
+    results = []
+    for row in vectors:
+        row_results = []
+        for pauli_vector in row:
+            dim = int(np.sqrt(len(pauli_vector)))
+            expectations = np.clip(dim * pauli_vector[1:], -1, 1)
+            if num_trials is None:
+                variances = np.zeros_like(expectations)
+            else:
+                ups = random_state.binomial(num_trials, (1 + expectations) / 2)
+                expectations = 2 * ups / num_trials - 1
+                variances = (1 - expectations ** 2) / num_trials
+            row_results.append((list(expectations), list(variances)))
+        results.append(row_results)
+    new_df["Results"] = Series(results, index=new_df.index)
+    return new_df
+
+
 #########
 # Analysis stuff
 #########
@@ -331,15 +670,39 @@ def survival_statistics(bitstrings):
     :param ndarray bitstrings: A 2D numpy array of repetitions x bit-arrays.
     :return: (survival mean, sqrt(survival variance))
     """
-    survived = np.sum(bitstrings, axis=1) == 0
+    bitstrings = np.asarray(bitstrings)
+    means, errs = batch_survival_statistics(bitstrings[np.newaxis], bitstrings.shape[1])
+    return means[0, 0], errs[0, 0]
 
-    # count obmurrences of 000...0 and anything besides 000...0
-    n_died, n_survived = bincount(survived, minlength=2)
 
-    # mean and variance given by beta distribution with a uniform prior
-    survival_mean = beta.mean(n_survived + 1, n_died + 1)
-    survival_var = beta.var(n_survived + 1, n_died + 1)
-    return survival_mean, np.sqrt(survival_var)
+def batch_survival_statistics(results: np.ndarray, group_size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Calculate survival statistics for every row and every group of bits at once.
+
+    The bits of each shot are split into consecutive groups of group_size bits (one group per
+    subgraph element) and a group survives a shot if all of its bits are 0. As in
+    survival_statistics, the mean and variance are those of beta(n_survived + 1, n_died + 1),
+    evaluated in closed form:
+
+        mean = a / (a + b),    var = a b / ((a + b)^2 (a + b + 1)).
+
+    :param results: A (rows, shots, bits) array of shot data.
+    :param group_size: The number of bits in each group, e.g. 1 for 1q RB and 2 for 2q RB.
+    :return: Arrays of survival means and errors (square roots of the variances), each of shape
+        (rows, bits // group_size).
+    """
+    num_rows, num_shots, num_bits = results.shape
+    if num_bits % group_size != 0:
+        raise ValueError("The number of bits must be a multiple of the group size.")
+    grouped = results.reshape(num_rows, num_shots, num_bits // group_size, group_size)
+    n_survived = np.count_nonzero(~grouped.any(axis=-1), axis=1)
+
+    # moments of beta(a, b) with a uniform prior
+    a = n_survived + 1.
+    b = num_shots - n_survived + 1.
+    means = a / (a + b)
+    variances = a * b / ((a + b) ** 2 * (a + b + 1))
+    return means, np.sqrt(variances)
 
 
 def survivals_from_results(subgraph: List[Tuple],
@@ -350,14 +713,8 @@ def survivals_from_results(subgraph: List[Tuple],
     :return: Survival means and errors, in lists whose indices correspond to subgraph elements.
     """
     l = len(subgraph[0])  # 1 for 1Q, 2 for 2Q
-    means, errs = [], []
-    for idx, s in enumerate(subgraph):
-        # Group shot data by (qubit, ) or (qubit, pair)
-        shot_data = np.asarray(results)[:, l * idx:l * (idx + 1)]
-        mean, err = survival_statistics(shot_data)
-        means.append(mean)
-        errs.append(err)
-    return means, errs
+    means, errs = batch_survival_statistics(np.asarray(results)[np.newaxis], l)
+    return list(means[0]), list(errs[0])
 
 
 def add_survivals(df: DataFrame):
@@ -366,8 +723,9 @@ def add_survivals(df: DataFrame):
     Returns the new DataFrame.
     """
     new_df = df.copy()
-    new_df["Survival Means"], new_df["Survival Errors"] = zip(
-        *new_df.apply(lambda row: survivals_from_results(row["Subgraph"], row["Results"]), axis=1))
+    means, errs = survivals_from_shot_arrays(new_df["Subgraph"].values, new_df["Results"].values)
+    new_df["Survival Means"] = Series([list(m) for m in means], index=new_df.index)
+    new_df["Survival Errors"] = Series([list(e) for e in errs], index=new_df.index)
     return new_df
 
 
@@ -375,15 +733,134 @@ def survivals_by_qubits(df: DataFrame, qubits: Tuple) -> Tuple[np.ndarray, np.nd
     """
     Given a DataFrame that is already populated with survival data matching each subgraph entry,
     find and return all depths, survival means, and survival errors for a given set of qubits.
-    """
-    depths, means, errs = [], [], []
-    # TODO: Make this smarter/faster/more scalable than iterrow'ing
-    for _, row in df.iterrows():
-        qubits_idx = row["Subgraph"].index(qubits)
-        depths.append(row["Depth"])
-        means.append(row["Survival Means"][qubits_idx])
-        errs.append(row["Survival Errors"][qubits_idx])
-    return np.asarray(depths), np.asarray(means), np.asarray(errs)
+
+    To look up many groups, build an :py:class:`RBResults` once with
+    ``RBResults.from_survivals(df)`` and call ``by_qubits`` on it for each group.
+    """
+    return RBResults.from_survivals(df).by_qubits(qubits)
+
+
+@dataclass
+class RBResults:
+    """
+    Columnar, long-format summary of an RB or unitarity measurement with one entry per
+    (sequence, qubit group) pair. Entries for a qubit group appear in DataFrame row order.
+    """
+
+    depths: np.ndarray
+    """The depth of the sequence of each entry"""
+
+    sequence_ids: np.ndarray
+    """The index of the DataFrame row (sequence) of each entry"""
+
+    groups: np.ndarray
+    """The index into `qubit_groups` of the subgraph element of each entry"""
+
+    qubit_groups: List[Tuple]
+    """The distinct subgraph elements (qubit singletons or pairs) of the measurement"""
+
+    means: np.ndarray
+    """The survival probability (or shifted purity) of each entry"""
+
+    errs: np.ndarray
+    """The error on each entry of `means`"""
+
+    _entries_by_group: Dict[Tuple, np.ndarray] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        order = np.argsort(self.groups, kind='stable')
+        splits = np.cumsum(np.bincount(self.groups, minlength=len(self.qubit_groups)))[:-1]
+        self._entries_by_group = {group: entries for group, entries
+                                  in zip(self.qubit_groups, np.split(order, splits))}
+
+    def by_qubits(self, qubits: Tuple) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Return all depths, means and errors for the given qubit group.
+
+        :param qubits: A subgraph element, e.g. (0,) or (0, 1).
+        :return: depths, means, errs
+        """
+        entries = self._entries_by_group[tuple(qubits)]
+        return self.depths[entries], self.means[entries], self.errs[entries]
+
+    def to_dataframe(self) -> DataFrame:
+        """
+        :return: A long-format DataFrame with columns "Depth", "Sequence", "Qubits", "Mean", "Error"
+        """
+        return DataFrame(OrderedDict([("Depth", self.depths),
+                                      ("Sequence", self.sequence_ids),
+                                      ("Qubits", [self.qubit_groups[g] for g in self.groups]),
+                                      ("Mean", self.means),
+                                      ("Error", self.errs)]))
+
+    @classmethod
+    def _from_columns(cls, df: DataFrame, means: Iterable[float], errs: Iterable[float]) -> 'RBResults':
+        subgraphs = df["Subgraph"].values
+        sizes = [len(sg) for sg in subgraphs]
+        labels = [tuple(element) for sg in subgraphs for element in sg]
+        qubit_groups = list(OrderedDict.fromkeys(labels))
+        group_index = {group: idx for idx, group in enumerate(qubit_groups)}
+        return cls(depths=np.repeat(np.asarray(df["Depth"].values), sizes),
+                   sequence_ids=np.repeat(np.arange(len(df)), sizes),
+                   groups=np.array([group_index[label] for label in labels], dtype=int),
+                   qubit_groups=qubit_groups,
+                   means=np.fromiter(means, dtype=float, count=len(labels)),
+                   errs=np.fromiter(errs, dtype=float, count=len(labels)))
+
+    @classmethod
+    def from_survivals(cls, df: DataFrame) -> 'RBResults':
+        """
+        Build the survival summary of an RB measurement.
+
+        Uses the "Survival Means" and "Survival Errors" columns if they are present and otherwise
+        computes the survival statistics straight from the "Results" shot data, see
+        :py:func:`survivals_from_shot_arrays`.
+
+        :param df: An RB DataFrame with "Subgraph", "Depth" and either survival or "Results" columns.
+        """
+        if "Survival Means" in df.columns:
+            means = chain.from_iterable(df["Survival Means"].values)
+            errs = chain.from_iterable(df["Survival Errors"].values)
+        else:
+            means, errs = survivals_from_shot_arrays(df["Subgraph"].values, df["Results"].values)
+            means, errs = chain.from_iterable(means), chain.from_iterable(errs)
+        return cls._from_columns(df, means, errs)
+
+    @classmethod
+    def from_shifted_purities(cls, df: DataFrame) -> 'RBResults':
+        """
+        Build the shifted purity summary of a unitarity measurement.
+
+        :param df: A DataFrame with "Subgraph", "Depth", "Shifted Purities" and "Purity Errors".
+        """
+        return cls._from_columns(df, chain.from_iterable(df["Shifted Purities"].values),
+                                 chain.from_iterable(df["Purity Errors"].values))
+
+
+def survivals_from_shot_arrays(subgraphs: Sequence[List[Tuple]], results: Sequence[np.ndarray]) \
+        -> Tuple[List[np.ndarray], List[np.ndarray]]:
+    """
+    Compute survival statistics for many sequences at once.
+
+    Rows which share a subgraph size and a results shape are stacked into one
+    (rows, shots, bits) array and passed to batch_survival_statistics together.
+
+    :param subgraphs: The subgraph of each row.
+    :param results: The (shots, bits) shot data of each row, with bits ordered as the flattened
+        subgraph.
+    :return: Per row, arrays of survival means and errors indexed by subgraph element.
+    """
+    results = [np.asarray(r) for r in results]
+    means, errs = [None] * len(results), [None] * len(results)
+    buckets = OrderedDict()
+    for row, (sg, res) in enumerate(zip(subgraphs, results)):
+        buckets.setdefault((len(sg[0]), res.shape), []).append(row)
+    for (group_size, _), rows in buckets.items():
+        shots = np.stack([results[row] for row in rows])
+        bucket_means, bucket_errs = batch_survival_statistics(shots, group_size)
+        for row, mean, err in zip(rows, bucket_means, bucket_errs):
+            means[row], errs[row] = mean, err
+    return means, errs
 
 
 def standard_rb(x, baseline, amplitude, decay):
@@ -399,21 +876,86 @@ def standard_rb(x, baseline, amplitude, decay):
     return baseline + amplitude * decay ** x
 
 
-def standard_rb_guess(model: Model, y):
+def standard_rb_guess(model: Model, y, x=None):
     """
     Guess the parameters for a fit.
 
+    If the independent variable x is supplied the guess is the closed-form log-linear estimate of
+    log_linear_decay_guess; otherwise the decay is guessed to be 0.95.
+
     :param model: an lmfit model to make guess parameters for. This should probably be an
         instance of ``Model(standard_rb)``.
     :param y: Dependent variable
+    :param x: Optional independent variable (sequence depths)
     :return: Lmfit parameters object appropriate for passing to ``Model.fit()``.
     """
+    if x is not None:
+        b_guess, a_guess, d_guess = log_linear_decay_guess(x, y)
+        return model.make_params(baseline=b_guess, amplitude=a_guess, decay=d_guess)
     b_guess = y[-1]
     a_guess = y[0] - y[-1]
     d_guess = 0.95
     return model.make_params(baseline=b_guess, amplitude=a_guess, decay=d_guess)
 
 
+def log_linear_decay_guess(x, y, num_baselines: int = 20) -> Tuple[float, float, float]:
+    """
+    Closed-form estimate of the parameters of y = baseline + amplitude * decay ** x.
+
+    The data are averaged at each distinct x. For each of a grid of candidate baselines between
+    zero and the smallest average, log(y - baseline) is fit to a line in x by least squares,
+    which gives the amplitude and decay in closed form. The candidate with the smallest squared
+    residual (of the untransformed model) is returned. All candidates are fit at once.
+
+    :param x: Independent variable, e.g. sequence depths
+    :param y: Dependent variable, e.g. survival probabilities
+    :param num_baselines: The number of candidate baselines to try.
+    :return: baseline, amplitude, decay
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    xs, inverse = np.unique(x, return_inverse=True)
+    ys = np.bincount(inverse, weights=y) / np.bincount(inverse)
+    if len(xs) < 2 or ys.min() <= 0:
+        return ys[-1], ys[0] - ys[-1], 0.95
+    baselines, amplitudes, decays = _batch_log_linear_fit(xs, ys[np.newaxis], num_baselines)
+    return baselines[0], amplitudes[0], decays[0]
+
+
+def _batch_log_linear_fit(xs: np.ndarray, ys: np.ndarray, num_baselines: int = 20) \
+        -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    The estimate of log_linear_decay_guess for a batch of curves sampled at the same points.
+
+    :param xs: The distinct values of the independent variable, shape (points,).
+    :param ys: The average dependent variable of each curve at xs, shape (curves, points).
+    :param num_baselines: The number of candidate baselines to try.
+    :return: Arrays of baselines, amplitudes and decays, each of shape (curves,). Curves with a
+        non-positive average get NaN for all parameters.
+    """
+    num_curves, num_points = ys.shape
+    valid = ys.min(axis=1) > 0
+    fractions = np.linspace(0, 1, num_baselines + 1)[:-1]
+    baselines = np.outer(np.where(valid, ys.min(axis=1), 0), fractions)
+    shifted = ys[:, :, np.newaxis] - baselines[:, np.newaxis, :]
+    shifted[~valid] = 1
+
+    # fit every (curve, baseline) pair at once by passing them as columns to polyfit
+    logs = np.log(shifted).transpose(1, 0, 2).reshape(num_points, -1)
+    slopes, intercepts = np.polyfit(xs, logs, 1)
+    slopes = slopes.reshape(num_curves, num_baselines)
+    intercepts = intercepts.reshape(num_curves, num_baselines)
+    predictions = baselines[:, np.newaxis, :] + np.exp(intercepts[:, np.newaxis, :]
+                                                       + xs[:, np.newaxis] * slopes[:, np.newaxis, :])
+    best = np.argmin(np.sum((predictions - ys[:, :, np.newaxis]) ** 2, axis=1), axis=1)
+
+    curves = np.arange(num_curves)
+    baseline = np.where(valid, baselines[curves, best], np.nan)
+    amplitude = np.where(valid, np.exp(intercepts[curves, best]), np.nan)
+    decay = np.where(valid, np.clip(np.exp(slopes[curves, best]), 0., 1.), np.nan)
+    return baseline, amplitude, decay
+
+
 def _check_data(x, y, weights):
     if not len(x) == len(y):
         raise ValueError("Lengths of x and y arrays must be equal.")
@@ -432,7 +974,7 @@ def fit_standard_rb(depths, survivals, weights=None):
     """
     _check_data(depths, survivals, weights)
     rb_model = Model(standard_rb)
-    params = standard_rb_guess(model=rb_model, y=survivals)
+    params = standard_rb_guess(model=rb_model, y=survivals, x=depths)
     return rb_model.fit(survivals, x=depths, params=params, weights=weights)
 
 
@@ -515,15 +1057,12 @@ def shifted_purities_by_qubits(df: DataFrame, qubits: Tuple) -> (np.array, np.ar
     """
     Given a DataFrame that is already populated with purity data matching each subgraph entry,
     find and return all depths, shifted purities, and purity errors for a given set of qubits.
+
+    To look up many groups, build an :py:class:`RBResults` once with
+    ``RBResults.from_shifted_purities(df)`` and call ``by_qubits`` on it for each group.
     """
-    depths, shifted_purities, errs = [], [], []
-    # TODO: Make this smarter/faster/more scalable than iterrow'ing
-    for _, row in df.iterrows():
-        qubits_idx = row["Subgraph"].index(qubits)
-        depths.append(row["Depth"])
-        shifted_purities.append(row["Shifted Purities"][qubits_idx])
-        errs.append(row["Purity Errors"][qubits_idx])
-    return np.asarray(depths), np.asarray(shifted_purities), np.asarray(errs)
+    return RBResults.from_shifted_purities(df).by_qubits(qubits)
+
 
 def unitarity_fn(x, baseline, amplitude, unitarity):
     """
@@ -537,16 +1076,23 @@ def unitarity_fn(x, baseline, amplitude, unitarity):
     """
     return baseline + amplitude * unitarity ** (x-1)
 
-#TODO: confirm validity or update guesses
-def unitarity_guess(model: Model, y):
+def unitarity_guess(model: Model, y, x=None):
     """
     Guess the parameters for a fit.
 
+    If the independent variable x is supplied the guess is the closed-form log-linear estimate of
+    log_linear_decay_guess; otherwise the baseline is guessed to be 0 and the unitarity 0.95.
+
     :param model: an lmfit model to make guess parameters for. This should probably be an
         instance of ``Model(unitarity)``.
     :param y: Dependent variable
+    :param x: Optional independent variable (sequence depths)
     :return: Lmfit parameters object appropriate for passing to ``Model.fit()``.
     """
+    if x is not None:
+        # unitarity_fn decays in x - 1
+        b_guess, a_guess, d_guess = log_linear_decay_guess(np.asarray(x) - 1, y)
+        return model.make_params(baseline=b_guess, amplitude=a_guess, unitarity=d_guess)
     b_guess = 0.
     a_guess = y[0]
     d_guess = 0.95
@@ -563,10 +1109,56 @@ def fit_unitarity(depths, shifted_purities, weights=None):
     """
     _check_data(depths, shifted_purities, weights)
     unitarity_model = Model(unitarity_fn)
-    params = unitarity_guess(model=unitarity_model, y=shifted_purities)
+    params = unitarity_guess(model=unitarity_model, y=shifted_purities, x=depths)
     return unitarity_model.fit(shifted_purities, x=depths, params=params, weights=weights)
 
 
+def _fit_rb_curve(args: Tuple[str, np.ndarray, np.ndarray, np.ndarray]) -> Dict:
+    """
+    Fit a single curve and return its parameters; a module level function so that it can be run
+    in a worker process.
+    """
+    kind, depths, values, errs = args
+    weights = 1 / errs if errs is not None and np.all(errs > 0) else None
+    fit = fit_standard_rb(depths, values, weights) if kind == 'standard' \
+        else fit_unitarity(depths, values, weights)
+    row = OrderedDict()
+    for name, param in fit.params.items():
+        row[name.capitalize()] = param.value
+        row[name.capitalize() + " Error"] = param.stderr
+    row["Reduced Chi-square"] = fit.redchi
+    row["Success"] = fit.success
+    return row
+
+
+def fit_rb_curves(data, kind: str = 'standard', max_workers: int = None) -> DataFrame:
+    """
+    Fit the RB (or unitarity) curves of many qubit groups at once.
+
+    Each fit is seeded with the closed-form estimate of log_linear_decay_guess and the nonlinear
+    refinements are distributed over a pool of worker processes.
+
+    :param data: Either an :py:class:`RBResults` or a dictionary mapping each qubit group to a
+        tuple of (depths, values, errors) arrays, as returned by e.g. ``survivals_by_qubits``.
+        Errors are used as weights when they are all positive.
+    :param kind: 'standard' to fit standard_rb to survivals or 'unitarity' to fit unitarity_fn
+        to shifted purities.
+    :param max_workers: The number of worker processes, see :py:func:`parallel_map`; by default
+        the curves are fit serially in this process.
+    :return: A DataFrame with one row per qubit group and columns "Qubits", then the value and
+        "<name> Error" of each fit parameter, "Reduced Chi-square" and "Success".
+    """
+    if kind not in ('standard', 'unitarity'):
+        raise ValueError("kind must be 'standard' or 'unitarity'.")
+    if isinstance(data, RBResults):
+        data = OrderedDict((group, data.by_qubits(group)) for group in data.qubit_groups)
+    fits = parallel_map(_fit_rb_curve, [(kind, *arrays) for arrays in data.values()],
+                        max_workers=max_workers)
+    table = DataFrame(fits)
+    table.insert(0, "Qubits", list(data.keys()))
+    return table
+
+
 ########
 # Interleaved RB Analysis
 ########
@@ -690,3 +1282,137 @@ def RB_decay_to_gate_fidelity(rb_decay, dimension):
     :return: The gate fidelity corresponding to the input decay.
     """
     return 1/dimension - rb_decay*(1/dimension -1)
+
+
+########
+# Bootstrap analysis
+########
+
+
+def _bootstrap_rb_curve(args: Tuple[np.ndarray, np.ndarray, int, bool, int]) -> Tuple[float, np.ndarray]:
+    """
+    Fit one RB curve and the curves of its bootstrap resamples; a module level function so that
+    it can be run in a worker process.
+
+    :return: The decay fit to the data and the array of decays fit to each resample.
+    """
+    depths, values, num_resamples, refine, seed = args
+    depths = np.asarray(depths, dtype=float)
+    values = np.asarray(values, dtype=float)
+
+    random_state = np.random.RandomState(seed)
+    xs, inverse = np.unique(depths, return_inverse=True)
+    counts = np.bincount(inverse)
+    # the first curve is the data itself and the others are resamples of the sequences within
+    # each depth, so that the estimate and its replicates come from the same estimator. Only the
+    # average at each depth enters the fits.
+    ys = np.empty((num_resamples + 1, len(xs)))
+    ys[0] = np.bincount(inverse, weights=values) / counts
+    for k, members in enumerate(np.split(np.argsort(inverse, kind='stable'), np.cumsum(counts)[:-1])):
+        ys[1:, k] = values[members[random_state.randint(len(members), size=(num_resamples, len(members)))]].mean(axis=1)
+
+    baselines, amplitudes, decays = _batch_log_linear_fit(xs, ys)
+    if refine:
+        # refine every curve which survived the screen, starting from its fast fit; a least
+        # squares fit to the averages weighted by the square root of the counts is equivalent to
+        # a fit to all sequences
+        model = Model(standard_rb)
+        for r in np.flatnonzero(np.isfinite(decays)):
+            params = model.make_params(baseline=baselines[r], amplitude=amplitudes[r],
+                                       decay=decays[r])
+            fit = model.fit(ys[r], x=xs, params=params, weights=np.sqrt(counts))
+            decays[r] = fit.params['decay'].value if fit.success else np.nan
+    return decays[0], decays[1:]
+
+
+def bootstrap_rb_decays(data, num_resamples: int = 1000, refine: bool = True,
+                        random_seed: int = None, max_workers: int = None) \
+        -> Dict[Tuple, Tuple[float, np.ndarray]]:
+    """
+    Bootstrap the RB decays of many qubit groups.
+
+    For each qubit group, the sequences at each depth are resampled with replacement
+    num_resamples times and each resample is refit by the same estimator as the data. Curves are
+    fit all at once by the closed-form estimate of log_linear_decay_guess, which screens out
+    resamples that cannot be fit (their decay is NaN); by default the remaining curves are then
+    refined by a nonlinear fit of standard_rb seeded with their closed-form estimate. The qubit
+    groups are distributed over a pool of worker processes.
+
+    :param data: Either an :py:class:`RBResults` or a dictionary mapping each qubit group to a
+        tuple of (depths, survivals, errors) arrays, as returned by e.g. ``survivals_by_qubits``.
+    :param num_resamples: The number of bootstrap resamples per qubit group.
+    :param refine: If False, skip the nonlinear fits and report the closed-form estimates,
+        which is much faster but biased for curves that have not decayed to their baseline.
+    :param random_seed: Seed for resampling.
+    :param max_workers: The number of worker processes, see :py:func:`parallel_map`.
+    :return: A dictionary mapping each qubit group to the decay fit to its data and the array of
+        num_resamples bootstrapped decays.
+    """
+    if isinstance(data, RBResults):
+        data = OrderedDict((group, data.by_qubits(group)) for group in data.qubit_groups)
+    seeds = np.random.RandomState(random_seed).randint(2 ** 31, size=len(data))
+    fits = parallel_map(_bootstrap_rb_curve,
+                        [(arrays[0], arrays[1], num_resamples, refine, seed)
+                         for arrays, seed in zip(data.values(), seeds)],
+                        max_workers=max_workers)
+    return OrderedDict(zip(data.keys(), fits))
+
+
+def bootstrap_rb_intervals(data, interleaved_data=None, unitarities: Dict[Tuple, float] = None,
+                           confidence: float = 0.95, num_resamples: int = 1000,
+                           refine: bool = True, random_seed: int = None,
+                           max_workers: int = None) -> DataFrame:
+    """
+    Bootstrap percentile confidence intervals for the RB decay, the average gate infidelity and,
+    given interleaved RB data, the bounds on the fidelity of the interleaved gate.
+
+    See :py:func:`bootstrap_rb_decays` for the resampling. For interleaved RB, the resampled RB
+    and IRB decays are paired and interleaved_gate_fidelity_bounds is evaluated for each pair;
+    the reported bounds are the lower percentile of the lower bounds and the upper percentile of
+    the upper bounds, so they account for both the bound and the statistical uncertainty.
+
+    :param data: The standard RB survivals, as for :py:func:`bootstrap_rb_decays`.
+    :param interleaved_data: Optional interleaved RB survivals for the same qubit groups.
+    :param unitarities: Optional dictionary of measured unitarities by qubit group, used to
+        improve the interleaved bounds.
+    :param confidence: The confidence level of the intervals.
+    :param num_resamples: The number of bootstrap resamples per qubit group.
+    :param refine: If False, use the closed-form estimates for the data and the resamples; see
+        :py:func:`bootstrap_rb_decays`.
+    :param random_seed: Seed for resampling.
+    :param max_workers: The number of worker processes, see :py:func:`parallel_map`.
+    :return: A DataFrame with one row per qubit group and columns "Qubits", "Decay",
+        "Decay Lower", "Decay Upper", "Infidelity", "Infidelity Lower", "Infidelity Upper" and,
+        with interleaved data, "IRB Decay", "IRB Decay Lower", "IRB Decay Upper",
+        "Fidelity Lower Bound" and "Fidelity Upper Bound".
+    """
+    if not 0 < confidence < 1:
+        raise ValueError("confidence must be between 0 and 1.")
+    percentiles = [50 * (1 - confidence), 50 * (1 + confidence)]
+    rb_fits = bootstrap_rb_decays(data, num_resamples, refine, random_seed, max_workers)
+    if interleaved_data is not None:
+        irb_seed = None if random_seed is None else random_seed + 1
+        irb_fits = bootstrap_rb_decays(interleaved_data, num_resamples, refine, irb_seed,
+                                       max_workers)
+
+    rows = []
+    for group, (decay, decays) in rb_fits.items():
+        dim = 2 ** len(group)
+        infidelities = 1 - RB_decay_to_gate_fidelity(decays, dim)
+        row = OrderedDict([("Qubits", group), ("Decay", decay)])
+        row["Decay Lower"], row["Decay Upper"] = np.nanpercentile(decays, percentiles)
+        row["Infidelity"] = 1 - RB_decay_to_gate_fidelity(decay, dim)
+        row["Infidelity Lower"], row["Infidelity Upper"] = np.nanpercentile(infidelities, percentiles)
+
+        if interleaved_data is not None:
+            irb_decay, irb_decays = irb_fits[tuple(group)]
+            row["IRB Decay"] = irb_decay
+            row["IRB Decay Lower"], row["IRB Decay Upper"] = np.nanpercentile(irb_decays, percentiles)
+            unitarity = None if unitarities is None else unitarities[tuple(group)]
+            paired = np.isfinite(decays) & np.isfinite(irb_decays)
+            bounds = np.array([interleaved_gate_fidelity_bounds(irb, rb, dim, unitarity)
+                               for irb, rb in zip(irb_decays[paired], decays[paired])])
+            row["Fidelity Lower Bound"] = np.percentile(bounds[:, 0], percentiles[0])
+            row["Fidelity Upper Bound"] = np.percentile(bounds[:, 1], percentiles[1])
+        rows.append(row)
+    return DataFrame(rows)
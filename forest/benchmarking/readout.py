@@ -1,7 +1,10 @@
 import itertools
+import logging
+import time
 from math import pi
-from typing import Tuple, Dict, Sequence
+from typing import Tuple, Dict, List, Sequence, Union
 import numpy as np
+from scipy.optimize import nnls
 from tqdm import tqdm
 
 from pyquil import Program
@@ -9,7 +12,10 @@ from pyquil.api import QuantumComputer
 from pyquil.gates import RX, RZ, RESET, MEASURE
 from pyquil.quilbase import Measurement, Pragma
 
-from forest.benchmarking.utils import bitstring_prep, parameterized_bitstring_prep
+from forest.benchmarking.utils import bitstring_prep, parameterized_bitstring_prep, bit_arrays_to_ints, \
+    int_to_bit_array, simultaneous_batches
+
+log = logging.getLogger(__name__)
 
 
 def get_flipped_program(program: Program) -> Program:
@@ -63,11 +69,89 @@ def estimate_confusion_matrix(qc: QuantumComputer, qubit: int, shots: int = 1000
     return np.array([[p00, 1 - p00], [1 - p11, p11]])
 
 
+def estimate_confusion_matrices(qc: QuantumComputer, qubits: Sequence[int] = None,
+                                shots: int = 10000, num_preparations: int = 2,
+                                random_seed: int = None) -> Dict[int, np.ndarray]:
+    """
+    Estimate the readout confusion matrix of every given qubit simultaneously.
+
+    A single parameterized program (see parameterized_bitstring_prep) prepares and measures a
+    bitstring on all of the qubits and is compiled once. It is run num_preparations times,
+    in pairs of a random bitstring and its complement, so every qubit prepares 0 and 1 equally
+    often while its neighbors are in random states. The default of two executions calibrates
+    readout across a whole lattice.
+
+    Each matrix has the form of estimate_confusion_matrix,
+        [[ p(0 | 0)     p(1 | 0)]
+         [ p(0 | 1)     p(1 | 1)]]
+    where row i is the distribution of outcomes given the preparation of i, and sums to one.
+    Since neighboring qubits are not idle the estimates average over any crosstalk in readout.
+
+    :param qc: The quantum computer to estimate the confusion matrices.
+    :param qubits: The physical qubits to measure. Defaults to all qubits in qc.
+    :param shots: The number of shots of each of 0 and 1 on each qubit.
+    :param num_preparations: The number of executions; must be even.
+    :param random_seed: Seed for choosing the random bitstrings.
+    :return: a dictionary of the 2x2 confusion matrix of each qubit, indexed by the qubit.
+    """
+    if qubits is None:
+        qubits = qc.qubits()
+    if num_preparations < 2 or num_preparations % 2 != 0:
+        raise ValueError("num_preparations must be a positive even number.")
+
+    random_state = np.random.RandomState(random_seed)
+    bitstrings = random_state.randint(2, size=(num_preparations // 2, len(qubits)))
+    bitstrings = np.concatenate([bitstrings, 1 - bitstrings])
+
+    reg_name = 'bitstr'
+    program = parameterized_bitstring_prep(qubits, reg_name, append_measure=True)
+    program.wrap_in_numshots_loop(shots=-(-2 * shots // num_preparations))
+    executable = qc.compiler.native_quil_to_executable(program)
+    results = np.array([qc.run(executable, memory_map={reg_name: list(bitstring)})
+                        for bitstring in bitstrings])
+
+    # counts[q, prepared, observed] for every qubit at once
+    flat = (2 * bitstrings[:, np.newaxis, :] + results).transpose(2, 0, 1).reshape(len(qubits), -1)
+    counts = np.array([np.bincount(f, minlength=4) for f in flat]).reshape(len(qubits), 2, 2)
+    return {qubit: confusion_matrix_from_counts(c) for qubit, c in zip(qubits, counts)}
+
+
+def outcome_counts(results: np.ndarray, num_bits: int) -> np.ndarray:
+    """
+    Count the occurrences of each outcome in a (shots, bits) array of results.
+
+    :param results: the results of a run, with one row of num_bits bits per shot.
+    :param num_bits: the number of bits measured in each shot.
+    :return: an array of 2^num_bits counts indexed by outcome, with the most significant
+        (leftmost) bit labeling the first measured bit.
+    """
+    results = np.asarray(results).reshape(-1, num_bits)
+    return np.bincount(bit_arrays_to_ints(results), minlength=2 ** num_bits)
+
+
+def confusion_matrix_from_counts(counts: np.ndarray) -> np.ndarray:
+    """
+    Normalize a matrix of outcome counts, with one row per prepared bitstring, into a confusion
+    matrix whose rows sum to one.
+
+    Counts from separate estimates of the same confusion matrix may be summed before
+    normalizing to merge the estimates.
+
+    :param counts: a square matrix of counts; entry (row, col) counts the shots in which the
+        bitstring col was observed after preparing the bitstring row.
+    :return: the corresponding confusion matrix.
+    """
+    counts = np.asarray(counts, dtype=float)
+    totals = counts.sum(axis=1, keepdims=True)
+    return np.divide(counts, totals, out=np.zeros_like(counts), where=totals > 0)
+
+
 def estimate_joint_confusion_in_set(qc: QuantumComputer, qubits: Sequence[int] = None,
                                     num_shots: int = 1000, joint_group_size: int = 1,
                                     use_param_program: bool = True, use_active_reset=False,
-                                    show_progress_bar: bool = False) \
-                                    -> Dict[Tuple[int, ...], np.ndarray]:
+                                    show_progress_bar: bool = False, return_counts: bool = False) \
+        -> Union[Dict[Tuple[int, ...], np.ndarray],
+                 Tuple[Dict[Tuple[int, ...], np.ndarray], Dict[Tuple[int, ...], np.ndarray]]]:
     """
     Measures the joint readout confusion matrix for all groups of size group_size among the qubits.
 
@@ -110,11 +194,15 @@ def estimate_joint_confusion_in_set(qc: QuantumComputer, qubits: Sequence[int] =
         matrices. The method estimate_joint_active_reset_confusion separately characterizes
         active reset.
     :param show_progress_bar: displays a progress bar via tqdm if true.
+    :param return_counts: if true, also return the raw counts from which each matrix is
+        estimated, so that estimates can later be merged with confusion_matrix_from_counts.
     :return: a dictionary whose keys are all possible joint_group_sized tuples that can be
         formed from the qubits. Each value is an estimated 2^group_size square confusion matrix
         for the corresponding tuple of qubits. Each key is listed in order of increasing qubit
         number. The corresponding matrix has rows and columns indexed in increasing bitstring
-        order, with most significant (leftmost) bit labeling the smallest qubit number.
+        order, with most significant (leftmost) bit labeling the smallest qubit number. If
+        return_counts is true, a second dictionary of the corresponding integer count matrices
+        is also returned.
     """
     # establish default as all operational qubits in qc
     if qubits is None:
@@ -124,6 +212,7 @@ def estimate_joint_confusion_in_set(qc: QuantumComputer, qubits: Sequence[int] =
 
     groups = list(itertools.combinations(qubits, joint_group_size))
     confusion_matrices = {}
+    confusion_counts = {}
 
     total_num_rounds = len(groups) * 2**joint_group_size
     with tqdm(total=total_num_rounds, disable=not show_progress_bar) as pbar:
@@ -146,7 +235,7 @@ def estimate_joint_confusion_in_set(qc: QuantumComputer, qubits: Sequence[int] =
                 param_program.wrap_in_numshots_loop(shots=num_shots)
                 executable = qc.compiler.native_quil_to_executable(param_program)
 
-            matrix = np.zeros((2 ** joint_group_size, 2 ** joint_group_size))
+            counts = np.zeros((2 ** joint_group_size, 2 ** joint_group_size), dtype=int)
             for row, bitstring in enumerate(itertools.product([0, 1], repeat=joint_group_size)):
 
                 if use_param_program:
@@ -161,17 +250,180 @@ def estimate_joint_confusion_in_set(qc: QuantumComputer, qubits: Sequence[int] =
                     results = qc.run(executable)
 
                 # update confusion matrix
-                for result in results:
-                    base = np.array([2 ** i for i in reversed(range(joint_group_size))])
-                    observed = np.sum(base * result)
-                    matrix[row, observed] += 1 / num_shots
+                counts[row] = outcome_counts(results, joint_group_size)
 
                 # update the progress bar
                 pbar.update(1)
 
             # store completed confusion matrix in dictionary
-            confusion_matrices[group] = matrix
+            confusion_counts[group] = counts
+            confusion_matrices[group] = counts / num_shots
 
+    if return_counts:
+        return confusion_matrices, confusion_counts
+    return confusion_matrices
+
+
+def linear_orthogonal_array(num_columns: int, strength: int) -> np.ndarray:
+    """
+    Construct a binary orthogonal array of the given strength from a linear code.
+
+    Each row is indexed by a vector x in GF(2)^m and the entry in column j is the parity of
+    x . a_j for a fixed vector a_j. If every set of at most strength of the a_j is linearly
+    independent then, restricted to any strength columns, every bitstring appears equally often
+    among the 2^m rows. The a_j are chosen greedily and m is increased until num_columns of them
+    are found; e.g. for strength 2 any distinct nonzero vectors will do, so 32 rows cover all
+    pairs of 30 qubits.
+
+    :param num_columns: the number of columns, e.g. the number of qubits.
+    :param strength: every bitstring on any strength columns appears equally often.
+    :return: a (2^m, num_columns) array of bits.
+    """
+    if strength < 1:
+        raise ValueError("The strength must be at least 1.")
+    if strength == 1:
+        # columns may repeat, so all zeros and all ones suffice
+        return np.repeat([[0], [1]], num_columns, axis=1)
+    num_bits = strength
+    while True:
+        columns = []
+        # sums[i] holds the sums of all i-subsets of the chosen columns; a candidate is
+        # independent of every (strength - 1)-subset iff it is none of these sums
+        sums = [{0}] + [set() for _ in range(strength - 1)]
+        for candidate in range(1, 2 ** num_bits):
+            if len(columns) == num_columns:
+                break
+            if any(candidate in level for level in sums):
+                continue
+            columns.append(candidate)
+            for size in range(strength - 1, 0, -1):
+                sums[size] |= {total ^ candidate for total in sums[size - 1]}
+        if len(columns) == num_columns:
+            break
+        num_bits += 1
+
+    rows = np.arange(2 ** num_bits)
+    row_bits = (rows[:, np.newaxis] >> np.arange(num_bits)) & 1
+    column_bits = (np.array(columns)[:, np.newaxis] >> np.arange(num_bits)) & 1
+    return (row_bits @ column_bits.T) % 2
+
+
+def estimate_joint_confusion_simultaneously(qc: QuantumComputer, qubits: Sequence[int] = None,
+                                            num_shots: int = 1000, joint_group_size: int = 1,
+                                            preparations: str = 'packed',
+                                            num_random_preparations: int = None,
+                                            random_seed: int = None,
+                                            use_active_reset: bool = False,
+                                            show_progress_bar: bool = False,
+                                            return_counts: bool = False) \
+        -> Union[Dict[Tuple[int, ...], np.ndarray],
+                 Tuple[Dict[Tuple[int, ...], np.ndarray], Dict[Tuple[int, ...], np.ndarray]]]:
+    """
+    Estimate the same joint confusion matrices as estimate_joint_confusion_in_set, measuring
+    many groups of qubits in each execution.
+
+    A single parameterized program prepares and measures a bitstring on all of the qubits; it is
+    compiled once and each execution prepares a different bitstring at run-time. The shots of
+    every execution are then demultiplexed into counts for each group, keyed by the bitstring
+    that was prepared on the group. The bitstrings are chosen by one of three strategies:
+
+        -'packed': groups are packed into sets of disjoint groups (see simultaneous_batches) and
+            each bitstring is prepared on all groups of a packing at once, with the remaining
+            qubits in 0. Every group sees each of its bitstrings num_shots times, as for
+            estimate_joint_confusion_in_set, in 2^joint_group_size executions per packing.
+        -'orthogonal': the rows of a linear orthogonal array of strength joint_group_size (see
+            linear_orthogonal_array) are prepared on all qubits, so every group sees each of its
+            bitstrings equally often; shots per execution are scaled so that each group bitstring
+            gets at least num_shots shots. For pairs of 30 qubits this takes 32 executions
+            instead of the 1740 of estimate_joint_confusion_in_set.
+        -'random': num_random_preparations uniformly random bitstrings are prepared on all
+            qubits, with num_shots shots each.
+
+    In the 'orthogonal' and 'random' strategies the qubits outside a group are not idle, so the
+    estimated matrix of a group is averaged over the states of the other qubits. Comparing
+    with the 'packed' estimates thus also probes crosstalk in readout.
+
+    :param qc: a quantum computer whose readout error you wish to characterize
+    :param qubits: a list of accessible qubits on the qc you wish to characterize. Defaults to
+        all qubits in qc.
+    :param num_shots: number of shots of each bitstring on each joint group of qubits.
+    :param joint_group_size: the size of each group, see estimate_joint_confusion_in_set.
+    :param preparations: the strategy for choosing prepared bitstrings; one of 'packed',
+        'orthogonal' or 'random'.
+    :param num_random_preparations: the number of bitstrings for the 'random' strategy; defaults
+        to 4 * 2^joint_group_size.
+    :param random_seed: seed for the 'random' strategy.
+    :param use_active_reset: if true, all qubits are actively reset at the start of each shot.
+    :param show_progress_bar: displays a progress bar via tqdm if true.
+    :param return_counts: if true, also return the raw counts from which each matrix is
+        estimated, so that estimates can later be merged with confusion_matrix_from_counts.
+    :return: a dictionary of confusion matrices keyed by group as for
+        estimate_joint_confusion_in_set and, if return_counts is true, a second dictionary of the
+        corresponding integer count matrices. Rows of bitstrings that were never prepared on a
+        group are zero.
+    """
+    if qubits is None:
+        qubits = qc.qubits()
+    qubits = sorted(qubits)
+    groups = list(itertools.combinations(qubits, joint_group_size))
+    columns = {qubit: idx for idx, qubit in enumerate(qubits)}
+    dim = 2 ** joint_group_size
+
+    shots = num_shots
+    # the executions whose shots are counted for each group; by default all of them
+    runs_of_group = {}
+    if preparations == 'packed':
+        bitstrings = []
+        for batch in simultaneous_batches(groups):
+            packing = [groups[idx] for idx in batch]
+            for group in packing:
+                runs_of_group[group] = np.arange(len(bitstrings), len(bitstrings) + dim)
+            for row in range(dim):
+                bitstring = np.zeros(len(qubits), dtype=int)
+                for group in packing:
+                    bitstring[[columns[q] for q in group]] = int_to_bit_array(row, joint_group_size)
+                bitstrings.append(bitstring)
+        bitstrings = np.array(bitstrings)
+    elif preparations == 'orthogonal':
+        bitstrings = linear_orthogonal_array(len(qubits), joint_group_size)
+        repeats = len(bitstrings) // dim
+        shots = -(-num_shots // repeats)
+    elif preparations == 'random':
+        if num_random_preparations is None:
+            num_random_preparations = 4 * dim
+        random_state = np.random.RandomState(random_seed)
+        bitstrings = random_state.randint(2, size=(num_random_preparations, len(qubits)))
+    else:
+        raise ValueError("preparations must be one of 'packed', 'orthogonal' or 'random'.")
+
+    program = Program()
+    if use_active_reset:
+        program += RESET()
+    reg_name = 'bitstr'
+    program += parameterized_bitstring_prep(qubits, reg_name, append_measure=True)
+    program.wrap_in_numshots_loop(shots=shots)
+    executable = qc.compiler.native_quil_to_executable(program)
+
+    results = []
+    for bitstring in tqdm(bitstrings, disable=not show_progress_bar):
+        results.append(qc.run(executable, memory_map={reg_name: list(bitstring)}))
+    results = np.array(results)
+
+    confusion_matrices = {}
+    confusion_counts = {}
+    for group in groups:
+        group_columns = [columns[q] for q in group]
+        runs = runs_of_group.get(group, slice(None))
+        prepared = bit_arrays_to_ints(bitstrings[runs][:, group_columns])
+        observed = bit_arrays_to_ints(results[runs][:, :, group_columns])
+        # flatten (prepared, observed) pairs into indices of the count matrix
+        flat = (prepared[:, np.newaxis] * dim + observed).ravel()
+        counts = np.bincount(flat, minlength=dim * dim).reshape(dim, dim)
+        confusion_counts[group] = counts
+        confusion_matrices[group] = confusion_matrix_from_counts(counts)
+
+    if return_counts:
+        return confusion_matrices, confusion_counts
     return confusion_matrices
 
 
@@ -230,29 +482,47 @@ def marginalize_confusion_matrix(confusion_matrix: np.ndarray, all_qubits: Seque
 
 def estimate_joint_reset_confusion(qc: QuantumComputer, qubits: Sequence[int] = None,
                                    num_trials: int = 10, joint_group_size: int = 1,
-                                   use_active_reset: bool = True, show_progress_bar: bool = False) \
-                                    -> Dict[Tuple[int, ...], np.ndarray]:
+                                   use_active_reset: bool = True, show_progress_bar: bool = False,
+                                   return_counts: bool = False, max_preparation_attempts: int = 10) \
+        -> Union[Dict[Tuple[int, ...], np.ndarray],
+                 Tuple[Dict[Tuple[int, ...], np.ndarray], Dict[Tuple[int, ...], np.ndarray]]]:
     """
     Measures a reset 'confusion matrix' for all groups of size joint_group_size among the qubits.
 
     Specifically, for each possible joint_group_sized group among the qubits we perform a
-    measurement for each bitstring on that group. The measurement proceeds as follows:
-        -Repeatedly try to prepare the bitstring state on the qubits until success.
+    measurement for each bitstring on that group. Each trial proceeds as follows:
+        -Prepare the bitstring state on the qubits and measure it.
         -If use_active_reset is true (default) actively reset qubits to ground state; otherwise,
             wait the preset amount of time for qubits to decay to ground state.
         -Measure the state after the chosen reset method.
     Since reset should result in the all zeros state this 'confusion matrix' should ideally have
     all ones down the left-most column of the matrix. The entry at (row_idx, 0) thus represents
     the success probability of reset given that the pre-reset state is the binary representation
-    of the number row_idx. WARNING: this method can be very slow
+    of the number row_idx.
+
+    Trials are the shots of a single pre-compiled parameterized program, with the bitstring
+    specified at run-time, and disjoint groups are packed (see simultaneous_batches) so that
+    they share programs and executions. Trials in which the measured preparation differs from the
+    bitstring are discarded. While fewer than num_trials preparations of a bitstring have
+    succeeded the whole program, of num_trials shots, is run again, up to
+    max_preparation_attempts times in total, and the first num_trials successful trials are
+    kept; the executable is never recompiled.
+
+    With active reset each shot prepares, measures, resets and measures again. Without it, each
+    shot first measures the qubits, which were left by the previous shot and then passively reset
+    between shots, and then prepares and measures the bitstring; the preparation of each shot is
+    paired with the measurement at the start of the next. This relies on the qubits carrying
+    their state over from one shot to the next, as they do on a QPU. A simulator such as the QVM
+    starts every shot in the ground state, so there passive reset is always reported as perfect.
+
+    The seconds spent compiling, running and analysing are logged separately to this module's
+    logger at INFO level, so that the cost of routine reset characterization can be tracked.
 
     :param qc: a quantum computer whose reset error you wish to characterize
     :param qubits: a list of accessible qubits on the qc you wish to characterize. Defaults to
         all qubits in qc.
     :param num_trials: number of repeated trials of reset after preparation of each bitstring on
-        each joint group of qubits. Note: num_trials does not correspond to num_shots; a new
-        program must be run in each trial, so running a group of n trials takes longer than would
-        collecting the same number of shots output from a single program.
+        each joint group of qubits.
     :param joint_group_size: the size of each group; a square matrix with 2^joint_group_size
         number of rows/columns will be estimated for each group of qubits of the given size
         among the provided qubits.
@@ -260,6 +530,12 @@ def estimate_joint_reset_confusion(qc: QuantumComputer, qubits: Sequence[int] =
         pre-allotted amount of time for the qubits to decay to the ground state. Using active
         reset will allow for faster data collection.
     :param show_progress_bar: displays a progress bar via tqdm if true.
+    :param return_counts: if true, also return a dictionary of the raw integer counts from which
+        each matrix is estimated, so that estimates can later be merged with
+        confusion_matrix_from_counts.
+    :param max_preparation_attempts: the maximum number of executions of each bitstring used to
+        collect num_trials successful preparations. If fewer trials succeed, the matrix row is
+        estimated from those which did.
     :return: a dictionary whose keys are all possible joint_group_sized tuples that can be
         formed from the qubits. Each value is an estimated 2^group_size square matrix
         for the corresponding tuple of qubits. Each key is listed in order of increasing qubit
@@ -275,53 +551,246 @@ def estimate_joint_reset_confusion(qc: QuantumComputer, qubits: Sequence[int] =
     qubits = sorted(qubits)
 
     groups = list(itertools.combinations(qubits, joint_group_size))
-    confusion_matrices = {}
-
-    total_num_rounds = len(groups) * 2**joint_group_size
-    with tqdm(total=total_num_rounds, disable=not show_progress_bar) as pbar:
-        for group in groups:
-            reg_name = 'bitstr'
-            # program prepares a bit string (specified by parameterization) and immediately measures
-            prep_and_meas = parameterized_bitstring_prep(group, reg_name, append_measure=True)
-            prep_executable = qc.compiler.native_quil_to_executable(prep_and_meas)
-
-            matrix = np.zeros((2 ** joint_group_size, 2 ** joint_group_size))
-            for row, bitstring in enumerate(itertools.product([0, 1], repeat=joint_group_size)):
-                for _ in range(num_trials):
-
-                    # try preparation at most 10 times.
-                    for _ in range(10):
-                        # prepare the given bitstring and measure
-                        result = qc.run(prep_executable, memory_map={reg_name: bitstring})
-
-                        # if the preparation is successful, move on to reset.
-                        if np.array_equal(result[0], bitstring):
-                            break
-
-                    # execute program that measures the post-reset state
-                    if use_active_reset:
-                        # program runs immediately after prep program and actively resets qubits
-                        reset_measure_program = Program(RESET())
-                    else:
-                        # this program automatically waits pre-allotted time for qubits to decay
-                        reset_measure_program = Program()
-                    ro = reset_measure_program.declare('ro', memory_type='BIT',
-                                                       memory_size=len(qubits))
-                    for idx, qubit in enumerate(group):
-                        reset_measure_program += MEASURE(qubit, ro[idx])
-                    executable = qc.compiler.native_quil_to_executable(reset_measure_program)
-                    results = qc.run(executable)
-
-                    # update confusion matrix
-                    for result in results:
-                        base = np.array([2 ** i for i in reversed(range(joint_group_size))])
-                        observed = np.sum(base * result)
-                        matrix[row, observed] += 1 / num_trials
+    packings = [[groups[idx] for idx in batch] for batch in simultaneous_batches(groups)]
+    dim = 2 ** joint_group_size
+    timing = dict(compile=0., run=0., analysis=0.)
+
+    confusion_counts = {}
+    reg_name = 'bitstr'
+    with tqdm(total=len(packings) * dim, disable=not show_progress_bar) as pbar:
+        for packing in packings:
+            packed_qubits = [q for group in packing for q in group]
+            num_qubits = len(packed_qubits)
+
+            # ro[:num_qubits] holds the measured preparation and ro[num_qubits:] the state after
+            # the reset
+            start = time.time()
+            program = Program()
+            ro = program.declare('ro', memory_type='BIT', memory_size=2 * num_qubits)
+            prep = parameterized_bitstring_prep(packed_qubits, reg_name)
+            if use_active_reset:
+                program += prep
+                program += [MEASURE(q, ro[idx]) for idx, q in enumerate(packed_qubits)]
+                program += [RESET(q) for q in packed_qubits]
+                program += [MEASURE(q, ro[num_qubits + idx]) for idx, q in enumerate(packed_qubits)]
+                program.wrap_in_numshots_loop(num_trials)
+            else:
+                program += [MEASURE(q, ro[num_qubits + idx]) for idx, q in enumerate(packed_qubits)]
+                program += prep
+                program += [MEASURE(q, ro[idx]) for idx, q in enumerate(packed_qubits)]
+                program.wrap_in_numshots_loop(num_trials + 1)
+            executable = qc.compiler.native_quil_to_executable(program)
+            timing['compile'] += time.time() - start
+
+            for row in range(dim):
+                bits = int_to_bit_array(row, joint_group_size)
+                bitstring = bits * len(packing)
+                successes = np.zeros(len(packing), dtype=int)
+                rounds = []
+                for _ in range(max_preparation_attempts):
+                    start = time.time()
+                    results = np.asarray(qc.run(executable, memory_map={reg_name: bitstring}))
+                    timing['run'] += time.time() - start
+
+                    start = time.time()
+                    prepared, post = results[:, :num_qubits], results[:, num_qubits:]
+                    if not use_active_reset:
+                        prepared, post = prepared[:-1], post[1:]
+                    # one column per group of whether the measured preparation was successful
+                    success = (prepared == bitstring).reshape(len(prepared), len(packing), -1)
+                    success = success.all(axis=2)
+                    rounds.append((success, post))
+                    successes += success.sum(axis=0)
+                    timing['analysis'] += time.time() - start
+                    if np.all(successes >= num_trials):
+                        break
+
+                start = time.time()
+                success = np.concatenate([r[0] for r in rounds])
+                post = np.concatenate([r[1] for r in rounds])
+                for idx, group in enumerate(packing):
+                    group_post = post[:, idx * joint_group_size:(idx + 1) * joint_group_size]
+                    kept = group_post[success[:, idx]][:num_trials]
+                    counts = confusion_counts.setdefault(group, np.zeros((dim, dim), dtype=int))
+                    counts[row] = outcome_counts(kept, joint_group_size)
+                timing['analysis'] += time.time() - start
 
                 # update the progress bar
                 pbar.update(1)
 
-            # store completed confusion matrix in dictionary
-            confusion_matrices[group] = matrix
+    # store completed confusion matrices in dictionary, in the order of groups
+    confusion_counts = {group: confusion_counts[group] for group in groups}
+    confusion_matrices = {group: confusion_matrix_from_counts(counts)
+                          for group, counts in confusion_counts.items()}
+    log.info("Reset characterization of %d groups: %.3fs compiling, %.3fs running, %.3fs analysing",
+             len(groups), timing['compile'], timing['run'], timing['analysis'],
+             extra={'timing': timing})
 
+    if return_counts:
+        return confusion_matrices, confusion_counts
     return confusion_matrices
+
+
+class ReadoutNoiseModel(object):
+    """
+    A readout noise model which is a tensor product of confusion matrices on disjoint clusters of
+    qubits; readout errors may be correlated within a cluster but not between clusters.
+
+    Outcomes on the qubits of the model are represented by integers whose most significant
+    (leftmost) bit labels the first qubit, as for the matrices of
+    estimate_joint_confusion_in_set. Distributions and histograms are sparse dictionaries from
+    outcomes to probabilities or counts. The 2^n x 2^n matrix of the model on n qubits is never
+    formed: probabilities are products of cluster matrix entries, evaluated lazily, and
+    mitigation works in the subspace of observed outcomes, in time polynomial in the number of
+    distinct observed outcomes rather than exponential in n.
+
+    Mitigation restricted to the observed subspace follows
+    [M3] Scalable mitigation of measurement errors on quantum computers
+         Nation et al.,
+         PRX Quantum 2, 040326 (2021)
+         https://doi.org/10.1103/PRXQuantum.2.040326
+         https://arxiv.org/abs/2108.12518
+
+    :param clusters: a dictionary mapping disjoint tuples of qubits to their joint confusion
+        matrices, e.g. the output of estimate_joint_confusion_in_set with joint_group_size=1.
+        Each matrix has rows indexed by prepared and columns by observed bitstrings.
+    :param qubits: the order of qubits in outcomes; defaults to the qubits of the clusters in
+        increasing order.
+    """
+
+    def __init__(self, clusters: Dict[Tuple[int, ...], np.ndarray], qubits: Sequence[int] = None):
+        self.clusters = [tuple(cluster) for cluster in clusters.keys()]
+        self.matrices = [np.asarray(matrix, dtype=float) for matrix in clusters.values()]
+        all_qubits = [q for cluster in self.clusters for q in cluster]
+        if len(all_qubits) != len(set(all_qubits)):
+            raise ValueError("The clusters must be disjoint.")
+        self.qubits = sorted(all_qubits) if qubits is None else list(qubits)
+        if sorted(self.qubits) != sorted(all_qubits):
+            raise ValueError("The clusters must cover exactly the given qubits.")
+        for cluster, matrix in zip(self.clusters, self.matrices):
+            if matrix.shape != (2 ** len(cluster),) * 2:
+                raise ValueError("The matrix of cluster {} has the wrong shape.".format(cluster))
+
+        num_qubits = len(self.qubits)
+        position = {qubit: idx for idx, qubit in enumerate(self.qubits)}
+        # shifts of the bits of each cluster's qubits within an outcome, most significant first
+        self._shifts = [np.array([num_qubits - 1 - position[q] for q in cluster], dtype=np.int64)
+                        for cluster in self.clusters]
+
+    def _cluster_outcomes(self, outcomes: np.ndarray) -> List[np.ndarray]:
+        """
+        Split outcomes on all qubits into the outcomes on each cluster.
+        """
+        outcomes = np.asarray(outcomes, dtype=np.int64)
+        return [bit_arrays_to_ints((outcomes[..., np.newaxis] >> shifts) & 1)
+                for shifts in self._shifts]
+
+    def joint_probability(self, prepared, observed) -> np.ndarray:
+        """
+        The probability p(observed | prepared) of the model, evaluated for (arrays of) outcomes.
+
+        :param prepared: prepared outcome(s).
+        :param observed: observed outcome(s), broadcast against prepared.
+        :return: the probability of each pair.
+        """
+        prob = 1.
+        for matrix, prep, obs in zip(self.matrices, self._cluster_outcomes(prepared),
+                                     self._cluster_outcomes(observed)):
+            prob = prob * matrix[prep, obs]
+        return prob
+
+    def marginal_model(self, qubits: Sequence[int]) -> 'ReadoutNoiseModel':
+        """
+        The readout noise model of a subset of the qubits, see marginalize_confusion_matrix.
+
+        :param qubits: the qubits to keep, in the order of outcomes of the new model.
+        :return: a new model on only the given qubits.
+        """
+        clusters = {}
+        for cluster, matrix in zip(self.clusters, self.matrices):
+            kept = tuple(q for q in cluster if q in qubits)
+            if len(kept) == len(cluster):
+                clusters[cluster] = matrix
+            elif kept:
+                clusters[kept] = marginalize_confusion_matrix(matrix, cluster, kept)
+        return ReadoutNoiseModel(clusters, qubits)
+
+    def marginalize(self, distribution: Dict[int, float], qubits: Sequence[int]) -> Dict[int, float]:
+        """
+        Marginalize a sparse distribution (or histogram) over the model's qubits onto a subset.
+
+        :param distribution: a dictionary from outcomes on the model's qubits to probabilities.
+        :param qubits: the qubits to keep, in the order of the returned outcomes.
+        :return: a dictionary from outcomes on the given qubits to probabilities.
+        """
+        shifts = np.array([len(self.qubits) - 1 - self.qubits.index(q) for q in qubits],
+                          dtype=np.int64)
+        outcomes = np.fromiter(distribution.keys(), dtype=np.int64, count=len(distribution))
+        probs = np.fromiter(distribution.values(), dtype=float, count=len(distribution))
+        marginal_outcomes = bit_arrays_to_ints((outcomes[:, np.newaxis] >> shifts) & 1)
+        keys, inverse = np.unique(marginal_outcomes, return_inverse=True)
+        return dict(zip(keys.tolist(), np.bincount(inverse, weights=probs).tolist()))
+
+    def histogram(self, results: np.ndarray) -> Dict[int, int]:
+        """
+        The sparse histogram of outcomes of a (shots, qubits) array of results whose columns
+        are in the order of the model's qubits.
+        """
+        keys, counts = np.unique(bit_arrays_to_ints(results), return_counts=True)
+        return dict(zip(keys.tolist(), counts.tolist()))
+
+    def reduced_matrix(self, outcomes: Sequence[int]) -> np.ndarray:
+        """
+        The model's matrix of probabilities p(outcomes[i] | outcomes[j]) restricted to the given
+        outcomes, in time and memory quadratic in their number.
+        """
+        outcomes = np.asarray(outcomes, dtype=np.int64)
+        return self.joint_probability(outcomes[np.newaxis, :], outcomes[:, np.newaxis])
+
+    def mitigate(self, histogram: Dict[int, float], method: str = 'inverse',
+                 max_iterations: int = 1000, tol: float = 1e-10) -> Dict[int, float]:
+        """
+        Estimate the distribution of outcomes before readout from a sparse histogram.
+
+        The model is restricted to the m distinct observed outcomes. With method
+            -'inverse', the restricted matrix with columns renormalized to sum to one is
+                inverted, as in [M3]; the result is a quasi-probability distribution which may
+                have negative entries. Costs O(m^3).
+            -'lstsq', the restricted linear system is solved by nonnegative least squares with
+                the normalization enforced, giving a probability distribution.
+            -'ibu', iterative Bayesian unfolding (expectation maximization of the likelihood)
+                is run from the uniform distribution until the change is below tol. Costs
+                O(m^2) per iteration.
+
+        :param histogram: a dictionary from observed outcomes to counts or frequencies.
+        :param method: one of 'inverse', 'lstsq' or 'ibu'.
+        :param max_iterations: the maximum number of iterations of 'ibu'.
+        :param tol: the convergence tolerance of 'ibu', in total variation distance.
+        :return: a dictionary from outcomes to (quasi-)probabilities, on the observed outcomes.
+        """
+        outcomes = list(histogram.keys())
+        freqs = np.fromiter(histogram.values(), dtype=float, count=len(histogram))
+        freqs /= freqs.sum()
+        matrix = self.reduced_matrix(outcomes)
+
+        if method == 'inverse':
+            estimate = np.linalg.solve(matrix / matrix.sum(axis=0), freqs)
+        elif method == 'lstsq':
+            # append a heavily weighted row which enforces normalization
+            weight = 1e3
+            augmented = np.vstack([matrix, weight * np.ones(len(outcomes))])
+            estimate, _ = nnls(augmented, np.append(freqs, weight))
+            estimate /= estimate.sum()
+        elif method == 'ibu':
+            estimate = np.full(len(outcomes), 1 / len(outcomes))
+            for _ in range(max_iterations):
+                posterior = matrix * estimate
+                posterior /= posterior.sum(axis=1, keepdims=True)
+                updated = freqs @ posterior
+                converged = np.sum(np.abs(updated - estimate)) / 2 < tol
+                estimate = updated
+                if converged:
+                    break
+        else:
+            raise ValueError("method must be one of 'inverse', 'lstsq' or 'ibu'.")
+        return dict(zip(outcomes, estimate.tolist()))
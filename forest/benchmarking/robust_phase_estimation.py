@@ -13,7 +13,8 @@ from pyquil.api import QuantumComputer
 from pyquil.unitary_tools import all_bitstrings
 from forest.benchmarking.compilation import basic_compile
 from forest.benchmarking.utils import transform_bit_moments_to_pauli, local_pauli_eig_prep, \
-    local_pauli_eig_meas, determine_simultaneous_grouping, bloch_vector_to_standard_basis
+    local_pauli_eig_meas, determine_simultaneous_grouping, bloch_vector_to_standard_basis, \
+    bit_arrays_to_ints
 
 import matplotlib.pyplot as plt
 
@@ -212,7 +213,7 @@ def generate_rpe_experiment(rotation: Program, change_of_basis: Union[np.ndarray
 
     # change_of_basis is already specified as program, so add composed program column
     if isinstance(change_of_basis, Program):
-        expt["Program"] = expt.apply(_make_prog_from_df, axis=1)
+        expt["Program"] = _make_programs(expt)
 
     return expt
 
@@ -236,7 +237,7 @@ def add_programs_to_rpe_dataframe(qc: QuantumComputer, experiment: DataFrame) ->
     :return: a copy of the experiment dataframe with newly populated "Program" column.
     """
     expt = experiment.copy()
-    expt["Program"] = expt.apply(_make_prog_from_df, axis=1,  args=(qc,))
+    expt["Program"] = _make_programs(expt, qc)
     return expt
 
 
@@ -294,14 +295,22 @@ def _run_rpe_program(qc: QuantumComputer, program: Program, measure_qubits: Sequ
     :param num_shots: number of shots of results to collect for the program
     :return: the results for all of the measure_qubits after running the program
     """
+    return qc.run(_compile_rpe_program(qc, program, measure_qubits, num_shots))
+
+
+def _compile_rpe_program(qc: QuantumComputer, program: Program,
+                         measure_qubits: Sequence[Sequence[int]], num_shots: int):
+    """
+    Add measurements of the measure_qubits to program and compile it into an executable for qc
+    which collects num_shots shots each time it is run.
+    """
     prog = Program() + program  # make a copy of program
     meas_qubits = [qubit for qubits in measure_qubits for qubit in qubits]
     ro_bit = prog.declare("ro", "BIT", len(meas_qubits))
     for idx, q in enumerate(meas_qubits):
         prog.measure(q, ro_bit[idx])
     prog.wrap_in_numshots_loop(num_shots)
-    executable = qc.compiler.native_quil_to_executable(basic_compile(prog))
-    return qc.run(executable)
+    return qc.compiler.native_quil_to_executable(basic_compile(prog))
 
 
 def run_single_rpe_experiment(qc: QuantumComputer, experiment: DataFrame,
@@ -326,7 +335,7 @@ def run_single_rpe_experiment(qc: QuantumComputer, experiment: DataFrame,
     expt = experiment.copy()
     if "Program" not in expt.columns.values:
         # pass the qc and each row from dataframe into helper to make programs
-        expt["Program"] = expt.apply(_make_prog_from_df, axis=1, args=(qc,))
+        expt["Program"] = _make_programs(expt, qc)
 
     alpha = 5 / 2  # should be > 2
     beta = 1 / 2  # should be > 0
@@ -382,6 +391,30 @@ def _make_prog_from_df(row: Series, qc: QuantumComputer = None) -> Program:
     :return: program
     """
     cob = row["Change of Basis"]
+    meas_qubits = row["Measure Qubits"]
+    if len(meas_qubits) > 1:
+        meas_qubit = row["Non-Z-Basis Meas Qubit"]
+    else:
+        meas_qubit = meas_qubits[0]
+
+    if not isinstance(cob, Program) and qc is not None:
+        cob = change_of_basis_matrix_to_quil(qc, meas_qubits, cob)
+
+    prog = _make_rotation_prog_from_df(row, cob)
+    # prepare the meas_qubit in the appropriate meas_direction
+    prog += local_pauli_eig_meas(row["Measure Direction"], meas_qubit)
+    return prog
+
+
+def _make_rotation_prog_from_df(row: Series, cob: Program) -> Program:
+    """
+    The part of the program of a row of an RPE experiment which precedes the change to the
+    measurement direction, and so is shared by the X and Y rows of each depth.
+
+    :param row: a row of an rpe experiment generated by generate_rpe_experiment
+    :param cob: the change of basis as a program
+    :return: program
+    """
     rotation = row["Rotation"]
     meas_qubits = row["Measure Qubits"]
     if len(meas_qubits) > 1:
@@ -392,9 +425,6 @@ def _make_prog_from_df(row: Series, qc: QuantumComputer = None) -> Program:
     if "Post Select State" in row.index:
         post_select_state = row["Post Select State"]
 
-    if not isinstance(cob, Program) and qc is not None:
-        cob = change_of_basis_matrix_to_quil(qc, meas_qubits, cob)
-
     prog = Program()
 
     if post_select_state is None:
@@ -409,14 +439,76 @@ def _make_prog_from_df(row: Series, qc: QuantumComputer = None) -> Program:
     # using change_of_basis, transform to equal superposition of rotation eigenvectors
     prog += cob
     # perform the rotation depth many times
-    prog += sum([rotation for _ in range(row["Depth"])], Program())
+    prog += _repeat_program(rotation, row["Depth"])
     # return to computational basis before measurements
     prog += cob.dagger()
-    # prepare the meas_qubit in the appropriate meas_direction
-    prog += local_pauli_eig_meas(row["Measure Direction"], meas_qubit)
     return prog
 
 
+def _repeat_program(program: Program, times: int) -> Program:
+    """
+    Concatenate times many copies of program, in time linear in the length of the result.
+    """
+    if isinstance(program, Gate):
+        program = Program(program)
+    repeated = program.copy_everything_except_instructions()
+    repeated.inst(list(program.instructions) * times)
+    return repeated
+
+
+def _cached_change_of_basis(qc: QuantumComputer, qubits: Sequence[int], change_of_basis,
+                            cache: Dict) -> Program:
+    """
+    Return change_of_basis as a program, compiling it with change_of_basis_matrix_to_quil only
+    the first time a given matrix is requested on given qubits.
+    """
+    if isinstance(change_of_basis, Program) or qc is None:
+        return change_of_basis
+    matrix = np.asarray(change_of_basis)
+    key = (matrix.tobytes(), matrix.shape, tuple(qubits))
+    if key not in cache:
+        cache[key] = change_of_basis_matrix_to_quil(qc, qubits, matrix)
+    return cache[key]
+
+
+def _make_programs(experiment: DataFrame, qc: QuantumComputer = None,
+                   cob_cache: Dict = None) -> List[Program]:
+    """
+    Generate the program of every row of an RPE experiment, equivalent to calling
+    _make_prog_from_df on each row.
+
+    A change of basis given as a matrix is compiled once per matrix and set of qubits (shared
+    through cob_cache, if supplied, across experiments), and the part of the program before the
+    measurement basis change is built once per depth, non-z-basis measurement qubit and
+    post-selection state and reused for the X and Y rows.
+
+    :param experiment: an rpe experiment generated by generate_rpe_experiment
+    :param qc: a quantum computer that the programs will be run on, see _make_prog_from_df
+    :param cob_cache: an optional dictionary used to memoize compiled changes of basis
+    :return: the list of programs, in the order of the rows of experiment
+    """
+    if cob_cache is None:
+        cob_cache = {}
+    prefixes = {}
+    programs = []
+    for _, row in experiment.iterrows():
+        meas_qubits = row["Measure Qubits"]
+        if len(meas_qubits) > 1:
+            meas_qubit = row["Non-Z-Basis Meas Qubit"]
+        else:
+            meas_qubit = meas_qubits[0]
+
+        post_select_state = row.get("Post Select State")
+        if post_select_state is not None:
+            post_select_state = tuple(post_select_state)
+        key = (row["Depth"], meas_qubit, post_select_state)
+        if key not in prefixes:
+            cob = _cached_change_of_basis(qc, meas_qubits, row["Change of Basis"], cob_cache)
+            prefixes[key] = _make_rotation_prog_from_df(row, cob)
+        programs.append(prefixes[key] + local_pauli_eig_meas(row["Measure Direction"], meas_qubit))
+    return programs
+
+
 def acquire_rpe_data(qc: QuantumComputer, experiments: Union[DataFrame, Sequence[DataFrame]],
                      multiplicative_factor: float = 1.0, additive_error: float = None,
                      grouping: Sequence[Sequence[int]] = None, results_label="Results") \
@@ -445,10 +537,11 @@ def acquire_rpe_data(qc: QuantumComputer, experiments: Union[DataFrame, Sequence
     expts = [expt.copy() for expt in experiments]
 
     # check that each experiment has programs generated for this qc; generate them if not
+    cob_cache = {}
     for expt in expts:
         if "Program" not in expt.columns.values:
             # pass the qc and each row from dataframe into helper to make programs
-            expt["Program"] = expt.apply(_make_prog_from_df, axis=1, args=(qc,))
+            expt["Program"] = _make_programs(expt, qc, cob_cache)
 
     # try to group experiments to run simultaneously
     if grouping is None:
@@ -483,6 +576,150 @@ def acquire_rpe_data(qc: QuantumComputer, experiments: Union[DataFrame, Sequence
     return expts
 
 
+def _bloch_radius_scores_by_qubit(experiment: DataFrame, results_label="Results") \
+        -> Dict[int, np.ndarray]:
+    """
+    For the rows of a single depth of an RPE experiment, calculate the ratio r / r_std of the
+    radius of the estimated position in the plane of rotation to its standard error, for every
+    relative phase estimated by robust_phase_estimate. The scores are grouped by the qubit which
+    is measured in the plane of rotation to estimate each phase.
+
+    The probabilities are estimated with a Laplace (add-one) prior so that a handful of
+    identical shots does not give a vanishing standard error; outcomes which have not yet been
+    observed score zero.
+
+    :param experiment: the rows of an RPE experiment at a single depth, with results
+    :param results_label: label for the column with results
+    :return: a dict from each non-Z-basis measured qubit to the scores of the relative phases
+        estimated from the rows in which it is measured
+    """
+    meas_qubits = experiment["Measure Qubits"].values[0]
+    state = [None] * len(meas_qubits)
+    if "Post Select State" in experiment.columns.values:
+        state = experiment["Post Select State"].values[0]
+
+    if len(meas_qubits) == 1:
+        non_z_qubits = meas_qubits
+    else:
+        non_z_qubits = [q for idx, q in enumerate(meas_qubits) if state[idx] is None]
+
+    scores = {}
+    for meas_q in non_z_qubits:
+        meas_q_index = meas_qubits.index(meas_q)
+        post_state_indices = [idx for idx in range(len(meas_qubits)) if idx != meas_q_index]
+        num_outcomes = 2 ** len(post_state_indices)
+        rows = experiment
+        if len(meas_qubits) > 1:
+            rows = experiment[experiment["Non-Z-Basis Meas Qubit"] == meas_q]
+
+        expectations, variances, observed = [], [], []
+        for direction in ['X', 'Y']:
+            results = np.asarray(rows[rows["Measure Direction"] == direction][results_label].values[0])
+            codes = bit_arrays_to_ints(results[:, post_state_indices])
+            n_selected = np.bincount(codes, minlength=num_outcomes)
+            n_ones = np.bincount(codes, weights=results[:, meas_q_index], minlength=num_outcomes)
+            p = (n_ones + 1) / (n_selected + 2)
+            expectations.append(1 - 2 * p)
+            variances.append(4 * p * (1 - p) / np.maximum(n_selected, 1))
+            observed.append(n_selected > 0)
+        r = np.sqrt(expectations[0] ** 2 + expectations[1] ** 2)
+        r_std = np.sqrt(variances[0] + variances[1])
+        score = np.where(observed[0] & observed[1], r / r_std, 0.)
+
+        relevant = []
+        for code, outcome in enumerate(all_bitstrings(len(post_state_indices))):
+            full = np.insert(outcome, meas_q_index, 0)
+            if all(bit == full[j] for j, bit in enumerate(state) if bit is not None):
+                relevant.append(score[code])
+        scores[meas_q] = np.array(relevant)
+    return scores
+
+
+def acquire_rpe_data_adaptively(qc: QuantumComputer, experiment: DataFrame,
+                                multiplicative_factor: float = 1.0, additive_error: float = None,
+                                shots_per_round: int = 50, max_shots: int = 1000,
+                                num_stds: float = 3.0, results_label="Results") -> DataFrame:
+    """
+    Run an RPE experiment, deciding online how many shots to spend at each depth and when to stop
+    going deeper.
+
+    Depths are acquired in increasing order. Each depth is first run with the num_trials()
+    shots that acquire_rpe_data would spend on it. As long as the radius r of the estimated
+    position in the plane of rotation is within num_stds standard errors r_std of zero for some
+    estimated phase, the quadrant of that phase is ambiguous and shots_per_round more shots are
+    taken of the programs from which that phase is estimated, up to max_shots in total; the
+    programs of phases which are already decided are not run again. If after that every
+    estimated phase still has r < r_std, the depth is decoherence limited, see
+    estimate_phase_from_moments, and no deeper iterations are run: they would be discarded by
+    the analysis anyway.
+
+    Each program is compiled once into an executable collecting shots_per_round shots, and all
+    shots are collected by re-running it; when a round would overshoot the initial number of
+    shots or max_shots, the surplus shots of that round are discarded.
+
+    :param qc: a quantum computer, e.g. QVM or QPU, that runs each program in the experiment
+    :param experiment: dataframe generated by generate_rpe_experiment()
+    :param multiplicative_factor: ad-hoc factor to multiply the initial number of shots per
+        iteration. See num_trials().
+    :param additive_error: estimate of the max additive error in the experiment, see num_trials()
+    :param shots_per_round: the number of shots added to each program at a depth whose quadrant
+        decision is still ambiguous
+    :param max_shots: the maximum number of shots taken of any single program
+    :param num_stds: the number of standard errors r must exceed for the quadrant to be decided
+    :param results_label: label for the column of the returned df to be populated with results
+    :return: A copy of the rows of the experiment data frame for the depths that were run, with
+        the raw shot results in a new column and the number of shots taken in "Shots Spent".
+    """
+    expt = experiment.copy()
+    if "Program" not in expt.columns.values:
+        expt["Program"] = _make_programs(expt, qc)
+
+    alpha = 5 / 2  # should be > 2 for Heisenberg scaling. See eq. V.11 in [RPE]
+    beta = 1 / 2  # should be > 0
+    max_depth = max(expt["Depth"].values)
+    measure_qubits = expt["Measure Qubits"].values[0]
+
+    results = {}
+    for depth in sorted(expt["Depth"].unique()):
+        rows = expt[expt["Depth"] == depth]
+        executables = {idx: _compile_rpe_program(qc, program, [measure_qubits], shots_per_round)
+                       for idx, program in zip(rows.index, rows["Program"].values)}
+        initial_shots = min(num_trials(depth, max_depth, alpha, beta, multiplicative_factor,
+                                       additive_error), max_shots)
+        targets = {idx: initial_shots for idx in rows.index}
+        for idx in rows.index:
+            results[idx] = []
+
+        while True:
+            for idx, target in targets.items():
+                num_shots = sum(len(res) for res in results[idx])
+                while num_shots < target:
+                    # discard the surplus of the last round rather than compile another executable
+                    results[idx].append(qc.run(executables[idx])[:target - num_shots])
+                    num_shots += len(results[idx][-1])
+
+            rows = rows.assign(**{results_label: [np.vstack(results[idx]) for idx in rows.index]})
+            scores = _bloch_radius_scores_by_qubit(rows, results_label)
+            ambiguous = [qubit for qubit, qubit_scores in scores.items()
+                         if np.any(qubit_scores < num_stds)]
+            ambiguous_rows = rows
+            if "Non-Z-Basis Meas Qubit" in rows.columns.values and len(measure_qubits) > 1:
+                ambiguous_rows = rows[rows["Non-Z-Basis Meas Qubit"].isin(ambiguous)]
+            targets = {idx: min(targets[idx] + shots_per_round, max_shots)
+                       for idx in ambiguous_rows.index if ambiguous and targets[idx] < max_shots}
+            if not targets:
+                break
+
+        if all(np.all(qubit_scores < 1) for qubit_scores in scores.values()):
+            # every phase is decoherence limited; deeper iterations carry no information.
+            break
+
+    expt = expt.loc[list(results.keys())].copy()
+    expt[results_label] = [np.vstack(results[idx]) for idx in expt.index]
+    expt["Shots Spent"] = [len(res) for res in expt[results_label].values]
+    return expt
+
+
 #########
 # Analysis
 #########
@@ -580,49 +817,64 @@ def get_moments(experiment: DataFrame, post_select_state: Sequence[int] = None,
             x_stds.append(np.sqrt(var_x))
             y_stds.append(np.sqrt(var_y))
     else:
-        meas_q = experiment["Non-Z-Basis Meas Qubit"].unique()
-        assert len(meas_q) == 1, "Get moments should be called only for a particular non-z-basis " \
-                                 "measurement qubit."
-        meas_q = meas_q[0]
-        meas_qubits = experiment["Measure Qubits"].values[0]
-        meas_q_index = meas_qubits.index(meas_q)
-        post_state_indices = [idx for idx in range(len(meas_qubits)) if idx != meas_q_index]
-
-        for depth, group in experiment.groupby(["Depth"]):
-            x_results = group[group['Measure Direction'] == 'X'][results_label].values[0]
-            y_results = group[group['Measure Direction'] == 'Y'][results_label].values[0]
-
-            selected_xs = []
-            for result in x_results:
-                if np.array_equal(result[post_state_indices], post_select_state):
-                    selected_xs.append(result[meas_q_index])
-            selected_xs = np.asarray(selected_xs)
-
-            selected_ys = []
-            for result in y_results:
-                if np.array_equal(result[post_state_indices], post_select_state):
-                    selected_ys.append(result[meas_q_index])
-            selected_ys = np.asarray(selected_ys)
-
-            n_x = len(selected_xs)
-            n_y = len(selected_ys)
-
-            p_x = selected_xs.mean()
-            p_y = selected_ys.mean()
-            # standard deviation of the mean of the probabilities
-            p_x_std = selected_xs.std() / np.sqrt(n_x)
-            p_y_std = selected_ys.std() / np.sqrt(n_y)
-            # convert probabilities to expectation values of X and Y
-            exp_x, var_x = transform_bit_moments_to_pauli(1 - p_x, p_x_std ** 2)
-            exp_y, var_y = transform_bit_moments_to_pauli(1 - p_y, p_y_std ** 2)
-            xs.append(exp_x)
-            ys.append(exp_y)
-            x_stds.append(np.sqrt(var_x))
-            y_stds.append(np.sqrt(var_y))
+        moments = get_moments_for_all_outcomes(experiment, results_label)
+        xs, ys, x_stds, y_stds = moments[tuple(post_select_state)]
 
     return xs, ys, x_stds, y_stds
 
 
+def get_moments_for_all_outcomes(experiment: DataFrame, results_label='Results') \
+        -> Dict[Tuple[int, ...], Tuple[List, List, List, List]]:
+    """
+    Calculate the moments of get_moments for every post-selection outcome at once.
+
+    Each results array is scanned once: the bits of the post-selected qubits of every shot are
+    packed into an outcome code, and the number of shots and the number of 1s of the non-z-basis
+    measurement qubit are counted for every code with np.bincount. For n_s selected shots of
+    which a fraction p are 1, the standard deviation of the mean is sqrt(p (1 - p) / n_s);
+    outcomes which are never observed get NaN moments.
+
+    :param experiment: a dataframe with RPE results for a particular non-z-basis measurement
+        qubit, populated by a call to acquire_rpe_data
+    :param results_label: label for the column with results from which the moments are estimated
+    :return: a dictionary mapping each outcome on the measure qubits other than the non-z-basis
+        measurement qubit, as a tuple of bits in the order of the measure qubits, to the
+        moments (xs, ys, x_stds, y_stds) of the shots post-selected on that outcome.
+    """
+    meas_q = experiment["Non-Z-Basis Meas Qubit"].unique()
+    assert len(meas_q) == 1, "Get moments should be called only for a particular non-z-basis " \
+                             "measurement qubit."
+    meas_q = meas_q[0]
+    meas_qubits = experiment["Measure Qubits"].values[0]
+    meas_q_index = meas_qubits.index(meas_q)
+    post_state_indices = [idx for idx in range(len(meas_qubits)) if idx != meas_q_index]
+    num_outcomes = 2 ** len(post_state_indices)
+
+    # moments[direction] has shape (depths, outcomes)
+    moments = {}
+    for direction in ['X', 'Y']:
+        rows = experiment[experiment['Measure Direction'] == direction].sort_values("Depth")
+        means, stds = [], []
+        for results in rows[results_label].values:
+            results = np.asarray(results)
+            codes = bit_arrays_to_ints(results[:, post_state_indices])
+            n_selected = np.bincount(codes, minlength=num_outcomes)
+            n_ones = np.bincount(codes, weights=results[:, meas_q_index], minlength=num_outcomes)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                p = n_ones / n_selected
+                # standard deviation of the mean of the probabilities
+                p_std = np.sqrt(p * (1 - p) / n_selected)
+            means.append(p)
+            stds.append(p_std)
+        # convert probabilities to expectation values
+        exp, var = transform_bit_moments_to_pauli(1 - np.array(means), np.array(stds) ** 2)
+        moments[direction] = (exp, np.sqrt(var))
+
+    return {tuple(outcome): (list(moments['X'][0][:, code]), list(moments['Y'][0][:, code]),
+                             list(moments['X'][1][:, code]), list(moments['Y'][1][:, code]))
+            for code, outcome in enumerate(all_bitstrings(len(post_state_indices)))}
+
+
 def add_moments_to_dataframe(experiment: DataFrame, results_label='Results'):
     """
     Adds new columns storing calculated expected value and standard deviation for each row of
@@ -745,13 +997,14 @@ def robust_phase_estimate(experiment: DataFrame, results_label="Results") -> Uni
             # relative phase between different pairs of eigenvectors. Here we iterate over each
             # unique outcome, discard outcomes that don't match the post-selected state,
             # and estimate the phase corresponding to this outcome.
+            all_moments = get_moments_for_all_outcomes(expt, results_label)
             for outcome in all_bitstrings(len(meas_qubits) - 1):
                 full = np.insert(outcome, idx, 0)  # fill in the meas_q for comparison to state
                 matches = [bit == full[j] for j, bit in enumerate(state) if bit is not None]
                 if not all(matches):
                     # the outcome violates a post-selection
                     continue
-                moments = get_moments(expt, outcome, results_label)
+                moments = all_moments[tuple(outcome)]
                 relative_phases.append(estimate_phase_from_moments(*moments))
     return relative_phases
 
@@ -26,6 +26,7 @@ Further references include:
        https://arxiv.org/abs/quant-ph/0401119
 
 """
+from functools import lru_cache
 from typing import Sequence, Tuple, List
 import numpy as np
 from forest.benchmarking.utils import n_qubit_pauli_basis, partial_trace
@@ -90,8 +91,8 @@ def kraus2chi(kraus_ops: Sequence[np.ndarray]) -> np.ndarray:
             kraus_ops = [kraus_ops]
 
     dim = np.asarray(kraus_ops[0]).shape[0]  # kraus op is dim by dim matrix
-    c_vecs = [computational2pauli_basis_matrix(dim) @ vec(kraus) for kraus in kraus_ops]
-    chi_mat = sum([c_vec @ c_vec.conj().T for c_vec in c_vecs])
+    c_vecs = _computational2pauli(np.hstack([vec(kraus) for kraus in kraus_ops]), dim)
+    chi_mat = c_vecs @ c_vecs.conj().T
     return chi_mat
 
 
@@ -119,22 +120,28 @@ def kraus2superop(kraus_ops: Sequence[np.ndarray]) -> np.ndarray:
     :param kraus_ops: A tuple of N Kraus operators
     :return: Returns a dim**2 by dim**2 matrix.
     """
-    if isinstance(kraus_ops, np.ndarray):  # handle input of single kraus op
-        if len(kraus_ops[0].shape) < 2:  # first elem is not a matrix
-            kraus_ops = [kraus_ops]
-
-    rows, cols = np.asarray(kraus_ops[0]).shape
+    kraus_ops = _stack_kraus_ops(kraus_ops)
+    _, rows, cols = kraus_ops.shape
 
     # Standard case of square Kraus operators is if rows==cols.
     # When representing a partial projection, e.g. a single measurement operator
     # M_i = Id \otimes <i| for i \in {0,1}, rows!=cols.
     # However the following will work in both cases:
 
-    superop = np.zeros((rows**2, cols**2), dtype=complex)
+    # the sum of np.kron(op.conj(), op) over the kraus ops as a single contraction
+    superop = np.einsum('kij,kab->iajb', kraus_ops.conj(), kraus_ops, optimize=True)
+    return superop.reshape((rows ** 2, cols ** 2))
+
 
-    for op in kraus_ops:
-        superop += np.kron(np.asarray(op).conj(), op)
-    return superop
+def _stack_kraus_ops(kraus_ops: Sequence[np.ndarray]) -> np.ndarray:
+    """
+    Stack a sequence of N Kraus operators, or a single Kraus operator, into an N by M by dim
+    complex array.
+    """
+    kraus_ops = np.asarray(kraus_ops, dtype=complex)
+    if kraus_ops.ndim == 2:  # handle input of single kraus op
+        kraus_ops = kraus_ops[np.newaxis]
+    return kraus_ops
 
 
 def kraus2pauli_liouville(kraus_ops: Sequence[np.ndarray]) -> np.ndarray:
@@ -164,11 +171,10 @@ def kraus2choi(kraus_ops: Sequence[np.ndarray]) -> np.ndarray:
     :param kraus_ops: A list of N Kraus operators
     :return: Returns a dim**2 by dim**2 matrix.
     """
-    if isinstance(kraus_ops, np.ndarray):  # handle input of single kraus op
-        if len(kraus_ops[0].shape) < 2:  # first elem is not a matrix
-            kraus_ops = [kraus_ops]
-
-    return sum([vec(op) @ vec(op).conj().T for op in kraus_ops])
+    kraus_ops = _stack_kraus_ops(kraus_ops)
+    # row k of vecs is vec(M_k)^T
+    vecs = kraus_ops.transpose(0, 2, 1).reshape(len(kraus_ops), -1)
+    return vecs.T @ vecs.conj()
 
 
 def chi2pauli_liouville(chi_matrix: np.ndarray) -> np.ndarray:
@@ -210,8 +216,7 @@ def chi2choi(chi_matrix: np.ndarray) -> np.ndarray:
     :return: a dim**2 by dim**2 Choi matrix
     """
     dim = int(np.sqrt(np.asarray(chi_matrix).shape[0]))
-    p2c = pauli2computational_basis_matrix(dim)
-    return p2c @ chi_matrix @ p2c.conj().T
+    return _conjugate_by_basis_change(_pauli2computational, chi_matrix, dim)
 
 
 def superop2kraus(superop: np.ndarray) -> List[np.ndarray]:
@@ -226,12 +231,12 @@ def superop2kraus(superop: np.ndarray) -> List[np.ndarray]:
 
 def superop2chi(superop: np.ndarray) -> np.ndarray:
     """
-    Converts a superoperator into a list of Kraus operators. (operators with small norm may be excluded)
+    Converts a superoperator into a chi matrix.
 
     :param superop: a dim**2 by dim**2 superoperator
     :return: a dim**2 by dim**2 process matrix
     """
-    return kraus2chi(superop2kraus(superop))
+    return choi2chi(superop2choi(superop))
 
 
 def superop2pauli_liouville(superop: np.ndarray) -> np.ndarray:
@@ -242,8 +247,7 @@ def superop2pauli_liouville(superop: np.ndarray) -> np.ndarray:
     :return: dim**2 by dim**2 Pauli-Liouville matrix
     """
     dim = int(np.sqrt(np.asarray(superop).shape[0]))
-    c2p_basis_transform = computational2pauli_basis_matrix(dim)
-    return c2p_basis_transform @ superop @ c2p_basis_transform.conj().T * dim
+    return _conjugate_by_basis_change(_computational2pauli, superop, dim) * dim
 
 
 def superop2choi(superop: np.ndarray) -> np.ndarray:
@@ -269,12 +273,12 @@ def pauli_liouville2kraus(pl_matrix: np.ndarray) -> List[np.ndarray]:
 
 def pauli_liouville2chi(pl_matrix: np.ndarray) -> np.ndarray:
     """
-    Converts a pauli_liouville matrix into a chi matrix. (operators with small norm may be excluded)
+    Converts a pauli_liouville matrix into a chi matrix.
 
     :param pl_matrix: a dim**2 by dim**2 pauli_liouville matrix
     :return: a dim**2 by dim**2 process matrix
     """
-    return kraus2chi(pauli_liouville2kraus(pl_matrix))
+    return choi2chi(pauli_liouville2choi(pl_matrix))
 
 
 def pauli_liouville2superop(pl_matrix: np.ndarray) -> np.ndarray:
@@ -285,8 +289,7 @@ def pauli_liouville2superop(pl_matrix: np.ndarray) -> np.ndarray:
     :return: dim**2 by dim**2 superoperator
     """
     dim = int(np.sqrt(np.asarray(pl_matrix).shape[0]))
-    p2c_basis_transform = pauli2computational_basis_matrix(dim)
-    return p2c_basis_transform @ pl_matrix @ p2c_basis_transform.conj().T / dim
+    return _conjugate_by_basis_change(_pauli2computational, pl_matrix, dim) / dim
 
 
 def pauli_liouville2choi(pl_matrix: np.ndarray) -> np.ndarray:
@@ -308,18 +311,27 @@ def choi2kraus(choi: np.ndarray, tol: float = 1e-9) -> List[np.ndarray]:
     :param tol: optional threshold parameter for eigenvalues/kraus ops to be discarded
     :return: list of Kraus operators
     """
-    eigvals, v = np.linalg.eigh(choi)
+    return _eigh2kraus(*np.linalg.eigh(choi), tol=tol)
+
+
+def _eigh2kraus(eigvals: np.ndarray, v: np.ndarray, tol: float = 1e-9) -> List[np.ndarray]:
+    """
+    The Kraus operators of a Choi matrix with eigendecomposition (eigvals, v) as returned by
+    np.linalg.eigh, discarding those whose eigenvalue is smaller than tol in magnitude.
+    """
     return [np.lib.scimath.sqrt(eigval) * unvec(np.array([evec]).T) for eigval, evec in
             zip(eigvals, v.T) if abs(eigval) > tol]
 
 
 def choi2chi(choi: np.ndarray) -> np.ndarray:
     """
-    Converts a Choi matrix into a chi matrix. (operators with small norm may be excluded)
+    Converts a Choi matrix into a chi matrix. This is achieved by a linear change of basis.
+
     :param choi: a dim**2 by dim**2 choi matrix
     :return: a dim**2 by dim**2 process matrix
     """
-    return kraus2chi(choi2kraus(choi))
+    dim = int(np.sqrt(np.asarray(choi).shape[0]))
+    return _conjugate_by_basis_change(_computational2pauli, choi, dim)
 
 
 def choi2superop(choi: np.ndarray) -> np.ndarray:
@@ -351,20 +363,13 @@ def pauli2computational_basis_matrix(dim) -> np.ndarray:
         sigma_x = [0, 1, 0, 0].T in the 'pauli basis'
         p2c * sigma_x = vec(sigma_x) = | sigma_x >>
 
+    The conversion functions of this module never build this matrix, see _pauli2computational;
+    it is provided for when the dense matrix itself is needed.
+
     :param dim: dimension of the hilbert space on which the operators act.
     :return: A dim**2 by dim**2 basis transform matrix
     """
-    n_qubits = int(np.log2(dim))
-
-    conversion_mat = np.zeros((dim ** 2, dim ** 2), dtype=complex)
-
-    for i, pauli in enumerate(n_qubit_pauli_basis(n_qubits)):
-        pauli_label = np.zeros((dim ** 2, 1))
-        pauli_label[i] = 1.
-        pauli_mat = pauli[1]
-        conversion_mat += np.kron(vec(pauli_mat), pauli_label.T)
-
-    return conversion_mat
+    return _pauli2computational(np.eye(dim ** 2, dtype=complex), dim)
 
 
 def computational2pauli_basis_matrix(dim) -> np.ndarray:
@@ -379,7 +384,85 @@ def computational2pauli_basis_matrix(dim) -> np.ndarray:
     :param dim: dimension of the hilbert space on which the operators act.
     :return: A dim**2 by dim**2 basis transform matrix
     """
-    return pauli2computational_basis_matrix(dim).conj().T / dim
+    return _computational2pauli(np.eye(dim ** 2, dtype=complex), dim)
+
+
+# The n qubit transform is a tensor power of the single qubit one up to a permutation: writing
+# the row and column indices of a dim by dim operator in binary as (r_0, ..., r_{n-1}) and
+# (c_0, ..., c_{n-1}), vec(A_0 ⊗ ... ⊗ A_{n-1}) is indexed by (c_0, ..., c_{n-1}, r_0, ...,
+# r_{n-1}) whereas vec(A_0) ⊗ ... ⊗ vec(A_{n-1}) is indexed by (c_0, r_0, ..., c_{n-1}, r_{n-1}).
+# The transforms below apply the single qubit 4 by 4 matrix along each qubit axis and then
+# permute, in O(n 4^n) operations per column instead of O(16^n).
+
+@lru_cache()
+def _single_qubit_pauli2computational() -> np.ndarray:
+    """
+    The 4 by 4 pauli to computational basis transform of a single qubit.
+    """
+    return np.hstack([vec(pauli) for _, pauli in n_qubit_pauli_basis(1)]).astype(complex)
+
+
+def _apply_to_qubit_axes(factor: np.ndarray, array: np.ndarray, n_qubits: int) -> np.ndarray:
+    """
+    Multiply the leading axis of array, of length 4**n_qubits and reshaped to one axis of length
+    4 per qubit, by factor along each qubit axis.
+    """
+    tensor = array.reshape((4,) * n_qubits + (-1,))
+    for axis in range(n_qubits):
+        tensor = np.moveaxis(np.tensordot(factor, tensor, axes=(1, axis)), 0, axis)
+    return tensor.reshape(array.shape)
+
+
+def _interleaved_to_vec_order(array: np.ndarray, n_qubits: int, inverse: bool = False) \
+        -> np.ndarray:
+    """
+    Permute the leading axis of array from the (c_0, r_0, ..., c_{n-1}, r_{n-1}) order of a
+    tensor product of vec'ed single qubit operators to the (c_0, ..., c_{n-1}, r_0, ...,
+    r_{n-1}) order of vec, or back if inverse.
+    """
+    order = [2 * j for j in range(n_qubits)] + [2 * j + 1 for j in range(n_qubits)]
+    if inverse:
+        order = list(np.argsort(order))
+    tensor = array.reshape((2,) * (2 * n_qubits) + (-1,))
+    return tensor.transpose(order + [2 * n_qubits]).reshape(array.shape)
+
+
+def _pauli2computational(array: np.ndarray, dim: int) -> np.ndarray:
+    """
+    Compute pauli2computational_basis_matrix(dim) @ array without forming the matrix.
+
+    :param array: a dim**2 by m array.
+    :param dim: dimension of the hilbert space on which the operators act.
+    :return: a dim**2 by m array.
+    """
+    n_qubits = int(np.log2(dim))
+    array = np.asarray(array, dtype=complex)
+    array = _apply_to_qubit_axes(_single_qubit_pauli2computational(), array, n_qubits)
+    return _interleaved_to_vec_order(array, n_qubits)
+
+
+def _computational2pauli(array: np.ndarray, dim: int) -> np.ndarray:
+    """
+    Compute computational2pauli_basis_matrix(dim) @ array without forming the matrix.
+
+    :param array: a dim**2 by m array.
+    :param dim: dimension of the hilbert space on which the operators act.
+    :return: a dim**2 by m array.
+    """
+    n_qubits = int(np.log2(dim))
+    array = _interleaved_to_vec_order(np.asarray(array, dtype=complex), n_qubits, inverse=True)
+    # the dim**2 normalization of the Pauli basis is spread as a factor 2 over the qubits
+    factor = _single_qubit_pauli2computational().conj().T / 2
+    return _apply_to_qubit_axes(factor, array, n_qubits)
+
+
+def _conjugate_by_basis_change(transform, matrix: np.ndarray, dim: int) -> np.ndarray:
+    """
+    Compute T @ matrix @ T^dagger for the basis change T applied by transform, i.e.
+    _pauli2computational or _computational2pauli.
+    """
+    left = transform(matrix, dim)
+    return transform(left.conj().T, dim).conj().T
 
 
 # ==================================================================================================
@@ -421,21 +504,32 @@ def apply_kraus_ops_2_state(kraus_ops: Sequence[np.ndarray], state: np.ndarray)
     :param state: A dim by dim ndarray which is the density matrix for the state
     :return: M by M ndarray which is the density matrix for the state after the action of kraus_ops
     """
-    if isinstance(kraus_ops, np.ndarray):  # handle input of single kraus op
-        if len(kraus_ops[0].shape) < 2:  # first elem is not a matrix
-            kraus_ops = [kraus_ops]
+    return apply_kraus_ops_2_states(kraus_ops, np.asarray(state)[np.newaxis])[0]
 
-    dim, _ = state.shape
-    rows, cols = kraus_ops[0].shape
 
-    if dim != cols:
-        raise ValueError("Dimensions of state and Kraus operator are incompatible")
+def apply_kraus_ops_2_states(kraus_ops: Sequence[np.ndarray], states: np.ndarray) -> np.ndarray:
+    r"""
+    Apply a quantum channel, specified by Kraus operators, to each of a stack of states.
 
-    new_state = np.zeros((rows, rows))
-    for M in kraus_ops:
-        new_state += M @ state @ np.transpose(M.conj())
+    The whole batch is computed as the single contraction
 
-    return new_state
+    rho_out[n] = \sum_k M_k rho[n] M_k^\dagger,
+
+    and the Kraus operators need not be square.
+
+    :param kraus_ops: N Kraus operators, each operator is M by dim, as a list or a stacked N by
+        M by dim ndarray
+    :param states: A B by dim by dim ndarray of B density matrices
+    :return: B by M by M ndarray of the density matrices after the action of kraus_ops
+    """
+    kraus_ops = _stack_kraus_ops(kraus_ops)
+    states = np.asarray(states)
+    if states.ndim != 3 or states.shape[1] != states.shape[2]:
+        raise ValueError("Expected a stack of square density matrices")
+    if states.shape[2] != kraus_ops.shape[2]:
+        raise ValueError("Dimensions of state and Kraus operator are incompatible")
+
+    return np.einsum('kab,nbc,kdc->nad', kraus_ops, states, kraus_ops.conj(), optimize=True)
 
 
 def apply_choi_matrix_2_state(choi: np.ndarray, state: np.ndarray) -> np.ndarray:
@@ -457,10 +551,43 @@ def apply_choi_matrix_2_state(choi: np.ndarray, state: np.ndarray) -> np.ndarray
     :param state: A dim by dim ndarray which is the density matrix for the state
     :return: a dim by dim matrix.
     """
-    dim = int(np.sqrt(np.asarray(choi).shape[0]))
-    dims = [dim, dim]
-    tot_matrix = np.kron(state.transpose(), np.identity(dim)) @ choi
-    return partial_trace(tot_matrix, [1], dims)
+    return apply_choi_matrix_2_states(choi, np.asarray(state)[np.newaxis])[0]
+
+
+def apply_choi_matrix_2_states(choi: np.ndarray, states: np.ndarray) -> np.ndarray:
+    r"""
+    Apply a quantum channel, specified by a Choi matrix (using the column stacking convention),
+    to each of a stack of states.
+
+    Rather than forming (rho^T \otimes Id) Choi_matrix and tracing out the input space, which
+    costs O(dim**6), we use that with the Choi matrix reshaped to a tensor C[a, r, b, s] with
+    the input indices a, b first
+
+    rho_{out}[r, s] = \sum_{a, b} rho[a, b] C[a, r, b, s],
+
+    which is a single matrix product costing O(dim**4) per state.
+
+    :param choi: a dim**2 by dim**2 matrix
+    :param states: A B by dim by dim ndarray of B density matrices
+    :return: a B by dim by dim ndarray.
+    """
+    choi = np.asarray(choi)
+    states = np.asarray(states)
+    dim = int(np.sqrt(choi.shape[0]))
+    if states.ndim != 3 or states.shape[1:] != (dim, dim):
+        raise ValueError("Expected a stack of dim by dim density matrices")
+
+    return (states.reshape(-1, dim ** 2) @ _choi2transfer(choi)).reshape(-1, dim, dim)
+
+
+def _choi2transfer(choi: np.ndarray) -> np.ndarray:
+    """
+    Reshuffle a Choi matrix into the matrix T with T[(a, b), (r, s)] = C[a, r, b, s], which maps
+    a row-major flattened state to the row-major flattened output state. The reshuffle is its own
+    inverse, so this also maps T back to the Choi matrix.
+    """
+    dim = int(np.sqrt(choi.shape[0]))
+    return choi.reshape([dim] * 4).transpose(0, 2, 1, 3).reshape(dim ** 2, dim ** 2)
 
 
 # ==================================================================================================
@@ -674,3 +801,405 @@ def proj_choi_to_physical(choi, make_trace_preserving=True):
         last_state = new_state
 
     return new_state
+
+
+# ==================================================================================================
+# Channel objects
+# ==================================================================================================
+def _read_only(matrix) -> np.ndarray:
+    array = np.array(matrix, dtype=complex)
+    array.flags.writeable = False
+    return array
+
+
+class Channel:
+    """
+    A quantum channel holding the representation it was built from, with the other
+    representations computed on first use and memoised.
+
+    Conversions are routed so that none of them is lossy or repeated: the superoperator and Choi
+    matrix are reshufflings of one another, the Pauli-Liouville and chi matrices are changes of
+    basis of these, and the Kraus operators come from the eigendecomposition of the Choi matrix.
+    The eigendecomposition is cached as well and shared by the Kraus operators and the complete
+    positivity and unitarity checks.
+
+    All returned arrays are read-only, as they are shared by every caller; copy them before
+    modifying them in place.
+
+    :param representation: the name of the representation of matrix, one of REPRESENTATIONS.
+    :param matrix: a sequence of square Kraus operators for 'kraus', otherwise a dim**2 by dim**2
+        matrix. The chi and Pauli-Liouville representations require dim to be a power of 2.
+    """
+    REPRESENTATIONS = ('kraus', 'superop', 'choi', 'chi', 'pauli_liouville')
+
+    def __init__(self, representation: str, matrix):
+        if representation not in self.REPRESENTATIONS:
+            raise ValueError(f"Unknown representation {representation}; expected one of "
+                             f"{self.REPRESENTATIONS}.")
+        if representation == 'kraus':
+            if isinstance(matrix, np.ndarray) and matrix.ndim == 2:  # a single kraus op
+                matrix = [matrix]
+            value = [_read_only(op) for op in matrix]
+            rows, cols = value[0].shape
+            if rows != cols:
+                raise ValueError("A Channel requires square Kraus operators.")
+            self.dim = rows
+        else:
+            value = _read_only(matrix)
+            rows, cols = value.shape
+            self.dim = int(np.round(np.sqrt(rows)))
+            if rows != cols or self.dim ** 2 != rows:
+                raise ValueError(f"Expected a dim**2 by dim**2 {representation} matrix.")
+        self._representations = {representation: value}
+        self._choi_eigh = None
+
+    @classmethod
+    def from_kraus(cls, kraus_ops: Sequence[np.ndarray]) -> 'Channel':
+        return cls('kraus', kraus_ops)
+
+    @classmethod
+    def from_superop(cls, superop: np.ndarray) -> 'Channel':
+        return cls('superop', superop)
+
+    @classmethod
+    def from_choi(cls, choi: np.ndarray) -> 'Channel':
+        return cls('choi', choi)
+
+    @classmethod
+    def from_chi(cls, chi_matrix: np.ndarray) -> 'Channel':
+        return cls('chi', chi_matrix)
+
+    @classmethod
+    def from_pauli_liouville(cls, pl_matrix: np.ndarray) -> 'Channel':
+        return cls('pauli_liouville', pl_matrix)
+
+    def __repr__(self):
+        return f"Channel(dim={self.dim}, computed={list(self._representations)})"
+
+    def _memoised(self, representation: str, compute):
+        if representation not in self._representations:
+            value = compute()
+            if representation == 'kraus':
+                value = [_read_only(op) for op in value]
+            else:
+                value = _read_only(value)
+            self._representations[representation] = value
+        return self._representations[representation]
+
+    def _compute_choi(self) -> np.ndarray:
+        known = self._representations
+        if 'superop' in known:
+            return superop2choi(known['superop'])
+        if 'kraus' in known:
+            return kraus2choi(known['kraus'])
+        if 'chi' in known:
+            return chi2choi(known['chi'])
+        return superop2choi(self.superop)
+
+    def _compute_superop(self) -> np.ndarray:
+        known = self._representations
+        if 'pauli_liouville' in known:
+            return pauli_liouville2superop(known['pauli_liouville'])
+        if 'kraus' in known:
+            return kraus2superop(known['kraus'])
+        return choi2superop(self.choi)
+
+    @property
+    def choi(self) -> np.ndarray:
+        """
+        The dim**2 by dim**2 Choi matrix of the channel.
+        """
+        return self._memoised('choi', self._compute_choi)
+
+    @property
+    def superop(self) -> np.ndarray:
+        """
+        The dim**2 by dim**2 superoperator of the channel.
+        """
+        return self._memoised('superop', self._compute_superop)
+
+    @property
+    def pauli_liouville(self) -> np.ndarray:
+        """
+        The dim**2 by dim**2 Pauli-Liouville matrix (aka Pauli transfer matrix) of the channel.
+        """
+        return self._memoised('pauli_liouville', lambda: superop2pauli_liouville(self.superop))
+
+    @property
+    def chi(self) -> np.ndarray:
+        """
+        The dim**2 by dim**2 chi matrix (aka process matrix) of the channel.
+        """
+        return self._memoised('chi', lambda: choi2chi(self.choi))
+
+    @property
+    def choi_eigh(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The eigenvalues and eigenvectors of the Choi matrix, as returned by np.linalg.eigh.
+        """
+        if self._choi_eigh is None:
+            eigvals, v = np.linalg.eigh(self.choi)
+            eigvals.flags.writeable = False
+            v.flags.writeable = False
+            self._choi_eigh = eigvals, v
+        return self._choi_eigh
+
+    @property
+    def kraus(self) -> List[np.ndarray]:
+        """
+        Kraus operators of the channel. Unless the channel was built from Kraus operators these
+        are computed as in choi2kraus, discarding operators with norm below 1e-9.
+        """
+        return self._memoised('kraus', lambda: _eigh2kraus(*self.choi_eigh))
+
+    def apply(self, states: np.ndarray) -> np.ndarray:
+        """
+        Apply the channel to a dim by dim state, or to each of a B by dim by dim stack of states,
+        using the Kraus operators if the channel was built from them and the Choi matrix
+        otherwise.
+        """
+        states = np.asarray(states)
+        if 'kraus' in self._representations:
+            apply, matrix = apply_kraus_ops_2_states, self.kraus
+        else:
+            apply, matrix = apply_choi_matrix_2_states, self.choi
+        if states.ndim == 2:
+            return apply(matrix, states[np.newaxis])[0]
+        return apply(matrix, states)
+
+    def kraus_rank(self, limit: float = 1e-09) -> int:
+        """
+        The number of eigenvalues of the Choi matrix larger than limit in magnitude, i.e. the
+        minimal number of Kraus operators representing the channel.
+        """
+        return int(np.sum(np.abs(self.choi_eigh[0]) > limit))
+
+    def is_hermitian_preserving(self, rtol: float = 1e-05, atol: float = 1e-08) -> bool:
+        """
+        See choi_is_hermitian_preserving.
+        """
+        return choi_is_hermitian_preserving(self.choi, rtol=rtol, atol=atol)
+
+    def is_trace_preserving(self, rtol: float = 1e-05, atol: float = 1e-08) -> bool:
+        """
+        See choi_is_trace_preserving.
+        """
+        return choi_is_trace_preserving(self.choi, rtol=rtol, atol=atol)
+
+    def is_completely_positive(self, limit: float = 1e-09) -> bool:
+        """
+        See choi_is_completely_positive. The cached Hermitian eigendecomposition is used, so a
+        Choi matrix which is not Hermitian is reported as not completely positive.
+        """
+        if not self.is_hermitian_preserving():
+            return False
+        return bool(np.all(self.choi_eigh[0] >= -abs(limit)))
+
+    def is_unital(self, rtol: float = 1e-05, atol: float = 1e-08) -> bool:
+        """
+        See choi_is_unital.
+        """
+        return choi_is_unital(self.choi, rtol=rtol, atol=atol)
+
+    def is_unitary(self, limit: float = 1e-09) -> bool:
+        """
+        See choi_is_unitary.
+        """
+        return self.kraus_rank(limit) == 1
+
+
+# ==================================================================================================
+# Tensor product channels
+# ==================================================================================================
+class TensorProductChannel:
+    """
+    A channel on num_qubits qubits which is a tensor product of local channels, each acting on
+    its own set of qubits, and the identity on any remaining qubits.
+
+    The dense 2**n by 2**n Kraus operators or 4**n by 4**n superoperator are never formed: states
+    are transformed one factor at a time by contracting only the axes of the qubits the factor
+    acts on, and fidelities and Pauli-Liouville diagonals are products over the factors. Factors
+    are only merged, into a channel on the union of their qubits, when composing with a channel
+    whose factors overlap them.
+
+    Qubits follow the pyQuil convention: qubit 0 is the least significant tensor factor of the
+    2**n dimensional state, and the matrices of a local channel on qubits (q_0, ..., q_{k-1})
+    have q_0 as their least significant tensor factor, as for program_unitary.
+
+    :param factors: a sequence of (qubits, channel) pairs, where channel is a Channel of
+        dimension 2**len(qubits). The qubits of different factors must be disjoint.
+    :param num_qubits: the number of qubits the channel acts on; by default one more than the
+        largest qubit of any factor.
+    """
+
+    def __init__(self, factors: Sequence[Tuple[Sequence[int], Channel]], num_qubits: int = None):
+        self.factors = []
+        used = set()
+        for qubits, channel in factors:
+            qubits = tuple(int(q) for q in qubits)
+            if channel.dim != 2 ** len(qubits):
+                raise ValueError(f"A channel of dimension {channel.dim} can not act on qubits "
+                                 f"{qubits}.")
+            if used & set(qubits) or len(set(qubits)) != len(qubits):
+                raise ValueError("The qubits of the factors must be disjoint.")
+            used |= set(qubits)
+            self.factors.append((qubits, channel))
+
+        if num_qubits is None:
+            num_qubits = max(used) + 1 if used else 0
+        elif used and max(used) >= num_qubits:
+            raise ValueError(f"Qubit {max(used)} is out of range for {num_qubits} qubits.")
+        self.num_qubits = num_qubits
+
+    def __repr__(self):
+        return f"TensorProductChannel({[qubits for qubits, _ in self.factors]}, " \
+               f"num_qubits={self.num_qubits})"
+
+    def apply(self, states: np.ndarray) -> np.ndarray:
+        """
+        Apply the channel to a 2**n by 2**n state, or to each of a B by 2**n by 2**n stack of
+        states, where n is num_qubits.
+        """
+        states = np.asarray(states)
+        single = states.ndim == 2
+        if single:
+            states = states[np.newaxis]
+        dim = 2 ** self.num_qubits
+        if states.shape[1:] != (dim, dim):
+            raise ValueError(f"Expected {dim} by {dim} states for {self.num_qubits} qubits.")
+
+        out = _apply_local_channels(self.factors, states, self.num_qubits)
+        return out[0] if single else out
+
+    def compose(self, other: 'TensorProductChannel') -> 'TensorProductChannel':
+        """
+        The channel which applies self and then other.
+
+        Factors of self and other acting on overlapping qubits are merged, transitively, into a
+        single factor on the union of their qubits; all other factors are kept as they are.
+
+        :param other: the channel applied second.
+        :return: the composite channel, on the larger of the two numbers of qubits.
+        """
+        factors = []
+        for qubits, members in _overlapping_factors([self.factors, other.factors]):
+            if len(members) == 1:
+                factors.append(members[0][:2])
+            else:
+                factors.append((qubits, _merge_local_channels(qubits, members)))
+        return TensorProductChannel(factors, max(self.num_qubits, other.num_qubits))
+
+    def to_channel(self) -> Channel:
+        """
+        The dense Channel on all num_qubits qubits; only feasible for a few qubits.
+        """
+        return _merge_local_channels(tuple(range(self.num_qubits)), self.factors)
+
+    def pauli_liouville_diagonal(self) -> np.ndarray:
+        """
+        The diagonal of the 4**n by 4**n Pauli-Liouville matrix, in the order of
+        n_qubit_pauli_basis(n) where the leftmost label acts on qubit n - 1, computed as an outer
+        product of the diagonals of the factors.
+        """
+        n_qubits = self.num_qubits
+        diagonal = np.ones((1,) * n_qubits)
+        for qubits, channel in self.factors:
+            local = np.real(np.diag(channel.pauli_liouville)).reshape((4,) * len(qubits))
+            # the axes of the local diagonal are its qubits from most to least significant
+            axes = [n_qubits - 1 - q for q in reversed(qubits)]
+            local = local.transpose(np.argsort(axes))
+            shape = [1] * n_qubits
+            for axis in axes:
+                shape[axis] = 4
+            diagonal = diagonal * local.reshape(shape)
+        return np.broadcast_to(diagonal, (4,) * n_qubits).reshape(-1)
+
+    def entanglement_fidelity(self, other: 'TensorProductChannel' = None) -> float:
+        """
+        The entanglement fidelity Tr[E^dagger F] / dim**2 between self and other, see
+        distance_measures.entanglement_fidelity, computed as a product over groups of
+        overlapping factors.
+
+        :param other: the channel to compare to; by default the identity channel.
+        """
+        other_factors = [] if other is None else other.factors
+        fidelity = 1.
+        for qubits, members in _overlapping_factors([self.factors, other_factors]):
+            own = [(q, channel) for q, channel, index in members if index == 0]
+            theirs = [(q, channel) for q, channel, index in members if index == 1]
+            own_ptm = _merge_local_channels(qubits, own).pauli_liouville
+            their_ptm = _merge_local_channels(qubits, theirs).pauli_liouville
+            fidelity *= np.real(np.sum(own_ptm.conj() * their_ptm)) / 4 ** len(qubits)
+        return fidelity
+
+    def process_fidelity(self, other: 'TensorProductChannel' = None) -> float:
+        """
+        The process fidelity (dim F_e + 1) / (dim + 1) between self and other, see
+        distance_measures.process_fidelity.
+
+        :param other: the channel to compare to; by default the identity channel.
+        """
+        num_qubits = self.num_qubits if other is None else max(self.num_qubits,
+                                                                other.num_qubits)
+        dim = 2 ** num_qubits
+        return (dim * self.entanglement_fidelity(other) + 1) / (dim + 1)
+
+
+def _apply_local_channels(factors, states: np.ndarray, n_qubits: int) -> np.ndarray:
+    """
+    Apply local channels, in order, to a B by 2**n by 2**n stack of states.
+    """
+    batch = states.shape[0]
+    tensor = states.reshape((batch,) + (2,) * (2 * n_qubits))
+    for qubits, channel in factors:
+        k = len(qubits)
+        transfer = _choi2transfer(channel.choi).reshape((2,) * (4 * k))
+        # axes of the row and column indices of the local qubits, from most to least significant
+        row_axes = [n_qubits - q for q in reversed(qubits)]
+        col_axes = [2 * n_qubits - q for q in reversed(qubits)]
+        tensor = np.tensordot(tensor, transfer, axes=(row_axes + col_axes, list(range(2 * k))))
+        tensor = np.moveaxis(tensor, list(range(-2 * k, 0)), row_axes + col_axes)
+    return tensor.reshape(states.shape)
+
+
+def _overlapping_factors(factor_lists):
+    """
+    Group the factors of several tensor product channels into sets acting on overlapping qubits.
+
+    :return: a list of (qubits, members) pairs, where qubits is the sorted union of the qubits of
+        the members and members are the factors of the group as (qubits, channel, index)
+        triples, index being the position of the factor's channel in factor_lists. Members are
+        ordered by index.
+    """
+    groups = []
+    for index, factors in enumerate(factor_lists):
+        for qubits, channel in factors:
+            group_qubits = set(qubits)
+            members = []
+            for group in [g for g in groups if g[0] & group_qubits]:
+                groups.remove(group)
+                group_qubits |= group[0]
+                members += group[1]
+            members.append((qubits, channel, index))
+            groups.append((group_qubits, members))
+
+    return [(tuple(sorted(group_qubits)), sorted(members, key=lambda member: member[2]))
+            for group_qubits, members in groups]
+
+
+def _merge_local_channels(qubits: Tuple[int, ...], factors) -> Channel:
+    """
+    The Channel on qubits which applies each of the local channels of factors, in order.
+
+    The transfer matrix of the composite is the image of the matrix units |a><b| on qubits.
+
+    :param qubits: the qubits of the composite, qubits[0] being the least significant.
+    :param factors: (qubits, channel, ...) tuples of local channels acting on subsets of qubits.
+    """
+    dim = 2 ** len(qubits)
+    positions = {q: position for position, q in enumerate(qubits)}
+    local_factors = [(tuple(positions[q] for q in factor_qubits), channel)
+                     for factor_qubits, channel, *_ in factors]
+    units = np.eye(dim ** 2, dtype=complex).reshape(dim ** 2, dim, dim)
+    transfer = _apply_local_channels(local_factors, units, len(qubits)).reshape(dim ** 2, dim ** 2)
+    return Channel.from_choi(_choi2transfer(transfer))
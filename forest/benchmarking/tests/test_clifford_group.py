@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+from pyquil.gates import CNOT, H, T
+from pyquil.quil import Program, merge_programs
+from pyquil.unitary_tools import program_unitary
+
+from forest.benchmarking.clifford_group import CliffordGroup
+from forest.benchmarking.randomized_benchmarking import get_local_clifford_group, get_rb_gateset, \
+    rb_dataframe, add_sequences_to_dataframe
+
+
+def _is_identity_up_to_phase(program: Program, n_qubits: int) -> bool:
+    u = program_unitary(program, n_qubits)
+    return np.isclose(np.abs(np.trace(u)), u.shape[0])
+
+
+def test_group_sizes():
+    assert len(get_local_clifford_group('1q')) == 24
+    assert len(get_local_clifford_group('2q')) == 11520
+
+
+def test_decompositions_use_fewest_czs():
+    group = get_local_clifford_group('2q')
+    num_czs = [sum(len(gate.qubits) == 2 for gate in group.decomposition(e))
+               for e in range(len(group))]
+    # the local, CNOT-like, iSWAP-like and SWAP-like classes need 0, 1, 2 and 3 CZs
+    assert max(num_czs) == 3
+    np.testing.assert_array_equal(np.bincount(num_czs), [576, 5184, 5184, 576])
+
+
+def test_decompositions_are_distinct():
+    group = get_local_clifford_group('1q')
+    unitaries = [program_unitary(group.element_to_program(e, [0]), 1) for e in range(len(group))]
+    for j, u in enumerate(unitaries):
+        for v in unitaries[:j]:
+            assert not np.isclose(np.abs(np.trace(u.conj().T @ v)), 2)
+
+
+@pytest.mark.parametrize('rb_type, qubits', [('1q', [2]), ('2q', [3, 1])])
+def test_sequences_compose_to_identity(rb_type, qubits):
+    group = get_local_clifford_group(rb_type)
+    for depth in [1, 2, 15]:
+        sequence = group.generate_rb_sequence(depth, qubits, random_seed=depth)
+        assert len(sequence) == depth
+        assert _is_identity_up_to_phase(merge_programs(sequence), 4)
+
+
+def test_interleaved_sequence():
+    group = get_local_clifford_group('2q')
+    sequence = group.generate_rb_sequence(10, [0, 1], random_seed=1, interleaver=Program(CNOT(0, 1)))
+    assert len(sequence) == 2 * 9 + 1
+    cnot = program_unitary(Program(CNOT(0, 1)), 2)
+    for interleaved in sequence[1:-1:2]:
+        u = program_unitary(interleaved, 2)
+        assert np.isclose(np.abs(np.trace(u.conj().T @ cnot)), 4)
+    assert _is_identity_up_to_phase(merge_programs(sequence), 2)
+
+    with pytest.raises(ValueError):
+        group.generate_rb_sequence(10, [0, 1], interleaver=Program(T(0)))
+
+
+def test_seeded_sequences_are_reproducible():
+    group = get_local_clifford_group('1q')
+    seq1 = group.generate_rb_sequence(20, [0], random_seed=11)
+    seq2 = group.generate_rb_sequence(20, [0], random_seed=11)
+    assert [p.out() for p in seq1] == [p.out() for p in seq2]
+
+
+def test_custom_gateset():
+    gateset, qubits = get_rb_gateset('1q')
+    group = CliffordGroup(gateset, qubits)
+    assert len(group) == 24
+    assert group.element_of_program(Program()) == 0
+    h_element = group.element_of_program(Program(H(0)))
+    assert np.isclose(np.abs(np.trace(program_unitary(group.element_to_program(h_element, [0]), 1)
+                                      @ program_unitary(Program(H(0)), 1))), 2)
+
+
+def test_add_sequences_without_benchmarker():
+    df = rb_dataframe(rb_type='sim-1q', subgraph=[(0,), (2,)], depths=[2, 5], num_sequences=3)
+    df = add_sequences_to_dataframe(df, random_seed=3)
+    for seq, depth in zip(df['Sequence'].values, df['Depth'].values):
+        assert len(seq) == depth
+        assert _is_identity_up_to_phase(merge_programs(seq), 3)
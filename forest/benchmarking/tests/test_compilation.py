@@ -9,7 +9,8 @@ import pytest
 from pyquil.gates import *
 from pyquil.quil import Program
 from forest.benchmarking.compilation import _RY, basic_compile, _CNOT, _CCNOT, _T, _H, _X, _SWAP, \
-    match_global_phase
+    match_global_phase, zxzxz_angles
+from forest.benchmarking.random_operators import haar_rand_unitary
 
 try:
     from pyquil.unitary_tools import program_unitary
@@ -42,6 +43,16 @@ def test_RY():
         assert_all_close_up_to_global_phase(u1, u2)
 
 
+@pytest.mark.skipif(not unitary_tools, reason='Requires unitary_tools')
+def test_zxzxz_angles():
+    unitaries = [haar_rand_unitary(2) for _ in range(20)]
+    unitaries += [program_unitary(Program(gate(0)), n_qubits=1) for gate in [I, X, Y, Z, H, S]]
+    for u in unitaries:
+        alpha, beta, gamma = zxzxz_angles(u)
+        prog = Program(RZ(alpha, 0), RX(pi / 2, 0), RZ(beta, 0), RX(pi / 2, 0), RZ(gamma, 0))
+        assert_all_close_up_to_global_phase(program_unitary(prog, n_qubits=1), u, atol=1e-12)
+
+
 @pytest.mark.skipif(not unitary_tools, reason='Requires unitary_tools')
 def test_X():
     u1 = program_unitary(Program(X(0)), n_qubits=1)
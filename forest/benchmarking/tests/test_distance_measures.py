@@ -216,6 +216,25 @@ def test_diamond_norm():
     dnorm = dm.diamond_norm_distance(choi0, choi1)
     assert np.isclose(dnorm, np.sqrt(2), rtol=0.01)
 
+
+def test_diamond_norm_distances():
+    if int(os.getenv('SKIP_SCS', 0)) == 1:
+        return pytest.skip('Having issues with SCS, skipping for now')
+
+    targets = [3.141591e-03, 3.141463e-02, 3.128689e-01]
+    pairs = [(kraus2choi(X_MAT), kraus2choi(matpow(X_MAT, 1 + turns)))
+             for turns in [1e-3, 1e-2, 1e-1]]
+    pairs.append((kraus2choi(I_MAT), kraus2choi(X_MAT)))
+    dnorms = dm.diamond_norm_distances(pairs, solver='SCS')
+    assert np.allclose(dnorms, targets + [2.0], rtol=0.01)
+
+    # the cached program is shared between calls of the same dimension
+    two_qubit = dm.diamond_norm_distance(kraus2choi(np.kron(I_MAT, X_MAT)),
+                                         kraus2choi(np.kron(I_MAT, I_MAT)), warm_start=False)
+    assert np.isclose(two_qubit, 2.0, rtol=0.01)
+    assert np.isclose(dm.diamond_norm_distance(*pairs[0]), targets[0], rtol=0.01)
+
+
 def test_watrous_bounds():
     # Test cases borrowed from qutip,
     # https://github.com/qutip/qutip/blob/master/qutip/tests/test_metrics.py
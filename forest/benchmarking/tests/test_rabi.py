@@ -1,5 +1,9 @@
 import numpy as np
 import pytest
+from pyquil.quil import Program
+from pyquil.quilatom import MemoryReference
+from pyquil.quilbase import Gate
+from pyquil.unitary_tools import program_unitary
 
 from forest.benchmarking import qubit_spectroscopy as qs
 
@@ -19,3 +23,25 @@ def test_sinusoidal_waveform(mock_rabi):
     params, params_errs = qs.fit_to_sinusoidal_waveform(thetas, data)
 
     assert np.isclose(2 * np.pi / params[2], mock_rabi['rabi_per'])
+
+
+def test_parametrize_rabi_sweep():
+    experiment = qs.generate_rabi_experiments([0, 2], num_points=7)
+    programs = list(experiment['Program'].values)
+    sweeps = qs.parametrize_sweep(programs)
+    assert len(sweeps) == 1
+
+    template, indices, values = sweeps[0]
+    assert indices == list(range(7))
+    assert values.shape == (7, 2)
+    assert all(gate.name in ['RX', 'RZ'] for gate in template.instructions if isinstance(gate, Gate))
+    for idx, row_values in zip(indices, values):
+        gates = []
+        for gate in template.instructions:
+            if isinstance(gate, Gate):
+                params = [row_values[p.offset] if isinstance(p, MemoryReference) else p
+                          for p in gate.params]
+                gates.append(Gate(gate.name, params, gate.qubits))
+        expected = program_unitary(Program([inst for inst in programs[idx].instructions
+                                            if isinstance(inst, Gate)]), 3)
+        assert np.allclose(program_unitary(Program(gates), 3), expected)
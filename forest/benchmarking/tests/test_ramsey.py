@@ -1,5 +1,7 @@
+import networkx as nx
 import numpy as np
 import pytest
+from pyquil.quilbase import Measurement
 
 from forest.benchmarking import qubit_spectroscopy as qs
 
@@ -22,3 +24,35 @@ def test_sinusoidal_waveform(mock_ramsey):
                                for theta in thetas])
     params, params_errs = qs.fit_to_sinusoidal_waveform(thetas, tunable_data)
     assert np.isclose(params[3], mock_ramsey['tunable_rz'])
+
+
+def test_schedule_simultaneous_groups():
+    graph = nx.convert_node_labels_to_integers(nx.grid_2d_graph(6, 6))
+    distances = dict(nx.all_pairs_shortest_path_length(graph))
+
+    batches = qs.schedule_simultaneous_groups(graph, exclusion_distance=1)
+    assert len(batches) == 2
+    assert sorted(q for batch in batches for (q,) in batch) == list(range(36))
+
+    edges = list(graph.edges)
+    batches = qs.schedule_simultaneous_groups(graph, edges, exclusion_distance=1)
+    assert sorted(edge for batch in batches for edge in batch) == sorted(edges)
+    assert len(batches) <= 12
+    for batch in batches:
+        for i, edge in enumerate(batch):
+            for other in batch[:i]:
+                assert min(distances[a][b] for a in edge for b in other) > 1
+
+
+def test_simultaneous_cz_phase_ramsey_experiment():
+    graph = nx.path_graph(4)
+    experiment = qs.generate_simultaneous_cz_phase_ramsey_experiment(graph, exclusion_distance=0)
+    directed = [(edge, rz_qb) for edges, rz_qbs in zip(experiment['Edge'], experiment['Rz_qubit'])
+                for edge, rz_qb in zip(edges, rz_qbs)]
+    assert sorted(directed) == sorted([(edge, q) for edge in graph.edges for q in edge])
+    for edges, rz_qbs, program in experiment[['Edge', 'Rz_qubit', 'Program']].values:
+        # each edge's CZ appears once per program, and the measured qubits are in readout order
+        assert len(set(edges)) == len(edges)
+        measured = [inst.qubit.index for inst in program.instructions
+                    if isinstance(inst, Measurement)]
+        assert measured == rz_qbs
@@ -1,12 +1,24 @@
+from functools import partial
+from unittest.mock import Mock
+
 import numpy as np
 from numpy import random, uint8, zeros
 
-from pyquil.gates import X, Y
+from pyquil.api import QuantumComputer
+from pyquil.gates import CZ, X, Y
 from pyquil.quil import Program
 from forest.benchmarking.randomized_benchmarking import merge_sequences, fit_standard_rb, rb_dataframe, \
     add_sequences_to_dataframe, run_rb_measurement, survivals_by_qubits, add_survivals, survival_statistics, \
     fit_unitarity, add_unitarity_sequences_to_dataframe, \
-    run_unitarity_measurement, add_shifted_purities, shifted_purities_by_qubits, unitarity_to_RB_decay
+    run_unitarity_measurement, add_shifted_purities, shifted_purities_by_qubits, unitarity_to_RB_decay, \
+    parameterize_rb_sequence, rb_template_program, RBResults, survivals_from_results, \
+    batch_survival_statistics, log_linear_decay_guess, fit_rb_curves, standard_rb, unitarity_fn, \
+    simulate_rb_measurement, simulate_unitarity_measurement, bootstrap_rb_intervals, \
+    get_local_clifford_group
+from scipy.stats import beta
+from pyquil.quilatom import MemoryReference
+from pyquil.quilbase import Gate
+from pyquil.unitary_tools import program_unitary
 from typing import List, Tuple, Callable
 from pandas import DataFrame
 from pyquil.noise import pauli_kraus_map
@@ -154,6 +166,147 @@ def test_survival_statistics_3():
     assert mean == 100 / 102
 
 
+def test_batch_survival_statistics():
+    rs = np.random.RandomState(2)
+    results = (rs.rand(7, 40, 6) < .3).astype(uint8)
+    means, errs = batch_survival_statistics(results, 2)
+    assert means.shape == errs.shape == (7, 3)
+
+    n_survived = np.sum(~results.reshape(7, 40, 3, 2).any(axis=-1), axis=1)
+    np.testing.assert_allclose(means, beta.mean(n_survived + 1, 40 - n_survived + 1))
+    np.testing.assert_allclose(errs, np.sqrt(beta.var(n_survived + 1, 40 - n_survived + 1)))
+    for row in range(7):
+        np.testing.assert_allclose(survival_statistics(results[row, :, 2:4]),
+                                   (means[row, 1], errs[row, 1]))
+
+
+def test_rb_results_table():
+    rs = np.random.RandomState(1)
+    subgraph = [(0, 1), (4, 5), (2, 3)]
+    df = rb_dataframe(rb_type="sim-2q", subgraph=subgraph, depths=[2, 5, 10], num_sequences=4)
+    df["Results"] = [(rs.rand(50, 6) < .2).astype(int) for _ in range(len(df))]
+
+    table = RBResults.from_survivals(df)
+    assert len(table.means) == len(df) * len(subgraph)
+    assert table.qubit_groups == subgraph
+
+    df = add_survivals(df)
+    for idx, qubits in enumerate(subgraph):
+        depths, means, errs = table.by_qubits(qubits)
+        expected = [survivals_from_results(subgraph, res) for res in df["Results"].values]
+        np.testing.assert_array_equal(depths, df["Depth"].values)
+        np.testing.assert_allclose(means, [m[idx] for m, _ in expected])
+        np.testing.assert_allclose(errs, [e[idx] for _, e in expected])
+        np.testing.assert_allclose(means, survivals_by_qubits(df, qubits)[1])
+
+    long_df = table.to_dataframe()
+    assert list(long_df.columns) == ["Depth", "Sequence", "Qubits", "Mean", "Error"]
+    assert len(long_df) == len(table.means)
+
+
+def test_log_linear_decay_guess():
+    depths = np.repeat([2, 4, 8, 16, 32], 3)
+    baseline, amplitude, decay = log_linear_decay_guess(depths, standard_rb(depths, .5, .45, .97))
+    np.testing.assert_allclose([baseline, amplitude, decay], [.5, .45, .97], atol=.03)
+
+
+def test_fit_rb_curves():
+    rs = np.random.RandomState(3)
+    depths = np.repeat([2, 4, 8, 16, 32, 64], 5)
+    decays = {(0,): .98, (1,): .95, (2,): .9}
+    data = {}
+    for qubits, decay in decays.items():
+        survivals = standard_rb(depths, .5, .45, decay) + rs.normal(0, .005, len(depths))
+        data[qubits] = (depths, survivals, np.full(len(depths), .005))
+
+    for max_workers in [1, 2]:
+        table = fit_rb_curves(data, max_workers=max_workers)
+        assert list(table["Qubits"]) == list(decays.keys())
+        assert table["Success"].all()
+        np.testing.assert_allclose(table["Decay"], list(decays.values()), atol=3e-3)
+        assert (table["Decay Error"] > 0).all()
+
+    purities = unitarity_fn(depths, .02, .9, .9) + rs.normal(0, .005, len(depths))
+    table = fit_rb_curves({(0,): (depths, purities, None)}, kind='unitarity', max_workers=1)
+    np.testing.assert_allclose(table["Unitarity"], .9, atol=3e-3)
+
+
+def test_bootstrap_rb_intervals():
+    rs = np.random.RandomState(4)
+    depths = np.repeat([2, 4, 8, 16, 32], 10)
+    rb_data, irb_data = {}, {}
+    for qubits in [(0,), (1,)]:
+        rb_data[qubits] = (depths, standard_rb(depths, .5, .45, .97) + rs.normal(0, .01, len(depths)), None)
+        irb_data[qubits] = (depths, standard_rb(depths, .5, .45, .95) + rs.normal(0, .01, len(depths)), None)
+
+    table = bootstrap_rb_intervals(rb_data, irb_data, num_resamples=500, random_seed=1, max_workers=1)
+    assert list(table["Qubits"]) == [(0,), (1,)]
+    assert (table["Decay Lower"] < .97).all() and (table["Decay Upper"] > .97).all()
+    assert (table["IRB Decay Lower"] < .95).all() and (table["IRB Decay Upper"] > .95).all()
+    assert (table["Infidelity Lower"] < table["Infidelity"]).all()
+    assert (table["Infidelity"] < table["Infidelity Upper"]).all()
+    assert (table["Fidelity Lower Bound"] < table["Fidelity Upper Bound"]).all()
+
+    fast = bootstrap_rb_intervals(rb_data, num_resamples=50, refine=False, random_seed=1,
+                                  max_workers=2)
+    assert (fast["Decay Lower"] < fast["Decay"]).all()
+    assert (fast["Decay"] < fast["Decay Upper"]).all()
+    assert "IRB Decay" not in fast.columns
+
+
+def test_bootstrap_rb_interval_coverage():
+    rs = np.random.RandomState(3)
+    depths = np.repeat([2, 4, 8, 16, 32], 10)
+    for seed in range(5):
+        survivals = standard_rb(depths, .5, .45, .97) + rs.normal(0, .01, len(depths))
+        table = bootstrap_rb_intervals({(0,): (depths, survivals, None)}, num_resamples=200,
+                                       random_seed=seed)
+        # the interval is of the estimator that gives the point estimate, i.e. fit_standard_rb
+        decay = fit_standard_rb(depths, survivals).params['decay'].value
+        np.testing.assert_allclose(table["Decay"][0], decay, rtol=1e-6)
+        assert table["Decay Lower"][0] < decay < table["Decay Upper"][0]
+        assert table["Decay Lower"][0] < .97 < table["Decay Upper"][0]
+
+
+def test_simulated_rb():
+    expected_decay = .95
+    probs = [expected_decay + .05 / 4] + [.05 / 4] * 3
+    df = rb_dataframe(rb_type='sim-1q', subgraph=[(0,), (1,)], depths=[2, 4, 8, 16, 32],
+                      num_sequences=5)
+    df = add_sequences_to_dataframe(df, random_seed=1)
+
+    # only qubit 1 is noisy
+    exact = simulate_rb_measurement(df, noise={(1,): pauli_kraus_map(probs)})
+    np.testing.assert_allclose([s[0] for s in exact["Survival Means"]], 1)
+    fit = fit_standard_rb(*survivals_by_qubits(exact, (1,))[:2])
+    np.testing.assert_allclose(fit.params['decay'].value, expected_decay, rtol=1e-6)
+
+    sampled = simulate_rb_measurement(df, noise=pauli_kraus_map(probs), num_trials=200,
+                                      random_seed=1)
+    assert sampled["Results"].values[0].shape == (200, 2)
+    table = fit_rb_curves(RBResults.from_survivals(add_survivals(sampled)), max_workers=1)
+    np.testing.assert_allclose(table["Decay"], expected_decay, atol=.02)
+
+
+def test_simulated_irb_and_unitarity():
+    p = .97
+    probs = [p + (1 - p) / 16] + [(1 - p) / 16] * 15
+    noise = {(0, 1): pauli_kraus_map(probs)}
+    df = rb_dataframe(rb_type='sim-2q', subgraph=[(0, 1)], depths=[2, 4, 8, 16], num_sequences=4)
+
+    # for depolarizing noise after every Clifford and the interleaved gate, the decay is p^2
+    irb_df = add_sequences_to_dataframe(df, random_seed=1, interleaved_gate=Program(CZ(0, 1)))
+    irb_df = simulate_rb_measurement(irb_df, noise)
+    fit = fit_standard_rb(*survivals_by_qubits(irb_df, (0, 1))[:2])
+    np.testing.assert_allclose(fit.params['decay'].value, p ** 2, rtol=1e-6)
+
+    # and so is the unitarity
+    unitarity_df = add_unitarity_sequences_to_dataframe(df, random_seed=2)
+    unitarity_df = add_shifted_purities(simulate_unitarity_measurement(unitarity_df, noise))
+    fit = fit_unitarity(*shifted_purities_by_qubits(unitarity_df, (0, 1))[:2])
+    np.testing.assert_allclose(fit.params['unitarity'].value, p ** 2, rtol=1e-6)
+
+
 def test_merge_sequences():
     random.seed(0)
     seq0 = [Program(X(0)), Program(Y(0)), Program(X(0))]
@@ -183,6 +336,79 @@ def depolarizing_noise(num_qubits: int, p: float = .95):
     return pauli_kraus_map(probabilities)
 
 
+def _filled_template(seq: List[Program], subgraph: List[Tuple]) -> Program:
+    """
+    The parametric form of seq with its angles written into the template's parameters.
+    """
+    structure, angles = parameterize_rb_sequence(seq, subgraph)
+    template = rb_template_program(structure, subgraph)
+    return Program([Gate(inst.name, [angles[p.offset] if isinstance(p, MemoryReference) else p
+                                     for p in inst.params], inst.qubits)
+                    for inst in template.instructions if isinstance(inst, Gate)])
+
+
+def test_parameterize_rb_sequence():
+    for rb_type, subgraph in [("sim-1q", [(0,), (2,)]), ("sim-2q", [(0, 1), (3, 2)])]:
+        df = rb_dataframe(rb_type=rb_type, subgraph=subgraph, depths=[2, 4], num_sequences=3)
+        df = add_sequences_to_dataframe(df, random_seed=4)
+        structures = set()
+        for seq in df["Sequence"].values:
+            # compare each prefix of the sequence to its parametric form with the angles filled in
+            for length in [1, 2, len(seq)]:
+                u1 = program_unitary(_filled_template(seq[:length], subgraph), 4)
+                u2 = program_unitary(sum(seq[:length], Program()), 4)
+                assert np.isclose(np.abs(np.trace(u1.conj().T @ u2)), 16)
+            structures.add(parameterize_rb_sequence(seq, subgraph)[0])
+        if rb_type == "sim-1q":
+            # one template per depth
+            assert len(structures) == 2
+
+
+def test_parameterize_every_2q_clifford():
+    group = get_local_clifford_group('2q')
+    for element in range(len(group)):
+        clifford = group.element_to_program(element, [0, 1])
+        structure, _ = parameterize_rb_sequence([clifford], [(0, 1)])
+        # the template runs exactly the CZs of the Clifford, no padding
+        assert len(structure[0]) == sum(len(gate.qubits) == 2 for gate in clifford) <= 3
+        if element % 97 == 0:
+            u1 = program_unitary(_filled_template([clifford], [(0, 1)]), 2)
+            u2 = program_unitary(clifford, 2)
+            assert np.isclose(np.abs(np.trace(u1.conj().T @ u2)), 4)
+
+
+def test_parametric_2q_rb_compiles_once_per_cz_pattern():
+    df = rb_dataframe(rb_type="std-2q", subgraph=[(0, 1)], depths=[2, 3, 5], num_sequences=6)
+    df = add_sequences_to_dataframe(df, random_seed=7)
+    qc = Mock()
+    qc.run.return_value = np.zeros((10, 2), dtype=int)
+    run_rb_measurement(df, qc, num_trials=10, use_param_program=True)
+    patterns = {parameterize_rb_sequence(seq, [(0, 1)])[0] for seq in df["Sequence"].values}
+    assert qc.compiler.native_quil_to_executable.call_count == len(patterns)
+    # each executable has the CZs of the sequences it runs
+    for (exe,), _ in qc.compiler.native_quil_to_executable.call_args_list:
+        num_czs = sum(1 for inst in exe.instructions if isinstance(inst, Gate) and inst.name == 'CZ')
+        assert num_czs in {sum(len(clifford) for clifford in pattern) for pattern in patterns}
+    assert qc.run.call_count == len(df)
+
+
+def test_simultaneous_unitarity_program_count():
+    subgraph = [(0, 1), (2, 3), (4, 5)]
+    df = rb_dataframe(rb_type="sim-2q", subgraph=subgraph, depths=[2], num_sequences=2)
+    df = add_unitarity_sequences_to_dataframe(df, random_seed=1)
+    qc = Mock()
+    # count the programs that the real readout symmetrization actually runs
+    qc.run_symmetrized_readout.side_effect = partial(QuantumComputer.run_symmetrized_readout, qc)
+    qc.compiler.quil_to_native_quil.side_effect = lambda prog: prog
+    qc.compiler.native_quil_to_executable.side_effect = lambda prog: prog
+    qc.run.side_effect = lambda exe: np.zeros((exe.num_shots, exe.declarations['ro'].memory_size),
+                                             dtype=int)
+    df = run_unitarity_measurement(df, qc, num_trials=10, simultaneous_tomography=True)
+    # one program per product of local Pauli bases on 2 qubits, for each sequence
+    assert qc.run.call_count == 3 ** 2 * len(df)
+    assert all(len(results) == len(subgraph) for results in df["Results"].values)
+
+
 def test_unitarity(qvm, benchmarker):
     qvm.qam.random_seed = 6
     num_sequences_per_depth = 5
@@ -1,4 +1,7 @@
+import itertools
+import logging
 import re
+from unittest.mock import Mock
 
 import numpy as np
 from pyquil import Program
@@ -7,7 +10,9 @@ from pyquil.gates import I, RX, CNOT, MEASURE
 from pyquil.noise import decoherence_noise_with_asymmetric_ro
 
 from forest.benchmarking.readout import get_flipped_program, estimate_confusion_matrix, \
-    estimate_joint_confusion_in_set, marginalize_confusion_matrix, estimate_joint_reset_confusion
+    estimate_joint_confusion_in_set, marginalize_confusion_matrix, estimate_joint_reset_confusion, \
+    outcome_counts, confusion_matrix_from_counts, linear_orthogonal_array, \
+    estimate_joint_confusion_simultaneously, ReadoutNoiseModel, estimate_confusion_matrices
 
 
 def test_get_flipped_program():
@@ -35,6 +40,62 @@ def test_get_flipped_program():
     assert matched == 2
 
 
+def test_outcome_counts():
+    results = np.array([[0, 0], [1, 0], [1, 0], [1, 1], [0, 0], [1, 0]])
+    np.testing.assert_array_equal(outcome_counts(results, 2), [2, 0, 3, 1])
+
+    counts = np.array([[8, 2], [1, 3]])
+    np.testing.assert_allclose(confusion_matrix_from_counts(counts), [[.8, .2], [.25, .75]])
+    # merging estimates of the same matrix by adding counts
+    merged = confusion_matrix_from_counts(counts + np.array([[2, 0], [3, 3]]))
+    np.testing.assert_allclose(merged, [[10 / 12, 2 / 12], [.4, .6]])
+
+
+def test_linear_orthogonal_array():
+    for num_columns, strength in [(30, 2), (10, 3), (5, 1)]:
+        array = linear_orthogonal_array(num_columns, strength)
+        assert array.shape[1] == num_columns
+        for columns in itertools.combinations(range(num_columns), strength):
+            counts = outcome_counts(array[:, columns], strength)
+            assert np.all(counts == len(array) // 2 ** strength)
+    assert len(linear_orthogonal_array(30, 2)) == 32
+
+
+def _random_confusion_matrix(num_qubits, random_state):
+    dim = 2 ** num_qubits
+    matrix = .9 * np.eye(dim) + .2 * random_state.rand(dim, dim) / dim
+    return matrix / matrix.sum(axis=1, keepdims=True)
+
+
+def test_readout_noise_model():
+    rs = np.random.RandomState(0)
+    clusters = {(0,): _random_confusion_matrix(1, rs), (3, 1): _random_confusion_matrix(2, rs),
+                (2,): _random_confusion_matrix(1, rs)}
+    model = ReadoutNoiseModel(clusters)
+    assert model.qubits == [0, 1, 2, 3]
+
+    outcomes = np.arange(16)
+    dense = model.joint_probability(outcomes[:, np.newaxis], outcomes[np.newaxis, :])
+    np.testing.assert_allclose(dense.sum(axis=1), 1)
+    # qubits 1 and 3 are correlated, so the marginal on 1 is the marginal of the dense matrix
+    np.testing.assert_allclose(model.marginal_model([1]).matrices[0],
+                               marginalize_confusion_matrix(dense, [0, 1, 2, 3], (1,)))
+
+    true_dist = rs.dirichlet(np.ones(16))
+    observed = dense.T @ true_dist
+    histogram = dict(zip(outcomes, observed))
+    for method in ['inverse', 'lstsq', 'ibu']:
+        estimate = model.mitigate(histogram, method)
+        np.testing.assert_allclose([estimate[o] for o in outcomes], true_dist, atol=1e-6)
+
+    marginal = model.marginalize(histogram, [2, 0])
+    np.testing.assert_allclose(marginal[0b10], sum(observed[o] for o in outcomes
+                                                   if o & 0b0010 and not o & 0b1000))
+
+    results = np.array([[0, 0, 1, 0], [0, 0, 1, 0], [1, 0, 0, 0]])
+    assert model.histogram(results) == {0b0010: 2, 0b1000: 1}
+
+
 def test_readout_confusion_matrix_consistency(qvm):
     noise_model = decoherence_noise_with_asymmetric_ro(gates=gates_in_isa(qvm.device.get_isa()))
     qvm.qam.noise_model = noise_model
@@ -85,3 +146,62 @@ def test_reset_confusion_consistency(qvm):
 
     atol = .1
     np.testing.assert_allclose(passive_reset[:, 0], np.ones(4).T, atol=atol)
+
+
+def test_passive_reset_pairs_preparation_with_next_shot(caplog):
+    # columns of each shot: the measured preparation, then the measurement at the start of the
+    # shot, i.e. the state left by the previous shot after passive reset
+    shots = {0: [[0, 1], [0, 0], [0, 0], [0, 0]],
+             1: [[1, 1], [1, 0], [0, 1], [1, 1]]}
+    qc = Mock()
+    qc.compiler.native_quil_to_executable = Mock(side_effect=lambda program: program)
+    qc.run = Mock(side_effect=lambda executable, memory_map: shots[memory_map['bitstr'][0]])
+
+    caplog.set_level(logging.INFO, logger='forest.benchmarking.readout')
+    matrices, counts = estimate_joint_reset_confusion(qc, [0], num_trials=3,
+                                                      use_active_reset=False, return_counts=True,
+                                                      max_preparation_attempts=2)
+    assert qc.compiler.native_quil_to_executable.call_count == 1
+    assert qc.compiler.native_quil_to_executable.call_args[0][0].num_shots == 4
+    # the first shot of a run only measures the state left before the run
+    np.testing.assert_array_equal(counts[(0,)][0], [3, 0])
+    # for bitstring 1 the second preparation fails, so its (reset) outcome is discarded and a
+    # second run supplies the third successful trial: outcomes 0, 1 from the first run, 0 next
+    np.testing.assert_array_equal(counts[(0,)][1], [2, 1])
+    assert qc.run.call_count == 1 + 2
+    np.testing.assert_allclose(matrices[(0,)], [[1, 0], [2 / 3, 1 / 3]])
+    # compile, run and analysis time are reported separately
+    assert caplog.records[-1].timing.keys() == {'compile', 'run', 'analysis'}
+
+
+def test_simultaneous_confusion_consistency(qvm):
+    noise_model = decoherence_noise_with_asymmetric_ro(gates=gates_in_isa(qvm.device.get_isa()))
+    qvm.qam.noise_model = noise_model
+    qvm.qam.random_seed = 1
+    num_shots = 500
+    qubits = (0, 1, 2)
+
+    sequential = estimate_joint_confusion_in_set(qvm, qubits, num_shots=num_shots,
+                                                 joint_group_size=2)
+    for preparations in ['packed', 'orthogonal']:
+        simultaneous = estimate_joint_confusion_simultaneously(qvm, qubits, num_shots=num_shots,
+                                                               joint_group_size=2,
+                                                               preparations=preparations)
+        assert simultaneous.keys() == sequential.keys()
+        for group, matrix in sequential.items():
+            np.testing.assert_allclose(simultaneous[group], matrix, atol=.05)
+
+
+def test_simultaneous_single_qubit_confusion(qvm):
+    noise_model = decoherence_noise_with_asymmetric_ro(gates=gates_in_isa(qvm.device.get_isa()))
+    qvm.qam.noise_model = noise_model
+    qvm.qam.random_seed = 1
+    num_shots = 1000
+    qubits = [0, 1, 2]
+
+    matrices = estimate_confusion_matrices(qvm, qubits, shots=num_shots, random_seed=1)
+    assert list(matrices.keys()) == qubits
+    for qubit in qubits:
+        np.testing.assert_allclose(matrices[qubit].sum(axis=1), 1)
+        np.testing.assert_allclose(matrices[qubit], estimate_confusion_matrix(qvm, qubit, num_shots),
+                                   atol=.05)
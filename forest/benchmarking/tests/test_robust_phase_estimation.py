@@ -1,7 +1,9 @@
+from unittest.mock import Mock
+
 import numpy as np
 from numpy import pi
 from pandas import Series
-from pyquil.gates import I, H, RY, RZ
+from pyquil.gates import I, H, RY, RZ, X
 from pyquil.noise import damping_after_dephasing
 from pyquil.quil import Program
 from pyquil.quilbase import Measurement
@@ -75,3 +77,94 @@ def test_noisy_rpe(qvm):
         expt = rpe.acquire_rpe_data(qvm, expt, multiplicative_factor=5., additive_error=add_error)
         phase_estimate = rpe.robust_phase_estimate(expt)
         assert np.allclose(phase_estimate, angle, atol=tolerance)
+
+
+def test_moments_for_all_outcomes():
+    rs = np.random.RandomState(1)
+    expt = rpe.generate_rpe_experiment(Program(RZ(.3, 0), RZ(.7, 1), RZ(.2, 2)), Program(I(0)),
+                                       measure_qubits=[0, 1, 2], num_depths=3)
+    expt = expt[expt["Non-Z-Basis Meas Qubit"] == 1].copy()
+    expt["Results"] = [rs.randint(2, size=(200, 3)) for _ in range(len(expt))]
+
+    all_moments = rpe.get_moments_for_all_outcomes(expt)
+    assert len(all_moments) == 4
+    for outcome, moments in all_moments.items():
+        assert moments == rpe.get_moments(expt, list(outcome))
+        for depth_idx, depth in enumerate([1, 2, 4]):
+            for direction, exps, stds in [('X', moments[0], moments[2]), ('Y', moments[1], moments[3])]:
+                results = expt[(expt["Depth"] == depth)
+                               & (expt["Measure Direction"] == direction)]["Results"].values[0]
+                selected = results[(results[:, 0] == outcome[0]) & (results[:, 2] == outcome[1]), 1]
+                np.testing.assert_allclose(exps[depth_idx], 1 - 2 * selected.mean())
+                np.testing.assert_allclose(stds[depth_idx], 2 * selected.std() / np.sqrt(len(selected)))
+
+
+def test_make_programs_matches_rows():
+    rotation = Program()
+    rotation.defgate("ROT", np.diag([1, 1j]))
+    rotation.inst(("ROT", 1), RZ(.3, 0))
+    for post_select in [None, {0: 1}]:
+        expt = rpe.generate_rpe_experiment(rotation, Program(H(1)), measure_qubits=[0, 1],
+                                           num_depths=4, prepare_and_post_select=post_select)
+        programs = rpe._make_programs(expt)
+        assert len(programs) == len(expt)
+        for prog, (_, row) in zip(programs, expt.iterrows()):
+            assert prog.out() == _make_prog_from_df(row).out()
+            assert len(prog.defined_gates) == 1
+
+
+def test_bloch_radius_scores_by_qubit():
+    rs = np.random.RandomState(2)
+    expt = rpe.generate_rpe_experiment(RZ(.3, 0), I(0), num_depths=1)
+    expt["Results"] = [np.zeros((400, 1), dtype=int), rs.randint(2, size=(400, 1))]
+    assert rpe._bloch_radius_scores_by_qubit(expt)[0][0] > 10
+    expt["Results"] = [rs.randint(2, size=(400, 1)), rs.randint(2, size=(400, 1))]
+    assert rpe._bloch_radius_scores_by_qubit(expt)[0][0] < 3
+
+    expt = rpe.generate_rpe_experiment(Program(RZ(.3, 0), RZ(.7, 1)), Program(I(0)),
+                                       measure_qubits=[0, 1], num_depths=1,
+                                       prepare_and_post_select={1: 1})
+    # the only relative phase is the one post-selected on qubit 1 being in state 1
+    expt["Results"] = [np.zeros((100, 2), dtype=int), np.zeros((100, 2), dtype=int)]
+    scores = rpe._bloch_radius_scores_by_qubit(expt)
+    assert scores.keys() == {0}
+    assert np.allclose(scores[0], [0])
+
+
+def test_adaptive_rpe(qvm):
+    qvm.qam.random_seed = 5
+    angle = pi / 4 - .5
+    expt = rpe.generate_rpe_experiment(RZ(angle, 0), I(0), num_depths=7)
+    expt = rpe.acquire_rpe_data_adaptively(qvm, expt, max_shots=500)
+    max_depth = max(expt["Depth"].values)
+    for depth, shots in zip(expt["Depth"].values, expt["Shots Spent"].values):
+        assert rpe.num_trials(depth, max_depth, 5 / 2, 1 / 2) <= shots <= 500
+    assert np.abs(angle - rpe.robust_phase_estimate(expt)) < .1
+
+
+def test_adaptive_rpe_compiles_once_and_spends_on_ambiguous_rows():
+    expt = rpe.generate_rpe_experiment(Program(RZ(.3, 0), RZ(.7, 1)), Program(I(0), I(1)),
+                                       measure_qubits=[0, 1], num_depths=3)
+    # the phase estimated by measuring qubit 1 in the X-Y plane stays ambiguous, the other not
+    ambiguous = expt["Non-Z-Basis Meas Qubit"].values == 1
+    expt["Program"] = [Program(X(0)) if amb else Program(I(0)) for amb in ambiguous]
+
+    def run(executable):
+        shots = np.arange(executable.num_shots)
+        if 'RX' in executable.out():
+            return np.stack([shots % 2, (shots // 2) % 2], axis=1)
+        return np.stack([np.zeros_like(shots), shots % 2], axis=1)
+
+    qc = Mock()
+    qc.compiler.native_quil_to_executable.side_effect = lambda prog: prog
+    qc.run.side_effect = run
+    expt = rpe.acquire_rpe_data_adaptively(qc, expt, shots_per_round=40, max_shots=230)
+
+    assert qc.compiler.native_quil_to_executable.call_count == len(expt)
+    for call in qc.compiler.native_quil_to_executable.call_args_list:
+        assert call[0][0].num_shots == 40
+    max_depth = max(expt["Depth"].values)
+    for depth, amb, shots in zip(expt["Depth"].values, ambiguous, expt["Shots Spent"].values):
+        # a handful of initial shots does not decide either phase; one more round decides one
+        initial_shots = rpe.num_trials(depth, max_depth, 5 / 2, 1 / 2)
+        assert shots == (230 if amb else initial_shots + 40)
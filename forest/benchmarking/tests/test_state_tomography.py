@@ -6,14 +6,15 @@ from forest.benchmarking.compilation import basic_compile
 from forest.benchmarking.random_operators import haar_rand_unitary
 from forest.benchmarking.tomography import generate_state_tomography_experiment, _R, \
     iterative_mle_state_estimate, project_density_matrix, estimate_variance, \
-    linear_inv_state_estimate
+    linear_inv_state_estimate, generate_simultaneous_state_tomography_experiment, \
+    simultaneous_state_tomography_results
 from pyquil.api import ForestConnection, QuantumComputer, QVM
 from pyquil.api._compiler import _extract_attribute_dictionary_from_program
 from pyquil.api._qac import AbstractCompiler
 from pyquil.device import NxDevice
 from pyquil.gates import I, H, CZ
 from pyquil.numpy_simulator import NumpyWavefunctionSimulator
-from pyquil.operator_estimation import measure_observables
+from pyquil.operator_estimation import measure_observables, ExperimentResult
 from pyquil.quil import Program
 from rpcq.messages import PyQuilExecutableResponse
 
@@ -62,6 +63,34 @@ def test_generate_2q_state_tomography_experiment():
             '(1+0j)*Z0', '(1+0j)*Z0*X1', '(1+0j)*Z0*Y1', '(1+0j)*Z0*Z1']
 
 
+def test_generate_simultaneous_state_tomography_experiment():
+    groups = [(0, 1), (2, 3), (5, 4)]
+    expt = generate_simultaneous_state_tomography_experiment(Program(H(0)), groups)
+    # one group of settings per product of local Pauli bases, independent of the number of groups
+    assert len(expt) == 9
+
+    seen = []
+    for settings in expt:
+        # all settings in a group must be simultaneously measurable in one local basis
+        bases = {}
+        for setting in settings:
+            for q, op in setting.out_operator:
+                assert bases.setdefault(q, op) == op
+            seen.append(setting.out_operator.operations_as_set())
+    assert len(seen) == len(set(seen)) == 15 * len(groups)
+
+    # marginalize fake results back to the order of generate_state_tomography_experiment
+    fake_results = [ExperimentResult(setting=setting, expectation=idx, std_err=0.1, total_counts=1)
+                    for idx, setting in enumerate(s for settings in expt for s in settings)]
+    marginals = simultaneous_state_tomography_results(fake_results, groups)
+    for group, (expectations, variances) in zip(groups, marginals):
+        ops = [setting.out_operator for settings in generate_state_tomography_experiment(
+            Program(), group) for setting in settings][1:]
+        assert [str(fake_results[e].setting.out_operator) for e in expectations] == \
+               [str(op) for op in ops]
+        np.testing.assert_allclose(variances, 0.01)
+
+
 def test_R_operator_fixed_point_1_qubit():
     # Check fixed point of operator. See Eq. 5 in Řeháček et al., PRA 75, 042108 (2007).
     obs_freqs = [1, 0]
@@ -1,5 +1,10 @@
 import numpy as np
+import pytest
 from pyquil.gate_matrices import X, Y, Z, H
+from pyquil.gates import CNOT, H as HGate
+from pyquil.quil import Program
+from pyquil.unitary_tools import program_unitary
+from forest.benchmarking.distance_measures import entanglement_fidelity, process_fidelity
 from forest.benchmarking.superoperator_tools import *
 import forest.benchmarking.random_operators as rand_ops
 
@@ -342,6 +347,27 @@ def test_apply_choi_matrix_2_state():
     assert np.allclose(rho_out, apply_choi_matrix_2_state(choi, ONE_STATE))
 
 
+def test_apply_channel_2_states():
+    # complex states must keep their imaginary parts
+    plus_i = np.asarray([[1, -1j], [1j, 1]]) / 2
+    assert np.allclose(apply_kraus_ops_2_state(H, plus_i), H @ plus_i @ H)
+
+    random_choi = np.asarray(rand_ops.rand_map_with_BCSZ_dist(4, 3), dtype=complex)
+    kraus_ops = np.stack(choi2kraus(random_choi))
+    choi = kraus2choi(kraus_ops)
+    states = np.stack([rand_ops.bures_measure_state_matrix(4) for _ in range(5)])
+    expected = [sum(k @ state @ k.conj().T for k in kraus_ops) for state in states]
+    assert np.allclose(apply_kraus_ops_2_states(kraus_ops, states), expected)
+    assert np.allclose(apply_choi_matrix_2_states(choi, states), expected)
+    assert np.allclose(Channel.from_superop(choi2superop(choi)).apply(states), expected)
+    assert np.allclose(Channel.from_kraus(kraus_ops).apply(states[0]), expected[0])
+    assert np.allclose(kraus2superop(kraus_ops),
+                       sum(np.kron(k.conj(), k) for k in kraus_ops))
+
+    with pytest.raises(ValueError):
+        apply_kraus_ops_2_states(kraus_ops, states[:, :2, :2])
+
+
 # ==================================================================================================
 # Test physicality of Channels
 # ==================================================================================================
@@ -476,3 +502,130 @@ def test_proj_to_cptp():
     assert choi_is_trace_preserving(physical_choi)
     assert choi_is_completely_positive(physical_choi, limit=1e-1)
 
+
+def _dense_pauli2computational_basis_matrix(dim):
+    # the original construction, summing |sigma_k>> <k| over the Pauli basis
+    conversion_mat = np.zeros((dim ** 2, dim ** 2), dtype=complex)
+    for i, pauli in enumerate(n_qubit_pauli_basis(int(np.log2(dim)))):
+        pauli_label = np.zeros((dim ** 2, 1))
+        pauli_label[i] = 1.
+        conversion_mat += np.kron(vec(pauli[1]), pauli_label.T)
+    return conversion_mat
+
+
+def test_structured_basis_transforms():
+    for n_qubits in [1, 2, 3]:
+        dim = 2 ** n_qubits
+        p2c = _dense_pauli2computational_basis_matrix(dim)
+        np.testing.assert_allclose(pauli2computational_basis_matrix(dim), p2c, atol=1e-12)
+        np.testing.assert_allclose(computational2pauli_basis_matrix(dim), p2c.conj().T / dim,
+                                   atol=1e-12)
+
+        kraus = [np.sqrt(.7) * rand_ops.haar_rand_unitary(dim),
+                 np.sqrt(.3) * rand_ops.haar_rand_unitary(dim)]
+        superop = kraus2superop(kraus)
+        pl = superop2pauli_liouville(superop)
+        np.testing.assert_allclose(pl, p2c.conj().T @ superop @ p2c / dim, atol=1e-12)
+        np.testing.assert_allclose(pauli_liouville2superop(pl), superop, atol=1e-12)
+        chi = kraus2chi(kraus)
+        c_vecs = [p2c.conj().T @ vec(op) / dim for op in kraus]
+        np.testing.assert_allclose(chi, sum(v @ v.conj().T for v in c_vecs), atol=1e-12)
+        np.testing.assert_allclose(chi2choi(chi), kraus2choi(kraus), atol=1e-12)
+
+
+# ==================================================================================================
+# Test Channel objects
+# ==================================================================================================
+
+
+def test_channel_conversions():
+    p = np.random.rand()
+    representations = {'kraus': amplitude_damping_kraus(p),
+                       'superop': amplitude_damping_super(p),
+                       'choi': amplitude_damping_choi(p),
+                       'chi': amplitude_damping_chi(p),
+                       'pauli_liouville': amplitude_damping_pauli(p)}
+    for source, matrix in representations.items():
+        channel = Channel(source, matrix)
+        for target, expected in representations.items():
+            if target == 'kraus':
+                assert np.allclose(kraus2choi(channel.kraus), amplitude_damping_choi(p))
+            else:
+                assert np.allclose(getattr(channel, target), expected)
+
+    with pytest.raises(ValueError):
+        Channel('ptm', HADPauli)
+    with pytest.raises(ValueError):
+        Channel.from_choi(np.eye(3))
+
+
+def test_channel_memoises_representations():
+    channel = Channel.from_pauli_liouville(kraus2pauli_liouville(IZKraus))
+    chi = channel.chi
+    assert channel.chi is chi
+    assert channel.choi_eigh is channel.choi_eigh
+    assert channel.kraus is channel.kraus
+    assert np.allclose(chi, kraus2chi(IZKraus))
+    with pytest.raises(ValueError):
+        chi[0, 0] = 1
+
+
+def test_channel_physicality():
+    choi = rand_ops.rand_map_with_BCSZ_dist(3, 2)
+    channel = Channel.from_choi(choi)
+    assert channel.is_completely_positive()
+    assert channel.is_trace_preserving()
+    assert channel.kraus_rank() == 2
+    assert not channel.is_unitary()
+
+    hadamard = Channel.from_kraus(H)
+    assert hadamard.is_unitary()
+    assert hadamard.is_unital()
+    assert not Channel.from_choi(amplitude_damping_choi(0.1)).is_unital()
+    assert not Channel.from_choi(-HADChoi).is_completely_positive()
+
+
+def _random_channel(num_qubits):
+    choi = rand_ops.rand_map_with_BCSZ_dist(2 ** num_qubits, 2)
+    return Channel.from_choi(np.asarray(choi, dtype=complex))
+
+
+def test_tensor_product_channel():
+    local0, local12 = _random_channel(1), _random_channel(2)
+    channel = TensorProductChannel([((1, 2), local12), ((0,), local0)])
+    # qubit 0 is the least significant tensor factor
+    dense_kraus = [np.kron(b, a) for a in local0.kraus for b in local12.kraus]
+    state = rand_ops.bures_measure_state_matrix(8)
+    expected = sum(k @ state @ k.conj().T for k in dense_kraus)
+    assert np.allclose(channel.apply(state), expected)
+    assert np.allclose(channel.apply(np.stack([state, state]))[1], expected)
+    assert np.allclose(channel.to_channel().choi, kraus2choi(dense_kraus))
+    assert np.allclose(channel.pauli_liouville_diagonal(),
+                       np.diag(kraus2pauli_liouville(dense_kraus)))
+
+    # local qubit 0 of a factor is its first qubit, as for program_unitary
+    hadamard = Channel.from_kraus(program_unitary(Program(HGate(0)), 1))
+    cnot = Channel.from_kraus(program_unitary(Program(CNOT(0, 1)), 2))
+    unitary = TensorProductChannel([((0,), hadamard), ((2, 1), cnot)])
+    assert np.allclose(unitary.to_channel().choi,
+                       kraus2choi(program_unitary(Program(HGate(0), CNOT(2, 1)), 3)))
+
+    with pytest.raises(ValueError):
+        TensorProductChannel([((0,), local0), ((0, 1), local12)])
+    with pytest.raises(ValueError):
+        TensorProductChannel([((0,), local12)])
+
+
+def test_tensor_product_channel_compose():
+    first = TensorProductChannel([((0,), _random_channel(1)), ((2, 1), _random_channel(2)),
+                                  ((3,), _random_channel(1))])
+    second = TensorProductChannel([((0, 1), _random_channel(2)), ((3,), _random_channel(1))])
+    composite = first.compose(second)
+    assert sorted(qubits for qubits, _ in composite.factors) == [(0, 1, 2), (3,)]
+    state = rand_ops.bures_measure_state_matrix(16)
+    assert np.allclose(composite.apply(state), second.apply(first.apply(state)))
+
+    ptm0 = first.to_channel().pauli_liouville
+    ptm1 = second.to_channel().pauli_liouville
+    assert np.isclose(first.entanglement_fidelity(second), entanglement_fidelity(ptm0, ptm1))
+    assert np.isclose(first.process_fidelity(), process_fidelity(np.eye(16 ** 2), ptm0))
@@ -1,6 +1,8 @@
 import numpy as np
+import pandas as pd
 import pytest
 
+from forest.benchmarking import qubit_spectroscopy as qs
 from forest.benchmarking.qubit_spectroscopy import fit_to_exponential_decay_curve
 
 
@@ -21,3 +23,28 @@ def test_exponential_waveform(mock_t1):
     params, params_errs = fit_to_exponential_decay_curve(times, data)
 
     assert np.isclose(params[1], mock_t1['T1'])
+
+
+def test_decay_posterior(mock_t1):
+    rs = np.random.RandomState(7)
+    times = np.linspace(1e-6, 3 * mock_t1['T1'], mock_t1['num_points'])
+    averages = rs.binomial(1000, np.exp(-times / mock_t1['T1'])) / 1000
+    df = pd.DataFrame({'Qubit': 0, 'Time': times, 'Num_bitstrings': 1000, 'Average': averages})
+
+    est = qs.estimate_decay_posterior(df, 't1')
+    assert np.isclose(est['T1'].values[0] * qs.MICROSECOND, mock_t1['T1'], rtol=.05)
+    assert est['Relative_std'].values[0] < .05
+    assert est['Num_shots'].values[0] == 1000 * mock_t1['num_points']
+
+    # once the decay constant is roughly known, the most informative delay is comparable to it
+    decay_constants = np.geomspace(1e-6, 1e-3, 400)
+    posterior = qs._normalize_log_posterior(-(np.log(decay_constants / mock_t1['T1']) / .3) ** 2)
+    candidates = np.geomspace(1e-7, 1e-3, 60)
+    likelihoods, entropies = qs._count_likelihoods(
+        qs._decay_probabilities('t1', candidates, decay_constants), 100)
+    gains = qs._expected_information_gain(posterior[None], likelihoods, entropies)
+    assert mock_t1['T1'] / 2 < candidates[np.argmax(gains)] < 3 * mock_t1['T1']
+
+    # Ramsey decays oscillate with the residual detuning, so they are not modeled
+    with pytest.raises(ValueError):
+        qs.estimate_decay_posterior(df, 't2_star')
@@ -1,7 +1,9 @@
 import numpy as np
+import pandas as pd
 import pytest
 
-from forest.benchmarking.qubit_spectroscopy import fit_to_exponentially_decaying_sinusoidal_curve
+from forest.benchmarking.qubit_spectroscopy import fit_to_exponentially_decaying_sinusoidal_curve, \
+    estimate_t2, MICROSECOND
 
 
 @pytest.fixture()
@@ -24,3 +26,24 @@ def test_exponentially_decaying_sinusoidal_waveform(mock_t2):
     params, params_errs = fit_to_exponentially_decaying_sinusoidal_curve(times, data)
 
     assert np.isclose(params[1], mock_t2['T2'])
+
+
+def test_estimate_t2_many_qubits():
+    rs = np.random.RandomState(3)
+    detuning = 1e6
+    times = np.linspace(0, 10e-6, 30)
+    true_t2s = rs.uniform(5e-6, 40e-6, 20)
+    rows = []
+    for q, t2 in enumerate(true_t2s):
+        probs = 0.5 * np.exp(-times / t2) * np.sin(2 * np.pi * detuning * times) + 0.5
+        averages = rs.binomial(2000, probs) / 2000
+        rows += [{'Qubit': q, 'Time': t, 'Average': avg, 'Detuning': detuning}
+                 for t, avg in zip(times, averages)]
+    rows += [{'Qubit': 20, 'Time': t, 'Average': np.nan, 'Detuning': detuning} for t in times]
+
+    est = estimate_t2(pd.DataFrame(rows), max_workers=1)
+    assert list(est['Success']) == [True] * 20 + [False]
+    assert est['Message'].values[-1] is not None
+    fitted = est['T2'].values[:20].astype(float) * MICROSECOND
+    assert np.allclose(fitted, true_t2s, rtol=.3)
+    assert np.allclose(est['Freq'].values[:20].astype(float), 2 * np.pi, rtol=.01)
@@ -1,3 +1,5 @@
+import itertools
+
 from pyquil.paulis import PauliTerm
 
 from forest.benchmarking.utils import *
@@ -56,3 +58,32 @@ def test_partial_trace():
     rho = np.kron(I, I) / 4
     np.testing.assert_array_equal(I / 2, partial_trace(rho, [1], [2, 2]))
     np.testing.assert_array_equal(I / 2, partial_trace(rho, [0], [2, 2]))
+
+
+def test_bit_arrays_to_ints():
+    bit_arrays = np.array(list(itertools.product([0, 1], repeat=4)))
+    ints = bit_arrays_to_ints(bit_arrays)
+    assert list(ints) == [bit_array_to_int(b) for b in bit_arrays]
+    assert list(ints) == list(range(16))
+    assert bit_arrays_to_ints(bit_arrays.reshape(2, 8, 4)).shape == (2, 8)
+
+
+def test_parallel_map_is_serial_by_default():
+    # a lambda can not be pickled, so this only works without a process pool
+    assert parallel_map(lambda x: x ** 2, range(5)) == [0, 1, 4, 9, 16]
+    assert parallel_map(abs, [-1, 2, -3], max_workers=2) == [1, 2, 3]
+
+
+def test_simultaneous_batches():
+    groups = list(itertools.combinations(range(8), 2))
+    batches = simultaneous_batches(groups)
+    assert sorted(idx for batch in batches for idx in batch) == list(range(len(groups)))
+    for batch in batches:
+        qubits = [q for idx in batch for q in groups[idx]]
+        assert len(qubits) == len(set(qubits))
+    assert len(batches) < len(groups) / 2
+
+    # groups with different labels are never batched together
+    labels = [sum(group) % 2 for group in groups]
+    for batch in simultaneous_batches(groups, labels=labels):
+        assert len({labels[idx] for idx in batch}) == 1
@@ -15,7 +15,8 @@ from pyquil import Program
 from pyquil.api import QuantumComputer
 from pyquil.operator_estimation import ExperimentSetting, \
     TomographyExperiment as PyQuilTomographyExperiment, ExperimentResult, SIC0, SIC1, SIC2, SIC3, \
-    plusX, minusX, plusY, minusY, plusZ, minusZ, TensorProductState, zeros_state
+    plusX, minusX, plusY, minusY, plusZ, minusZ, TensorProductState, zeros_state, \
+    SymmetrizationLevel
 from pyquil.paulis import sI, sX, sY, sZ, PauliSum, PauliTerm, is_identity
 from pyquil.unitary_tools import lifted_pauli, lifted_state_operator
 
@@ -75,6 +76,70 @@ def generate_state_tomography_experiment(program: Program, qubits: List[int]):
                                       program=program)
 
 
+def generate_simultaneous_state_tomography_experiment(program: Program,
+                                                      qubit_groups: Sequence[Sequence[int]]):
+    """Generate a single (pyQuil) TomographyExperiment that characterizes the marginal state of
+    each of several disjoint groups of qubits at once.
+
+    The non-identity Pauli operators of every group are partitioned by the local Pauli basis in
+    which they are diagonal (identity factors are measured in Z). Operators of all groups which
+    share a basis form one group of settings, so every group of settings measures one product of
+    local Pauli bases across all groups, and there are 3^k groups of settings for groups of at
+    most k qubits regardless of the number of groups.
+
+    The experiment does not symmetrize readout: exhaustive symmetrization would run 2^n programs
+    per group of settings for n measured qubits in total. Readout calibration in pyQuil requires
+    exhaustive symmetrization, so collect data with calibration turned off::
+
+        results = list(measure_observables(qc, experiment, calibrate_readout=None))
+
+    which runs exactly one program per group of settings.
+
+    Look up the result for an operator by its ``operations_as_set()``, see
+    :py:func:`simultaneous_state_tomography_results`.
+
+    :param program: The program to prepare a state to tomographize
+    :param qubit_groups: Disjoint groups of qubits whose marginal states are to be tomographized
+    """
+    all_qubits = [q for group in qubit_groups for q in group]
+    if len(set(all_qubits)) != len(all_qubits):
+        raise ValueError("The qubit groups must be disjoint.")
+    max_size = max(len(group) for group in qubit_groups)
+    settings_by_basis = {basis: [] for basis in itertools.product('XYZ', repeat=max_size)}
+    for group in qubit_groups:
+        for o_ops in itertools.product('IXYZ', repeat=len(group)):
+            if set(o_ops) == {'I'}:
+                continue
+            o_op = functools.reduce(mul, (PauliTerm(op, q) for op, q in zip(o_ops, group)), sI())
+            basis = tuple(op if op != 'I' else 'Z' for op in o_ops) + ('Z',) * (max_size - len(group))
+            settings_by_basis[basis].append(ExperimentSetting(in_state=zeros_state(group),
+                                                              out_operator=o_op))
+    return PyQuilTomographyExperiment(settings=list(settings_by_basis.values()), program=program,
+                                      symmetrization=SymmetrizationLevel.NONE)
+
+
+def simultaneous_state_tomography_results(results: Sequence[ExperimentResult],
+                                          qubit_groups: Sequence[Sequence[int]]) \
+        -> List[Tuple[List[float], List[float]]]:
+    """Marginalize the results of a simultaneous state tomography experiment per group.
+
+    :param results: The results of measure_observables on an experiment from
+        generate_simultaneous_state_tomography_experiment
+    :param qubit_groups: The qubit groups the experiment was generated for
+    :return: For each group, the expectations and variances of its non-identity Pauli operators,
+        in the order of generate_state_tomography_experiment (without the leading identity).
+    """
+    by_operator = {r.setting.out_operator.operations_as_set(): r for r in results}
+    marginals = []
+    for group in qubit_groups:
+        settings = list(_state_tomo_settings(group))[1:]
+        group_results = [by_operator[setting.out_operator.operations_as_set()]
+                         for setting in settings]
+        marginals.append(([r.expectation for r in group_results],
+                          [r.std_err ** 2 for r in group_results]))
+    return marginals
+
+
 def _sic_process_tomo_settings(qubits: Sequence[int]):
     """Yield settings over SIC basis cross I,X,Y,Z operators
 
@@ -1,13 +1,13 @@
 import itertools
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from random import random, seed
-from typing import Sequence, List, Set, Tuple
+from typing import Callable, Iterable, Sequence, List, Set, Tuple
 from datetime import date, datetime
 from git import Repo
 import numpy as np
 from numpy import pi
 import networkx as nx
-from networkx.algorithms.approximation.clique import clique_removal
 import pandas as pd
 from pandas import DataFrame
 
@@ -31,6 +31,19 @@ def bit_array_to_int(bit_array: Sequence[int]) -> int:
     return output
 
 
+def bit_arrays_to_ints(bit_arrays: np.ndarray) -> np.ndarray:
+    """
+    Vectorized bit_array_to_int: converts every bit array along the last axis into an integer
+    where the right-most bit is least significant.
+
+    :param bit_arrays: an array of bits, e.g. the (shots, bits) results of qc.run
+    :return: an integer array with the shape of bit_arrays without its last axis.
+    """
+    bit_arrays = np.asarray(bit_arrays, dtype=np.int64)
+    weights = 1 << np.arange(bit_arrays.shape[-1] - 1, -1, -1, dtype=np.int64)
+    return bit_arrays @ weights
+
+
 def int_to_bit_array(num: int, n_bits: int) -> Sequence[int]:
     """
     Converts a number into an array of bits where the right-most bit is least significant.
@@ -42,40 +55,79 @@ def int_to_bit_array(num: int, n_bits: int) -> Sequence[int]:
     return [num >> bit & 1 for bit in range(n_bits - 1, -1, -1)]
 
 
+def simultaneous_batches(groups: Sequence[Sequence[int]], graph: nx.Graph = None,
+                         exclusion_distance: int = 0, labels: Sequence = None) -> List[List[int]]:
+    """
+    Partition groups of qubits into few batches of groups which can be run simultaneously.
+
+    Two groups conflict if they share a qubit or, given a graph, if some qubit of one is within
+    exclusion_distance of some qubit of the other in the graph. Given labels, groups with
+    different labels also conflict. The batches are the color classes of a greedy coloring of
+    the conflict graph; the coloring strategy giving the fewest batches is used.
+
+    :param groups: the groups of qubits to batch, e.g. single qubits or edges.
+    :param graph: the qubit connectivity, e.g. ``qc.qubit_topology()``, used with
+        exclusion_distance to also separate nearby groups.
+    :param exclusion_distance: the graph distance up to which qubits of different groups are not
+        run simultaneously; with 0 only groups sharing a qubit are separated.
+    :param labels: optional hashable labels, one per group; only groups with equal labels are
+        batched together.
+    :return: a list of batches, each a list of indices of groups. Every group is in one batch.
+    """
+    if labels is None:
+        labels = [None] * len(groups)
+    distances = {}
+    if graph is not None:
+        distances = dict(nx.all_pairs_shortest_path_length(graph, cutoff=exclusion_distance))
+
+    # the qubits within exclusion_distance of each group
+    neighborhoods = [set(q for qubit in group for q in distances.get(qubit, {qubit: 0}))
+                     for group in groups]
+    groups_by_qubit = {}
+    for idx, group in enumerate(groups):
+        for qubit in group:
+            groups_by_qubit.setdefault(qubit, []).append(idx)
+
+    conflicts = nx.Graph()
+    conflicts.add_nodes_from(range(len(groups)))
+    for idx, neighborhood in enumerate(neighborhoods):
+        for qubit in neighborhood:
+            conflicts.add_edges_from((idx, other) for other in groups_by_qubit.get(qubit, [])
+                                     if other != idx)
+
+    # groups with different labels are never batched together, so color each label separately
+    batches = []
+    for label in OrderedDict.fromkeys(labels):
+        members = [idx for idx in range(len(groups)) if labels[idx] == label]
+        subgraph = conflicts.subgraph(members)
+        colorings = [nx.coloring.greedy_color(subgraph, strategy=strategy)
+                     for strategy in ['largest_first', 'smallest_last', 'DSATUR']]
+        colors = min(colorings, key=lambda coloring: max(coloring.values(), default=-1))
+        label_batches = [[] for _ in range(max(colors.values(), default=-1) + 1)]
+        for idx in members:
+            label_batches[colors[idx]].append(idx)
+        batches.extend(label_batches)
+    return batches
+
+
 def determine_simultaneous_grouping(experiments: Sequence[DataFrame],
                                     equivalent_column_label: str = None) -> List[Set[int]]:
     """
     Determines a grouping of experiments acting on disjoint sets of qubits that can be run
     simultaneously.
 
-    :param experiments:
+    :param experiments: experiment dataframes, each with the qubits it acts on in a "Qubits"
+        column.
+    :param equivalent_column_label: optionally, a column which must be identical for
+        experiments to be grouped together, e.g. "Depth".
     :return: a list of the simultaneous groups, each specified by a set of indices of each grouped
         experiment in experiments
     """
-    g = nx.Graph()
-    nodes = np.arange(len(experiments))
-    g.add_nodes_from(nodes)
     qubits = [expt["Qubits"].values[0] for expt in experiments]
-
-    need_equiv = None
+    labels = None
     if equivalent_column_label is not None:
-        need_equiv = [expt[equivalent_column_label].values for expt in experiments]
-
-    for node1 in nodes:
-        qbs1 = qubits[node1]
-        for node2 in nodes[node1+1:]:
-            if len(qbs1.intersection(qubits[node2])) == 0:
-                # check that the requested columns are equivalent
-                if equivalent_column_label is not None:
-                    if not np.array_equal(need_equiv[node1], need_equiv[node2]):
-                        continue
-                # no shared qubits, and requested columns are identical, so add edge
-                g.add_edge(node1, node2)
-
-    # get the largest groups of nodes with shared edges, as each can be run simultaneously
-    _, cliqs = clique_removal(g)
-
-    return cliqs
+        labels = [tuple(expt[equivalent_column_label].values) for expt in experiments]
+    return [set(batch) for batch in simultaneous_batches(qubits, labels=labels)]
 
 
 def bloch_vector_to_standard_basis(theta: float, phi: float) -> Tuple[complex, complex]:
@@ -623,6 +675,29 @@ def partial_trace(rho, keep, dims, optimize=False):
     return rho_a.reshape(Nkeep, Nkeep)
 
 
+def parallel_map(func: Callable, items: Iterable, max_workers: int = None) -> list:
+    """
+    Apply func to every item, optionally distributing the calls over a pool of worker processes.
+
+    This is intended for batches of independent, CPU bound analysis tasks such as curve fits.
+    By default the calls are made serially in this process; a process pool is only started when
+    more than one worker is requested, in which case func must be a module level function and
+    its arguments and return values must be picklable.
+
+    :param func: The function to apply to each item.
+    :param items: The arguments, one per call.
+    :param max_workers: The number of worker processes. None or 1 (the default) makes the calls
+        serially in this process; e.g. os.cpu_count() uses one worker per CPU.
+    :return: The list of results, in the order of items.
+    """
+    items = list(items)
+    if max_workers is None or max_workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+    chunksize = max(1, len(items) // (4 * max_workers))
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(func, items, chunksize=chunksize))
+
+
 def metadata_save(qc: QuantumComputer,
                   repo_path: str = None,
                   filename: str = None) -> pd.DataFrame: